@@ -1,85 +1,502 @@
-from flask import Flask, jsonify, render_template, request
-import pyodbc
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
+import base64
 import datetime
+import json
 import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from operator import itemgetter
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from compression import Compressor
+from concurrent_queries import ConcurrentQueries, QueryTimeout
+import dialects
+from reservation import InsufficientStock, reserve_stock, run_with_deadlock_retry
+import rollups
+import search_columns
+import validation
+import instrumentation
+import invoices
+import jobs
+import json_provider
+from search_index import SearchIndex, fold
+from bulk_import import ImportFormatError, batches, detect_format, read_rows
 
 
 load_dotenv()
 
 app = Flask(__name__)
+# JSON_BACKEND=auto dùng orjson nếu đã cài, json để dùng module json chuẩn
+app.json = json_provider.FastJSONProvider(app, os.getenv('JSON_BACKEND', 'auto'))
+
+# Đo thời gian request / câu lệnh SQL; tắt thì kết nối không bị bọc và không
+# có hook nào được đăng ký
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+metrics = instrumentation.Metrics(
+    slow_query_ms=float(os.getenv('SLOW_QUERY_MS', '200')),
+) if METRICS_ENABLED else None
+
+
+# DB_BACKEND=sqlite chạy toàn bộ ứng dụng trên file SQLITE_PATH, không cần SQL Server
+dialect = dialects.get(os.getenv('DB_BACKEND', 'mssql'))
 
 
 def get_db_connection():
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    server = os.getenv('DB_SERVER', 'localhost')
-    database = os.getenv('DB_DATABASE', 'DataLapTopShop')
-    uid = os.getenv('DB_UID', 'sa')
-    pwd = os.getenv('DB_PWD', '')
-
-    conn = pyodbc.connect(
-        f'DRIVER={{{driver}}};'
-        f'SERVER={server};'
-        f'DATABASE={database};'
-        f'UID={uid};'
-        f'PWD={pwd}'
-    )
+    conn = dialect.connect()
+    if metrics is not None:
+        conn = instrumentation.InstrumentedConnection(conn, metrics)
     return conn
 
 
+db_pool = ConnectionPool(
+    get_db_connection,
+    max_size=int(os.getenv('DB_POOL_SIZE', '10')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', '30')),
+)
+app.extensions['db_pool'] = db_pool
+
+
+def get_db():
+    """Mượn kết nối từ pool, dùng chung cho cả request hiện tại"""
+    if 'db_conn' not in g:
+        g.db_conn = db_pool.acquire()
+    return g.db_conn.connection
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    item = g.pop('db_conn', None)
+    if item is not None:
+        db_pool.release(item, discard=exception is not None)
+
+
+if metrics is not None:
+    @app.before_request
+    def start_request_metrics():
+        metrics.start_request()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        rule = request.url_rule
+        stats = metrics.finish_request(rule.rule if rule else 'unmatched', request.method, response.status_code)
+        if stats is not None:
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_count} queries", '
+                f'app;dur={stats.elapsed * 1000:.1f}'
+            )
+        return response
+
+
+# Đăng ký sau hook đo thời gian nên chạy trước nó (after_request chạy ngược thứ
+# tự đăng ký): thời gian nén được tính vào Server-Timing
+COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True') == 'True'
+if COMPRESS_ENABLED:
+    Compressor(min_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024'))).init_app(app)
+
+
+# SQL Server giới hạn 2100 tham số cho một câu lệnh
+MAX_SQL_PARAMS = 2000
+
+
+def _placeholders(n):
+    return ', '.join(['?'] * n)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def insert_returning_key(cursor, table, key, columns, values):
+    """INSERT một dòng và lấy khoá vừa sinh qua OUTPUT INSERTED trong cùng round trip"""
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"OUTPUT INSERTED.{key} "
+        f"VALUES ({_placeholders(len(columns))})",
+        values
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise Exception(f"Không lấy được {key} vừa tạo")
+    return int(row[0])
+
+
+class CatalogCache:
+    """Cache các dòng Laptop theo MaSP, hết hạn theo TTL và loại bỏ theo LRU.
+
+    Danh mục sản phẩm hầu như không đổi, chỉ ``Kho`` thay đổi theo từng đơn
+    hàng nên các route ghi phải xoá dòng khỏi cache ngay khi commit.
+    """
+
+    def __init__(self, max_size=5000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, ma_sps):
+        """Trả về (các dòng có trong cache, các MaSP còn thiếu)"""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for ma_sp in ma_sps:
+                entry = self._rows.get(ma_sp)
+                if entry is not None and entry[0] > now:
+                    self._rows.move_to_end(ma_sp)
+                    found[ma_sp] = dict(entry[1])
+                else:
+                    if entry is not None:
+                        del self._rows[ma_sp]
+                    missing.append(ma_sp)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, row):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._rows[row['MaSP']] = (expires_at, dict(row))
+            self._rows.move_to_end(row['MaSP'])
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, ma_sp):
+        with self._lock:
+            self._rows.pop(ma_sp, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._rows),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0
+            }
+
+
+catalog_cache = CatalogCache(
+    max_size=int(os.getenv('CATALOG_CACHE_SIZE', '5000')),
+    ttl=float(os.getenv('CATALOG_CACHE_TTL', '60')),
+)
+
+
+def load_laptops(ma_sps, fresh=False):
+    """Lấy các dòng Laptop theo MaSP, ưu tiên cache.
+
+    ``fresh=True`` bỏ qua cache và đọc thẳng từ DB (dùng khi bắt buộc phải có
+    ``Kho`` mới nhất); kết quả đọc được vẫn được nạp lại vào cache.
+    """
+    # Khoá cache là MaSP kiểu int (như cột trong DB): "007" và 7 là một sản phẩm
+    ma_sps = [int(ma_sp) for ma_sp in ma_sps]
+    if fresh:
+        laptops, missing = {}, list(ma_sps)
+    else:
+        laptops, missing = catalog_cache.get_many(ma_sps)
+
+    if missing:
+        cursor = get_db().cursor()
+        for chunk in _chunks(missing, MAX_SQL_PARAMS):
+            cursor.execute(
+                f"SELECT * FROM Laptop WHERE MaSP IN ({_placeholders(len(chunk))})",
+                chunk
+            )
+            columns = [column[0] for column in cursor.description]
+            for row in cursor.fetchall():
+                laptop = dict(zip(columns, row))
+                catalog_cache.put(laptop)
+                laptops[laptop['MaSP']] = laptop
+    return laptops
+
+
 @app.route('/')
 def check_connection():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        conn.close()
-        return render_template('index.html', db_status = True)
+        # Pool tự ping kết nối đã rảnh lâu, kết nối vừa dùng thì không tốn round trip
+        get_db()
+        return render_template('index.html', db_status = True, pool_stats=db_pool.stats())
     except Exception as e:
         return render_template('index.html', db_status = False, message=f"Connection failed: {str(e)}")
 
 
+@app.route('/api/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify({"status": "success", "data": db_pool.stats()}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if metrics is None:
+        return jsonify({"status": "error", "message": "METRICS_ENABLED đang tắt"}), 404
+    gauges = {f"db_pool_{name}": value for name, value in db_pool.stats().items()}
+    return Response(metrics.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/slow_queries', methods=['GET'])
+def slow_queries():
+    if metrics is None:
+        return jsonify({"status": "error", "message": "METRICS_ENABLED đang tắt"}), 404
+    return jsonify({"status": "success", "threshold_ms": metrics.slow_query_seconds * 1000,
+                    "data": metrics.slow_queries()}), 200
+
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "status": "success",
+        "data": {
+            "catalog": catalog_cache.stats(),
+            "dashboard": dashboard_cache.stats(),
+            "invoices": invoice_cache.stats(),
+            "customer_search": customer_index.stats(),
+            "employee_search": employee_index.stats()
+        }
+    }), 200
+
+
+LAPTOP_LIST_COLUMNS = ('MaSP', 'TenSP', 'Hang', 'CauHinh', 'GiaBan', 'Kho', 'MaNCC', 'TrangThai')
+LAPTOP_SORT_COLUMNS = frozenset(['MaSP', 'TenSP', 'GiaBan', 'Kho'])
+LAPTOP_PAGE_SIZE = 50
+LAPTOP_MAX_PAGE_SIZE = 200
+
+
+class ListParamError(ValueError):
+    """Tham số lọc / phân trang không hợp lệ"""
+
+
+def wants_columns():
+    """?format=columns: trả danh sách dạng cột thay vì mỗi dòng một object"""
+    return request.args.get('format') == 'columns'
+
+
+def to_columns(records, columns):
+    """Đổi danh sách dict thành {"columns": [...], "rows": [[...], ...]}: tên cột chỉ
+    gửi một lần thay vì lặp lại ở mỗi dòng"""
+    getter = itemgetter(*columns) if len(columns) > 1 else (lambda record: (record[columns[0]],))
+    return {"columns": list(columns), "rows": [getter(record) for record in records]}
+
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor, size=2):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise ListParamError("Con trỏ phân trang không hợp lệ")
+    return values
+
+
+def parse_laptop_list_args(args):
+    """Đọc bộ lọc, sắp xếp và con trỏ phân trang từ query string"""
+    sort = args.get('sort', 'MaSP')
+    if sort not in LAPTOP_SORT_COLUMNS:
+        raise ListParamError(f"Chỉ sắp xếp được theo: {', '.join(sorted(LAPTOP_SORT_COLUMNS))}")
+
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ListParamError("order phải là asc hoặc desc")
+
+    try:
+        limit = int(args.get('limit', LAPTOP_PAGE_SIZE))
+        min_price = float(args['min_price']) if args.get('min_price') else None
+        max_price = float(args['max_price']) if args.get('max_price') else None
+    except ValueError:
+        raise ListParamError("limit, min_price, max_price phải là số")
+
+    return {
+        'hang': args.get('Hang', '').strip() or None,
+        'trang_thai': args.get('TrangThai', '').strip() or None,
+        'min_price': min_price,
+        'max_price': max_price,
+        'sort': sort,
+        'order': order,
+        'after': _decode_cursor(args['after']) if args.get('after') else None,
+        'limit': max(1, min(limit, LAPTOP_MAX_PAGE_SIZE))
+    }
+
+
+def query_laptop_page(params):
+    """Lấy một trang laptop bằng keyset pagination trên (cột sắp xếp, MaSP).
+
+    Chỉ đọc đúng ``limit + 1`` dòng nên bộ nhớ mỗi request không phụ thuộc kích
+    thước bảng. Trả về (danh sách laptop, con trỏ trang sau hoặc None).
+    """
+    where = []
+    values = []
+    if params['hang']:
+        where.append("Hang = ?")
+        values.append(params['hang'])
+    if params['trang_thai']:
+        where.append("TrangThai = ?")
+        values.append(params['trang_thai'])
+    if params['min_price'] is not None:
+        where.append("GiaBan >= ?")
+        values.append(params['min_price'])
+    if params['max_price'] is not None:
+        where.append("GiaBan <= ?")
+        values.append(params['max_price'])
+
+    sort = params['sort']
+    op = '>' if params['order'] == 'asc' else '<'
+    if params['after'] is not None:
+        last_value, last_ma_sp = params['after']
+        if sort == 'MaSP':
+            where.append(f"MaSP {op} ?")
+            values.append(last_ma_sp)
+        else:
+            where.append(f"({sort} {op} ? OR ({sort} = ? AND MaSP {op} ?))")
+            values.extend((last_value, last_value, last_ma_sp))
+
+    direction = params['order'].upper()
+    order_by = f"MaSP {direction}" if sort == 'MaSP' else f"{sort} {direction}, MaSP {direction}"
+    query = f"""
+        SELECT TOP (?) {', '.join(LAPTOP_LIST_COLUMNS)}
+        FROM Laptop
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order_by}
+    """
+
+    cursor = get_db().cursor()
+    cursor.execute(query, [params['limit'] + 1] + values)
+    rows = cursor.fetchmany(params['limit'] + 1)
+
+    laptops = []
+    for row in rows[:params['limit']]:
+        laptop = dict(zip(LAPTOP_LIST_COLUMNS, row))
+        laptop['GiaBan'] = float(laptop['GiaBan']) if laptop['GiaBan'] else 0
+        laptops.append(laptop)
+
+    next_cursor = None
+    if len(rows) > params['limit']:
+        last = laptops[-1]
+        last_value = last[sort]
+        next_cursor = _encode_cursor([last_value, last['MaSP']])
+    return laptops, next_cursor
+
+
 @app.route('/LapTop')
 def laptop_list():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Laptop")
+        params = parse_laptop_list_args(request.args)
+        laptops, next_cursor = query_laptop_page(params)
+        return render_template('LapTop.html', laptops=laptops, next_cursor=next_cursor, filters=request.args)
+    except Exception as e:
+        return render_template('LapTop.html', laptops=[], filters=request.args, message=f"Error fetching data: {str(e)}")
 
-        columns = [column[0] for column in cursor.description]
 
-        laptops = []
-        for row in cursor.fetchall():
-            laptops.append(dict(zip(columns, row)))
+@app.route('/api/laptops', methods=['GET'])
+def laptop_list_api():
+    """Danh sách laptop phân trang: ?after=<con trỏ>&limit=&Hang=&TrangThai=&min_price=&max_price=&sort=&order="""
+    try:
+        params = parse_laptop_list_args(request.args)
+    except ListParamError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        laptops, next_cursor = query_laptop_page(params)
+        return jsonify({
+            "status": "success",
+            "data": to_columns(laptops, LAPTOP_LIST_COLUMNS) if wants_columns() else laptops,
+            "count": len(laptops),
+            "next": next_cursor
+        }), 200
 
-        conn.close()
-        return render_template('LapTop.html', laptops=laptops)
     except Exception as e:
-        return render_template('LapTop.html', laptops=[], message=f"Error fetching data: {str(e)}")
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/add_DonHang', methods=['GET'])
 def add_order_form():
     return render_template('taoDonHang.html')
 
+# Số mã sản phẩm tối đa cho một lần tra giá theo lô
+MAX_GIA_SANPHAM_IDS = 500
+
+
+def lay_gia_san_pham(ma_sps, fresh=False):
+    """Đọc giá và tồn kho của nhiều sản phẩm trong một lần, trả về dict theo MaSP"""
+    return {
+        ma_sp: {
+            "MaSP": laptop['MaSP'],
+            "TenSP": laptop['TenSP'],
+            "GiaBan": float(laptop['GiaBan']) if laptop['GiaBan'] else 0,
+            "Kho": laptop['Kho']
+        }
+        for ma_sp, laptop in load_laptops(ma_sps, fresh=fresh).items()
+    }
+
+
+@app.route('/api/get_gia_sanpham', methods=['GET', 'POST'])
+def get_gia_sanpham_batch():
+    """Tra giá nhiều sản phẩm: ?ids=1,2,3 hoặc POST {"ids": [1, 2, 3]}, thêm fresh=1 để bỏ qua cache"""
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        ids = body.get('ids', [])
+        fresh = bool(body.get('fresh'))
+    else:
+        ids = request.args.get('ids', '').split(',')
+        fresh = request.args.get('fresh') == '1'
+
+    try:
+        ma_sps = sorted({int(ma_sp) for ma_sp in ids if str(ma_sp).strip()})
+    except (ValueError, TypeError):
+        return jsonify({"status": "error", "message": "Danh sách mã sản phẩm không hợp lệ"}), 400
+
+    if not ma_sps:
+        return jsonify({"status": "error", "message": "Thiếu danh sách mã sản phẩm"}), 400
+
+    if len(ma_sps) > MAX_GIA_SANPHAM_IDS:
+        return jsonify({
+            "status": "error",
+            "message": f"Chỉ tra được tối đa {MAX_GIA_SANPHAM_IDS} sản phẩm mỗi lần"
+        }), 400
+
+    try:
+        products = lay_gia_san_pham(ma_sps, fresh=fresh)
+        return jsonify({
+            "status": "success",
+            "data": list(products.values()),
+            "missing": [ma_sp for ma_sp in ma_sps if ma_sp not in products]
+        }), 200
+
+    except Exception as e:
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route('/api/get_gia_sanpham/<int:maSP>', methods=['GET'])
 def get_gia_sanpham(maSP):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        product = lay_gia_san_pham([maSP], fresh=request.args.get('fresh') == '1').get(maSP)
 
-        cursor.execute("SELECT MaSP, TenSP, GiaBan, Kho FROM Laptop WHERE MaSP = ?", (maSP,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if result:
-            return jsonify({
-                "status": "success",
-                "MaSP": result[0],
-                "TenSP": result[1],
-                "GiaBan": float(result[2]) if result[2] else 0,
-                "Kho": result[3]
-            }), 200
+        if product:
+            return jsonify({"status": "success", **product}), 200
         else:
             return jsonify({"status": "error", "message": "Không tìm thấy sản phẩm"}), 404
 
@@ -91,150 +508,115 @@ def get_gia_sanpham(maSP):
 def add_DonHang():
     data = request.get_json()
 
-    MaKH = data.get('MaKH')
-    MaNV = data.get('MaNV')
-    NgayGiao = data.get('NgayGiao')
-    TrangThaiXuLy = data.get('TrangThaiXuLy')
-    GhiChu = data.get('GhiChu', '')
-    ChiTiet = data.get('ChiTiet', [])
-
-    # Validation cơ bản
-    if not MaKH or not MaNV or not NgayGiao or not TrangThaiXuLy or not ChiTiet:
-        return jsonify({"status": "error", "message": "Thiếu thông tin bắt buộc"}), 400
-
-    # Validate MaKH và MaNV phải là số
-    try:
-        MaKH = int(MaKH)
-        MaNV = int(MaNV)
-    except (ValueError, TypeError):
-        return jsonify({"status": "error", "message": "Mã khách hàng và mã nhân viên phải là số"}), 400
-
-    # Validate NgayGiao không được là quá khứ
-    try:
-        ngay_giao_date = datetime.datetime.strptime(NgayGiao, '%Y-%m-%d').date()
-        hom_nay = datetime.datetime.now().date()
-        if ngay_giao_date < hom_nay:
-            return jsonify({"status": "error", "message": "Ngày giao hàng không được là quá khứ"}), 400
-    except ValueError:
-        return jsonify({"status": "error", "message": "Định dạng ngày giao không hợp lệ (yêu cầu: YYYY-MM-DD)"}), 400
+    don_hang, errors = validation.DON_HANG.validate(data)
+    if errors:
+        return jsonify({"status": "error", "message": validation.error_message(errors), "errors": errors}), 400
 
-    # Validate trạng thái
-    valid_statuses = ['Chưa xử lý', 'Đang giao', 'Hoàn tất']
-    if TrangThaiXuLy not in valid_statuses:
-        return jsonify({"status": "error", "message": f"Trạng thái không hợp lệ. Phải là: {', '.join(valid_statuses)}"}), 400
+    MaKH = don_hang['MaKH']
+    MaNV = don_hang['MaNV']
+    NgayGiao = don_hang['NgayGiao']
+    TrangThaiXuLy = don_hang['TrangThaiXuLy']
+    GhiChu = don_hang['GhiChu']
+    lines = [(item['MaSP'], item['SoLuong'], item['GiaBan']) for item in don_hang['ChiTiet']]
 
-    # Validate ChiTiet không rỗng
-    if len(ChiTiet) == 0:
-        return jsonify({"status": "error", "message": "Đơn hàng phải có ít nhất 1 sản phẩm"}), 400
+    # Gộp số lượng theo MaSP: cùng một sản phẩm có thể nằm ở nhiều dòng
+    so_luong_theo_sp = {}
+    for maSP, soLuongDat, _ in lines:
+        so_luong_theo_sp[maSP] = so_luong_theo_sp.get(maSP, 0) + soLuongDat
 
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
-        # Kiểm tra MaKH tồn tại
-        cursor.execute("SELECT MaKH, TrangThai FROM KhachHang WHERE MaKH = ?", (MaKH,))
-        kh_result = cursor.fetchone()
-        if not kh_result:
-            conn.close()
+        # Kiểm tra MaKH và MaNV trong cùng một round trip
+        cursor.execute("""
+            SELECT
+                (SELECT TrangThai FROM KhachHang WHERE MaKH = ?),
+                (SELECT COUNT(*) FROM KhachHang WHERE MaKH = ?),
+                (SELECT COUNT(*) FROM NhanVien WHERE MaNV = ?)
+        """, (MaKH, MaKH, MaNV))
+        kh_trang_thai, kh_ton_tai, nv_ton_tai = cursor.fetchone()
+        if not kh_ton_tai:
             return jsonify({"status": "error", "message": f"Không tìm thấy khách hàng với mã {MaKH}"}), 400
-        if kh_result[1] != 'Active':
-            conn.close()
+        if kh_trang_thai != 'Active':
             return jsonify({"status": "error", "message": "Khách hàng không ở trạng thái hoạt động"}), 400
-
-        # Kiểm tra MaNV tồn tại
-        cursor.execute("SELECT MaNV FROM NhanVien WHERE MaNV = ?", (MaNV,))
-        if not cursor.fetchone():
-            conn.close()
+        if not nv_ton_tai:
             return jsonify({"status": "error", "message": f"Không tìm thấy nhân viên với mã {MaNV}"}), 400
 
-        # Validate từng sản phẩm trong chi tiết đơn hàng
-        for idx, item in enumerate(ChiTiet, 1):
-            maSP = item.get('MaSP')
-            soLuongDat = item.get('SoLuong')
-            giaBan = item.get('GiaBan')
-
-            # Validate dữ liệu chi tiết
-            if not maSP or not soLuongDat or giaBan is None:
-                conn.close()
-                return jsonify({"status": "error", "message": f"Sản phẩm thứ {idx} thiếu thông tin (MaSP, SoLuong, GiaBan)"}), 400
-
-            try:
-                maSP = int(maSP)
-                soLuongDat = int(soLuongDat)
-                giaBan = float(giaBan)
-            except (ValueError, TypeError):
-                conn.close()
-                return jsonify({"status": "error", "message": f"Sản phẩm thứ {idx} có dữ liệu không hợp lệ"}), 400
-
-            if soLuongDat <= 0:
-                conn.close()
-                return jsonify({"status": "error", "message": f"Sản phẩm thứ {idx}: Số lượng phải lớn hơn 0"}), 400
-
-            if giaBan <= 0:
-                conn.close()
-                return jsonify({"status": "error", "message": f"Sản phẩm thứ {idx}: Giá bán phải lớn hơn 0"}), 400
-            
-            cursor.execute("SELECT TenSP, Kho FROM Laptop WHERE MaSP = ?", (maSP,))
-            result = cursor.fetchone()
-            
-            if not result:
-                conn.close()
+        # Kiểm tra sơ bộ tồn kho từ cache danh mục để báo lỗi sớm, việc trừ kho
+        # thật do reserve_stock đảm bảo. Sản phẩm nào cache báo thiếu thì đọc
+        # lại từ DB trước khi từ chối, tránh báo sai vì cache cũ
+        san_pham = load_laptops(list(so_luong_theo_sp))
+        nghi_thieu = [
+            maSP for maSP, tong_dat in so_luong_theo_sp.items()
+            if maSP not in san_pham or san_pham[maSP]['Kho'] < tong_dat
+        ]
+        if nghi_thieu:
+            san_pham.update(load_laptops(nghi_thieu, fresh=True))
+
+        for maSP, soLuongDat, _ in lines:
+            if maSP not in san_pham:
                 return jsonify({
                     "status": "error",
                     "message": f"Sản phẩm với mã {maSP} không tồn tại"
                 }), 400
-            
-            tenSP = result[0]
-            kho = result[1]
-            
-            if kho < soLuongDat:
-                conn.close()
+
+            tenSP, kho = san_pham[maSP]['TenSP'], san_pham[maSP]['Kho']
+            tong_dat = so_luong_theo_sp[maSP]
+            if kho < tong_dat:
                 return jsonify({
                     "status": "error",
-                    "message": f"Sản phẩm '{tenSP}' không đủ trong kho. Hiện có: {kho}, yêu cầu: {soLuongDat}"
+                    "message": f"Sản phẩm '{tenSP}' không đủ trong kho. Hiện có: {kho}, yêu cầu: {tong_dat}"
                 }), 400
 
-        ThoiGianTao = datetime.datetime.now()
-        TongTien = sum(item['SoLuong'] * item['GiaBan'] for item in ChiTiet)
+        TongTien = sum(soLuongDat * giaBan for _, soLuongDat, giaBan in lines)
 
+        def tao_don_hang():
+            # Giữ hàng trước (khoá các dòng Laptop theo thứ tự MaSP), sau đó mới
+            # ghi đơn hàng và chi tiết, tất cả trong cùng một transaction
+            reserve_stock(cursor, so_luong_theo_sp, MAX_SQL_PARAMS)
 
-        insert_donhang = """
-            INSERT INTO DonHang (MaKH, MaNV, NgayGiao, ThoiGianTao, TrangThaiXuLy, TongTien, GhiChu)
-            VALUES (?, ?, ?, ?, ?, ?, ?);
-        """
-        cursor.execute(insert_donhang, (MaKH, MaNV, NgayGiao, ThoiGianTao, TrangThaiXuLy, TongTien, GhiChu))
+            ThoiGianTao = datetime.datetime.now()
+            ma_dh = insert_returning_key(
+                cursor, 'DonHang', 'MaDH',
+                ('MaKH', 'MaNV', 'NgayGiao', 'ThoiGianTao', 'TrangThaiXuLy', 'TongTien', 'GhiChu'),
+                (MaKH, MaNV, NgayGiao, ThoiGianTao, TrangThaiXuLy, TongTien, GhiChu)
+            )
 
+            # Chi tiết đơn hàng: một lần executemany, fast_executemany gửi cả mảng tham số
+            insert_ct = "INSERT INTO ChiTietDonHang (MaDH, MaSP, SoLuong, GiaBan) VALUES (?, ?, ?, ?)"
+            cursor.fast_executemany = True
+            cursor.executemany(insert_ct, [
+                (ma_dh, maSP, soLuongDat, giaBan) for maSP, soLuongDat, giaBan in lines
+            ])
+            cursor.fast_executemany = False
 
-        conn.commit()
+            # Cộng dồn vào bảng tổng hợp doanh thu trong cùng transaction
+            rollups.record_order(cursor, ThoiGianTao, MaNV, TongTien, TrangThaiXuLy, lines, MAX_SQL_PARAMS)
 
+            conn.commit()
+            return ma_dh
 
-        cursor.execute("""
-            SELECT TOP 1 MaDH
-            FROM DonHang
-            WHERE MaKH = ? AND MaNV = ? AND TongTien = ?
-            ORDER BY ThoiGianTao DESC
-        """, (MaKH, MaNV, TongTien))
+        rollups.ensure_schema(conn)
 
-        result = cursor.fetchone()
-
-        if result is None:
-            raise Exception("Không thể lấy mã đơn hàng vừa tạo")
-
-        new_order_id = int(result[0])
-
-
-
-        insert_ct = "INSERT INTO ChiTietDonHang (MaDH, MaSP, SoLuong, GiaBan) VALUES (?, ?, ?, ?)"
-        update_kho = "UPDATE Laptop SET Kho = Kho - ? WHERE MaSP = ?"
-
-        for item in ChiTiet:
-
-            cursor.execute(insert_ct, (new_order_id, item['MaSP'], item['SoLuong'], item['GiaBan']))
-
-            cursor.execute(update_kho, (item['SoLuong'], item['MaSP']))
+        try:
+            new_order_id = run_with_deadlock_retry(conn, tao_don_hang)
+        except InsufficientStock as e:
+            # Đơn khác vừa lấy mất hàng sau bước kiểm tra ở trên
+            conn.rollback()
+            catalog_cache.invalidate(e.ma_sp)
+            cursor.execute("SELECT TenSP, Kho FROM Laptop WHERE MaSP = ?", (e.ma_sp,))
+            tenSP, kho = cursor.fetchone()
+            return jsonify({
+                "status": "error",
+                "message": f"Sản phẩm '{tenSP}' không đủ trong kho. Hiện có: {kho}, yêu cầu: {so_luong_theo_sp[e.ma_sp]}"
+            }), 400
 
-        conn.commit()
-        conn.close()
+        # Xoá thay vì trừ Kho trong cache: dòng có thể vừa được nạp lại từ DB sau
+        # commit (đã trừ rồi), trừ thêm lần nữa sẽ sai
+        for maSP in so_luong_theo_sp:
+            catalog_cache.invalidate(maSP)
+        dashboard_cache.invalidate_date(datetime.date.today())
 
         print(f" Tạo đơn hàng thành công! MaDH: {new_order_id}")
         return jsonify({"status": "success", "MaDH": new_order_id, "TongTien": TongTien}), 201
@@ -243,7 +625,6 @@ def add_DonHang():
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         print("Lỗi:", e)
@@ -254,165 +635,421 @@ def add_DonHang():
 def add_KhachHang_form():
     return render_template('taoKhachHang.html')
 
+KHACH_HANG_INSERT_COLUMNS = ('HoTen', 'GioiTinh', 'NgaySinh', 'SDT', 'DiaChi', 'TrangThai')
+
+
 @app.route('/api/add_KhachHang', methods=['POST'])
 def add_KhachHang():
     data = request.get_json()
 
-    HoTen = data.get('HoTen', '').strip()
-    GioiTinh = data.get('GioiTinh')
-    NgaySinh = data.get('NgaySinh')
-    SDT = data.get('SDT', '').strip()
-    DiaChi = data.get('DiaChi', '').strip() if data.get('DiaChi') else None
-    TrangThai = data.get('TrangThai', 'Active')
-
-    # Validation họ tên
-    if not HoTen:
-        return jsonify({"status": "error", "message": "Họ tên là bắt buộc"}), 400
+    khach_hang, errors = validation.KHACH_HANG.validate(data)
+    if errors:
+        return jsonify({"status": "error", "message": validation.error_message(errors), "errors": errors}), 400
 
-    if len(HoTen) < 2:
-        return jsonify({"status": "error", "message": "Họ tên phải có ít nhất 2 ký tự"}), 400
+    print(f"DEBUG - Adding customer: {data}")
 
-    if len(HoTen) > 100:
-        return jsonify({"status": "error", "message": "Họ tên không được quá 100 ký tự"}), 400
+    try:
+        conn = get_db()
+        search_columns.ensure_schema(conn)
+        cursor = conn.cursor()
 
-    # Validate số điện thoại
-    if not SDT:
-        return jsonify({"status": "error", "message": "Số điện thoại là bắt buộc"}), 400
+        new_customer_id = insert_returning_key(
+            cursor, 'KhachHang', 'MaKH',
+            ('HoTenKhongDau',) + KHACH_HANG_INSERT_COLUMNS,
+            [fold(khach_hang['HoTen'])] + [khach_hang[c] for c in KHACH_HANG_INSERT_COLUMNS]
+        )
+        conn.commit()
+        customer_index.add(dict(
+            khach_hang,
+            MaKH=new_customer_id,
+            NgaySinh=khach_hang['NgaySinh'].isoformat() if khach_hang['NgaySinh'] else None
+        ))
 
-    # Kiểm tra định dạng SDT (10-11 số)
-    if not SDT.isdigit():
-        return jsonify({"status": "error", "message": "Số điện thoại chỉ được chứa chữ số"}), 400
+        print(f" Thêm khách hàng thành công! MaKH: {new_customer_id}")
+        return jsonify({
+            "status": "success",
+            "MaKH": new_customer_id,
+            "HoTen": khach_hang['HoTen']
+        }), 201
 
-    if len(SDT) < 10 or len(SDT) > 11:
-        return jsonify({"status": "error", "message": "Số điện thoại phải có 10-11 chữ số"}), 400
+    except dialect.IntegrityError as e:
+        if 'UNIQUE' in str(e):
+            return jsonify({"status": "error", "message": "Số điện thoại đã tồn tại"}), 400
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        if 'conn' in locals():
+            try:
+                conn.rollback()
+            except:
+                pass
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-    # Validate giới tính
-    valid_genders = ['Nam', 'Nu', 'Khac', None]
-    if GioiTinh not in valid_genders:
-        return jsonify({"status": "error", "message": "Giới tính không hợp lệ"}), 400
+IMPORT_BATCH_SIZE = 1000
 
-    # Validate ngày sinh (không được tương lai)
-    if NgaySinh:
-        try:
-            ngay_sinh_date = datetime.datetime.strptime(NgaySinh, '%Y-%m-%d').date()
-            hom_nay = datetime.datetime.now().date()
-            if ngay_sinh_date > hom_nay:
-                return jsonify({"status": "error", "message": "Ngày sinh không được là tương lai"}), 400
-
-            # Kiểm tra tuổi hợp lý (ít nhất 13 tuổi)
-            tuoi = (hom_nay - ngay_sinh_date).days / 365.25
-            if tuoi < 13:
-                return jsonify({"status": "error", "message": "Khách hàng phải ít nhất 13 tuổi"}), 400
-
-            if tuoi > 150:
-                return jsonify({"status": "error", "message": "Ngày sinh không hợp lệ"}), 400
-        except ValueError:
-            return jsonify({"status": "error", "message": "Định dạng ngày sinh không hợp lệ (yêu cầu: YYYY-MM-DD)"}), 400
 
-    # Validate trạng thái
-    valid_statuses = ['Active', 'Inactive']
-    if TrangThai not in valid_statuses:
-        return jsonify({"status": "error", "message": "Trạng thái không hợp lệ"}), 400
+def _existing_sdts(cursor, sdts):
+    """Các SDT trong ``sdts`` đã có trong KhachHang (một query cho mỗi 2000 số)"""
+    existing = set()
+    for chunk in _chunks(list(sdts), MAX_SQL_PARAMS):
+        cursor.execute(f"SELECT SDT FROM KhachHang WHERE SDT IN ({_placeholders(len(chunk))})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
 
-    print(f"DEBUG - Adding customer: {data}")
 
+def _insert_khach_hang_batch(cursor, rows):
+    cursor.fast_executemany = True
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor.executemany(
+            f"INSERT INTO KhachHang (HoTenKhongDau, {', '.join(KHACH_HANG_INSERT_COLUMNS)}) "
+            f"VALUES ({_placeholders(len(KHACH_HANG_INSERT_COLUMNS) + 1)})",
+            [[fold(kh['HoTen'])] + [kh[c] for c in KHACH_HANG_INSERT_COLUMNS] for _, kh in rows]
+        )
+    finally:
+        cursor.fast_executemany = False
+
+
+def _import_khach_hang(conn, stream, fmt, report, context=None):
+    """Đọc ``stream`` và thêm khách hàng theo batch, cộng dồn kết quả vào ``report``
+    (``inserted``, ``errors``). ``context`` là JobContext khi chạy nền: báo tiến
+    độ và dừng giữa hai batch nếu việc bị huỷ (các batch trước đã commit)."""
+    seen_sdts = set()
+    today = datetime.date.today()
+    errors = report['errors']
+    processed = 0
+
+    search_columns.ensure_schema(conn)
+    cursor = conn.cursor()
+
+    for batch in batches(read_rows(stream, fmt), IMPORT_BATCH_SIZE):
+        if context is not None:
+            context.check_cancelled()
+        valid = []
+        for line_no, data in batch:
+            if isinstance(data, ImportFormatError):
+                errors.append({"row": line_no, "message": str(data)})
+                continue
+            khach_hang, row_errors = validation.KHACH_HANG.validate(data, today)
+            if row_errors:
+                errors.append({"row": line_no, "SDT": data.get('SDT'), "message": validation.error_message(row_errors)})
+                continue
+            if khach_hang['SDT'] in seen_sdts:
+                errors.append({"row": line_no, "SDT": khach_hang['SDT'], "message": "Số điện thoại bị trùng trong file"})
+                continue
+            seen_sdts.add(khach_hang['SDT'])
+            valid.append((line_no, khach_hang))
+
+        # Hai lần thử: lần sau chỉ cần khi có người thêm cùng SDT giữa lúc
+        # kiểm tra và lúc INSERT (ràng buộc UNIQUE làm hỏng cả batch)
+        for attempt in (1, 2):
+            existing = _existing_sdts(cursor, [kh['SDT'] for _, kh in valid])
+            if existing:
+                for line_no, kh in valid:
+                    if kh['SDT'] in existing:
+                        errors.append({"row": line_no, "SDT": kh['SDT'], "message": "Số điện thoại đã tồn tại"})
+                valid = [(line_no, kh) for line_no, kh in valid if kh['SDT'] not in existing]
+            if not valid:
+                break
+            try:
+                _insert_khach_hang_batch(cursor, valid)
+                conn.commit()
+                report['inserted'] += len(valid)
+                break
+            except dialect.IntegrityError:
+                conn.rollback()
+                if attempt == 2:
+                    raise
 
-        insert_query = """
-            INSERT INTO KhachHang (HoTen, GioiTinh, NgaySinh, SDT, DiaChi, TrangThai)
-            VALUES (?, ?, ?, ?, ?, ?);
-        """
+        processed += len(batch)
+        if context is not None:
+            context.progress(processed)
 
-        cursor.execute(insert_query, (HoTen, GioiTinh, NgaySinh, SDT, DiaChi, TrangThai))
-        conn.commit()
+    errors.sort(key=lambda error: error['row'])
+    print(f" Nhập khách hàng: {report['inserted']} dòng thêm mới, {len(errors)} dòng lỗi")
 
 
-        cursor.execute("SELECT MaKH FROM KhachHang WHERE SDT = ?", (SDT,))
-        result = cursor.fetchone()
+@app.route('/api/import_KhachHang', methods=['POST'])
+def import_KhachHang():
+    """Nhập khách hàng hàng loạt từ body request (CSV có header hoặc NDJSON).
 
-        if result is None:
-            raise Exception("Không thể lấy mã khách hàng vừa tạo")
+    Dùng cùng quy tắc kiểm tra với add_KhachHang. Mỗi batch IMPORT_BATCH_SIZE
+    dòng được kiểm tra trùng SDT (trong file và trong database) rồi INSERT bằng
+    fast_executemany và commit riêng; dòng lỗi được bỏ qua và ghi vào báo cáo.
+    Với ``?async=1`` file được lưu tạm và nhập bằng việc nền (trả về 202).
+    """
+    try:
+        fmt = detect_format(request.args.get('format'), request.content_type)
+    except ImportFormatError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-        new_customer_id = int(result[0])
-        conn.close()
+    if is_async_request():
+        return submit_import_job('import_khach_hang', fmt)
 
-        print(f" Thêm khách hàng thành công! MaKH: {new_customer_id}")
+    report = {"inserted": 0, "errors": []}
+    try:
+        conn = get_db()
+        _import_khach_hang(conn, request.stream, fmt, report)
         return jsonify({
             "status": "success",
-            "MaKH": new_customer_id,
-            "HoTen": HoTen
-        }), 201
+            "inserted": report['inserted'],
+            "rejected": len(report['errors']),
+            "errors": report['errors']
+        }), 200
 
-    except pyodbc.IntegrityError as e:
-        if 'UNIQUE' in str(e):
-            return jsonify({"status": "error", "message": "Số điện thoại đã tồn tại"}), 400
-        return jsonify({"status": "error", "message": str(e)}), 400
+    except ImportFormatError as e:
+        return jsonify({"status": "error", "message": str(e), "inserted": report['inserted']}), 400
     except Exception as e:
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         print("Lỗi:", e)
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return jsonify({"status": "error", "message": str(e), "inserted": report['inserted'],
+                        "errors": report['errors']}), 500
+
 
 @app.route('/search_KhachHang', methods=['GET'])
 def search_customer_page():
     return render_template('timKiemKhachHang.html')
 
 
-@app.route('/api/search_KhachHang', methods=['GET'])
-def search_KhachHang():
-    search_term = request.args.get('q', '').strip()
-
+KHACH_HANG_COLUMNS = "MaKH, HoTen, GioiTinh, NgaySinh, SDT, DiaChi, TrangThai"
+NHAN_VIEN_COLUMNS = "MaNV, HoTen, GioiTinh, Email, SDT, TrangThai, LuongCoBan, TenChucVu"
+KHACH_HANG_FIELDS = tuple(column.strip() for column in KHACH_HANG_COLUMNS.split(','))
+NHAN_VIEN_FIELDS = tuple(column.strip() for column in NHAN_VIEN_COLUMNS.split(','))
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'True') == 'True'
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MIN_LENGTH = 2
+
+
+def _khach_hang_row(row):
+    return {
+        'MaKH': row[0],
+        'HoTen': row[1],
+        'GioiTinh': row[2],
+        'NgaySinh': row[3].isoformat() if row[3] else None,
+        'SDT': row[4],
+        'DiaChi': row[5],
+        'TrangThai': row[6]
+    }
+
+
+def _nhan_vien_row(row):
+    return {
+        'MaNV': row[0],
+        'HoTen': row[1],
+        'GioiTinh': row[2],
+        'Email': row[3],
+        'SDT': row[4],
+        'TrangThai': row[5],
+        'LuongCoBan': float(row[6]) if row[6] else None,
+        'TenChucVu': row[7]
+    }
+
+
+def _index_loader(table, key, columns, to_record):
+    """Tạo hàm nạp dữ liệu cho SearchIndex: cả bảng, hoặc chỉ các dòng có khoá > after_key"""
+    def load(conn, after_key):
+        cursor = conn.cursor()
+        if after_key is None:
+            cursor.execute(f"SELECT {columns} FROM {table}")
+        else:
+            cursor.execute(f"SELECT {columns} FROM {table} WHERE {key} > ?", (after_key,))
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            for row in rows:
+                yield to_record(row)
+    return load
+
+
+customer_index = SearchIndex(
+    'MaKH', _index_loader('KhachHang', 'MaKH', KHACH_HANG_COLUMNS, _khach_hang_row),
+    refresh_interval=float(os.getenv('SEARCH_INDEX_REFRESH', '30')),
+    rebuild_interval=float(os.getenv('SEARCH_INDEX_REBUILD', '600')),
+)
+employee_index = SearchIndex(
+    'MaNV', _index_loader('NhanVien', 'MaNV', NHAN_VIEN_COLUMNS, _nhan_vien_row),
+    refresh_interval=float(os.getenv('SEARCH_INDEX_REFRESH', '30')),
+    rebuild_interval=float(os.getenv('SEARCH_INDEX_REBUILD', '600')),
+)
+
+
+def search_with_index(index, table, columns, to_record, search_term):
+    """Tìm bằng chỉ mục trong bộ nhớ; nếu chỉ mục tắt hoặc lỗi thì quay về LIKE trên SQL"""
+    conn = get_db()
+    if SEARCH_INDEX_ENABLED:
+        try:
+            index.ensure_fresh(conn)
+            return index.search(search_term)
+        except Exception as e:
+            print("Lỗi chỉ mục tìm kiếm, chuyển sang SQL:", e)
+            conn.rollback()
+
+    search_columns.ensure_schema(conn)
+    cursor = conn.cursor()
+    rows = _sql_search_phase(cursor, table, index.key_field, columns, search_term, True)
+    rows += _sql_search_phase(cursor, table, index.key_field, columns, search_term, False)
+    return [to_record(row) for row in rows]
+
+
+def _sql_search_phase(cursor, table, key, columns, search_term, seek, limit=None, after=None):
+    """Một lượt tìm trên SQL theo cột tính sẵn HoTenKhongDau / SDTDaoNguoc.
+
+    ``seek=True``: chỉ các điều kiện dùng được index seek (đầu họ tên, đầu số,
+    đuôi số). ``seek=False``: các dòng còn lại chỉ khớp ở giữa chuỗi. Kết quả xếp
+    theo (Hang, KhongActive, TenKhongDau, khoá) giống chỉ mục trong bộ nhớ.
+    """
+    query = search_columns.like_escape(fold(search_term))
+    phone = search_columns.like_escape(search_term)
+    reversed_phone = search_columns.like_escape(search_term[::-1])
+    is_phone = search_term.isdigit()
+
+    if is_phone:
+        seek_where = "(SDT LIKE ? ESCAPE '\\' OR SDTDaoNguoc LIKE ? ESCAPE '\\' OR HoTenKhongDau LIKE ? ESCAPE '\\')"
+        seek_values = [phone + '%', reversed_phone + '%', query + '%']
+        contains_where = "(SDT LIKE ? ESCAPE '\\' OR HoTenKhongDau LIKE ? ESCAPE '\\')"
+        contains_values = ['%' + phone + '%', '%' + query + '%']
+    else:
+        seek_where = "HoTenKhongDau LIKE ? ESCAPE '\\'"
+        seek_values = [query + '%']
+        contains_where = "HoTenKhongDau LIKE ? ESCAPE '\\'"
+        contains_values = ['%' + query + '%']
+
+    if seek:
+        where, values = seek_where, seek_values
+    else:
+        where, values = f"{contains_where} AND NOT {seek_where}", contains_values + seek_values
+
+    values = [
+        search_term, fold(search_term),
+        phone + '%', query + '%',
+        reversed_phone + '%',
+        '% ' + query + '%'
+    ] + values
+
+    keyset = ""
+    if after is not None:
+        hang, khong_active, ten, after_key = after
+        khong_active = 1 if khong_active else 0
+        keyset = f"""
+            WHERE Hang > ? OR (Hang = ? AND (
+                  KhongActive > ? OR (KhongActive = ? AND (
+                  TenKhongDau > ? OR (TenKhongDau = ? AND {key} > ?)))))
+        """
+        values += [hang, hang, khong_active, khong_active, ten, ten, after_key]
+
+    top = ""
+    if limit is not None:
+        top = "TOP (?)"
+        values = [limit] + values
+
+    cursor.execute(f"""
+        SELECT {top} *
+        FROM (
+            SELECT {columns},
+                   CASE
+                       WHEN SDT = ? OR HoTenKhongDau = ? THEN 0
+                       WHEN SDT LIKE ? ESCAPE '\\' OR HoTenKhongDau LIKE ? ESCAPE '\\' THEN 1
+                       WHEN SDTDaoNguoc LIKE ? ESCAPE '\\' THEN 3
+                       WHEN HoTenKhongDau LIKE ? ESCAPE '\\' THEN 2
+                       ELSE 4
+                   END AS Hang,
+                   CASE WHEN TrangThai = 'Active' THEN 0 ELSE 1 END AS KhongActive,
+                   ISNULL(HoTenKhongDau, '') AS TenKhongDau
+            FROM {table}
+            WHERE {where}
+        ) AS t
+        {keyset}
+        ORDER BY Hang, KhongActive, TenKhongDau, {key}
+    """, values)
+    return cursor.fetchall()
+
+
+def parse_search_args(args):
+    """Đọc q, limit và con trỏ trang sau của API tìm kiếm dạng typeahead"""
+    search_term = args.get('q', '').strip()
     if not search_term:
-        return jsonify({"status": "error", "message": "Thiếu từ khóa tìm kiếm"}), 400
+        raise ListParamError("Thiếu từ khóa tìm kiếm")
+    if len(search_term) < SEARCH_MIN_LENGTH:
+        raise ListParamError(f"Từ khóa tìm kiếm cần ít nhất {SEARCH_MIN_LENGTH} ký tự")
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        limit = int(args.get('limit', SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise ListParamError("limit phải là số")
 
-        search_pattern = f'%{search_term}%'
+    return {
+        'q': search_term,
+        'after': _decode_cursor(args['after'], size=4) if args.get('after') else None,
+        'limit': max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    }
 
-        query = """
-            SELECT
-                kh.MaKH,
-                kh.HoTen,
-                kh.GioiTinh,
-                kh.NgaySinh,
-                kh.SDT,
-                kh.DiaChi,
-                kh.TrangThai
-            FROM KhachHang kh
-            WHERE kh.SDT LIKE ?
-               OR kh.HoTen LIKE ?
-               OR kh.HoTen COLLATE Latin1_General_CI_AI LIKE ?
-            ORDER BY kh.TrangThai DESC, kh.HoTen ASC
-        """
 
-        cursor.execute(query, (search_pattern, search_pattern, search_pattern))
-        rows = cursor.fetchall()
-        conn.close()
-
-        customers = []
-        for row in rows:
-            customers.append({
-                'MaKH': row[0],
-                'HoTen': row[1],
-                'GioiTinh': row[2],
-                'NgaySinh': row[3].isoformat() if row[3] else None,
-                'SDT': row[4],
-                'DiaChi': row[5],
-                'TrangThai': row[6]
-            })
+def search_page_with_index(index, table, columns, to_record, params):
+    """Một trang kết quả tìm kiếm, đã xếp hạng: (danh sách, con trỏ trang sau hoặc None).
+
+    Dùng chỉ mục trong bộ nhớ nếu có; nếu không thì SQL xếp hạng tương tự
+    (SDT trùng khớp, khớp đầu, khớp đầu một từ, khớp đuôi số, còn lại) và chỉ
+    đọc ``limit + 1`` dòng theo keyset trên (hạng, không Active, HoTenKhongDau, khoá).
+    """
+    conn = get_db()
+    if SEARCH_INDEX_ENABLED:
+        try:
+            index.ensure_fresh(conn)
+            records, next_after = index.search_page(params['q'], params['limit'], params['after'])
+            return records, _encode_cursor(next_after) if next_after else None
+        except Exception as e:
+            print("Lỗi chỉ mục tìm kiếm, chuyển sang SQL:", e)
+            conn.rollback()
+
+    search_columns.ensure_schema(conn)
+    cursor = conn.cursor()
+    key = index.key_field
+    limit, after = params['limit'], params['after']
+
+    # Hạng 0-1 (0-3 với số điện thoại) đến từ lượt seek, các hạng sau từ lượt
+    # quét chuỗi con; lượt quét chỉ chạy khi lượt seek không đủ một trang
+    seek_max_rank = 3 if params['q'].isdigit() else 1
+    rows = []
+    if after is None or after[0] <= seek_max_rank:
+        rows = _sql_search_phase(cursor, table, key, columns, params['q'], True, limit + 1, after)
+    if len(rows) <= limit:
+        contains_after = after if after is not None and after[0] > seek_max_rank else None
+        rows += _sql_search_phase(cursor, table, key, columns, params['q'], False,
+                                  limit + 1 - len(rows), contains_after)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        # Đọc theo vị trí (khoá là cột đầu, ba cột xếp hạng ở cuối) vì dòng của
+        # SQLite là tuple, không truy cập theo tên cột như pyodbc.Row
+        next_cursor = _encode_cursor([last[-3], last[-2], last[-1], last[0]])
+    return [to_record(row) for row in rows], next_cursor
+
+
+@app.route('/api/search_KhachHang', methods=['GET'])
+def search_KhachHang():
+    """Tìm khách hàng dạng typeahead: ?q=&limit=&after=<con trỏ>"""
+    try:
+        params = parse_search_args(request.args)
+    except ListParamError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        customers, next_cursor = search_page_with_index(
+            customer_index, 'KhachHang', KHACH_HANG_COLUMNS, _khach_hang_row, params
+        )
 
         return jsonify({
             "status": "success",
-            "data": customers,
-            "count": len(customers)
+            "data": to_columns(customers, KHACH_HANG_FIELDS) if wants_columns() else customers,
+            "count": len(customers),
+            "next": next_cursor
         }), 200
 
     except Exception as e:
@@ -425,6 +1062,38 @@ def thong_ke_doanh_thu_page():
     return render_template('thongKeDoanhThu.html')
 
 
+def parse_khoang_ngay(from_date, to_date):
+    """Đổi from_date / to_date (YYYY-MM-DD, tính cả hai đầu) thành khoảng nửa mở [từ, đến)"""
+    tu_ngay = datetime.datetime.strptime(from_date, '%Y-%m-%d').date()
+    den_ngay = datetime.datetime.strptime(to_date, '%Y-%m-%d').date() + datetime.timedelta(days=1)
+    return tu_ngay, den_ngay
+
+
+dashboard_cache = rollups.DashboardCache(
+    max_size=int(os.getenv('DASHBOARD_CACHE_SIZE', '256')),
+    open_ttl=float(os.getenv('DASHBOARD_CACHE_TTL', '30')),
+)
+
+# Các câu độc lập của dashboard chạy song song, mỗi câu một kết nối mượn từ
+# pool; quá QUERY_TIMEOUT giây thì huỷ cả nhóm và trả 504
+CONCURRENT_QUERIES = os.getenv('CONCURRENT_QUERIES', 'True') == 'True'
+QUERY_WORKERS = int(os.getenv('QUERY_WORKERS', '4'))
+QUERY_TIMEOUT = float(os.getenv('QUERY_TIMEOUT', '30'))
+query_runner = ConcurrentQueries(db_pool, QUERY_WORKERS, metrics) if CONCURRENT_QUERIES else None
+
+
+def dashboard_payload(result):
+    """Kết quả dashboard, đổi các danh sách sang dạng cột nếu client yêu cầu"""
+    if not wants_columns():
+        return result
+    return {
+        **result,
+        "employee_stats": to_columns(result["employee_stats"], rollups.EMPLOYEE_FIELDS),
+        "product_stats": to_columns(result["product_stats"], rollups.PRODUCT_FIELDS),
+        "top_products": to_columns(result["top_products"], rollups.PRODUCT_FIELDS)
+    }
+
+
 @app.route('/api/thong_ke_doanh_thu', methods=['GET'])
 def thong_ke_doanh_thu():
     from_date = request.args.get('from_date')
@@ -437,119 +1106,188 @@ def thong_ke_doanh_thu():
         }), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        tu_ngay, den_ngay = parse_khoang_ngay(from_date, to_date)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "Định dạng ngày không hợp lệ (yêu cầu: YYYY-MM-DD)"
+        }), 400
 
-        # Query đơn hàng
-        query_orders = """
-            SELECT
-                dh.MaDH,
-                dh.ThoiGianTao,
-                kh.HoTen as TenKhachHang,
-                nv.HoTen as TenNhanVien,
-                dh.TrangThaiXuLy,
-                dh.TongTien
-            FROM DonHang dh
-            INNER JOIN KhachHang kh ON dh.MaKH = kh.MaKH
-            INNER JOIN NhanVien nv ON dh.MaNV = nv.MaNV
-            WHERE CAST(dh.ThoiGianTao AS DATE) >= ?
-              AND CAST(dh.ThoiGianTao AS DATE) <= ?
-            ORDER BY dh.ThoiGianTao DESC
-        """
+    if is_async_request():
+        # Đã có trong cache thì trả luôn, không cần tạo việc nền
+        report_generation.check()
+        result = dashboard_cache.get(tu_ngay, den_ngay)
+        if result is not None:
+            return jsonify({"status": "success", **dashboard_payload(result)}), 200
+        return submit_job('thong_ke_doanh_thu', {"from_date": from_date, "to_date": to_date})
 
-        cursor.execute(query_orders, (from_date, to_date))
-        rows = cursor.fetchall()
-
-        orders = []
-        total_revenue = 0
-        completed_revenue = 0
-
-        for row in rows:
-            order = {
-                'MaDH': row[0],
-                'ThoiGianTao': row[1].isoformat() if row[1] else None,
-                'TenKhachHang': row[2],
-                'TenNhanVien': row[3],
-                'TrangThaiXuLy': row[4],
-                'TongTien': float(row[5]) if row[5] else 0
-            }
-            orders.append(order)
-            total_revenue += order['TongTien']
-            if order['TrangThaiXuLy'] == 'Hoàn tất':
-                completed_revenue += order['TongTien']
+    try:
+        conn = get_db()
+        rollups.ensure_schema(conn)
 
-        # Query doanh số theo nhân viên
-        query_employee_stats = """
-            SELECT
-                nv.HoTen as TenNhanVien,
-                COUNT(dh.MaDH) as SoDonHang,
-                SUM(dh.TongTien) as TongDoanhThu
-            FROM DonHang dh
-            INNER JOIN NhanVien nv ON dh.MaNV = nv.MaNV
-            WHERE CAST(dh.ThoiGianTao AS DATE) >= ?
-              AND CAST(dh.ThoiGianTao AS DATE) <= ?
-            GROUP BY nv.MaNV, nv.HoTen
-            ORDER BY TongDoanhThu DESC
-        """
+        # Tổng hợp lấy từ bảng doanh thu theo ngày, khoảng ngày đã qua thì
+        # dùng lại kết quả đã tính
+        report_generation.check()
+        result = dashboard_cache.get(tu_ngay, den_ngay)
+        if result is None:
+            hom_nay = datetime.date.today()
+            if query_runner is not None:
+                # Trả kết nối của request trước khi chạy song song để không
+                # giữ một kết nối nằm chờ trong lúc các câu mượn kết nối khác
+                release_db(None)
+                result = rollups.dashboard_concurrent(query_runner, tu_ngay, den_ngay, QUERY_TIMEOUT)
+            else:
+                result = rollups.dashboard(conn.cursor(), tu_ngay, den_ngay)
+            dashboard_cache.put(tu_ngay, den_ngay, result, hom_nay)
+
+        return jsonify({"status": "success", **dashboard_payload(result)}), 200
+
+    except QueryTimeout as e:
+        print("Lỗi thống kê:", e)
+        return jsonify({
+            "status": "error",
+            "message": "Thống kê mất quá nhiều thời gian, vui lòng thu hẹp khoảng ngày hoặc thử lại sau"
+        }), 504
 
-        cursor.execute(query_employee_stats, (from_date, to_date))
-        employee_rows = cursor.fetchall()
+    except Exception as e:
+        print("Lỗi thống kê:", e)
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
 
-        employee_stats = []
-        for row in employee_rows:
-            employee_stats.append({
-                'TenNhanVien': row[0],
-                'SoDonHang': row[1],
-                'TongDoanhThu': float(row[2]) if row[2] else 0
-            })
 
-        # Query doanh số theo sản phẩm
-        query_product_stats = """
-            SELECT
-                l.TenSP,
-                SUM(ct.SoLuong) as SoLuongBan,
-                SUM(ct.SoLuong * ct.GiaBan) as DoanhThu
-            FROM ChiTietDonHang ct
-            INNER JOIN Laptop l ON ct.MaSP = l.MaSP
-            INNER JOIN DonHang dh ON ct.MaDH = dh.MaDH
-            WHERE CAST(dh.ThoiGianTao AS DATE) >= ?
-              AND CAST(dh.ThoiGianTao AS DATE) <= ?
-            GROUP BY l.MaSP, l.TenSP
-            ORDER BY SoLuongBan DESC
-        """
+ORDER_PAGE_SIZE = 100
+ORDER_MAX_PAGE_SIZE = 1000
+ORDER_STREAM_CHUNK = 500
+
+
+def _encode_order_cursor(order):
+    # Giữ nguyên ThoiGianTao đọc từ DB (tới micro giây) để trang sau so sánh đúng
+    return _encode_cursor([order['ThoiGianTao'].isoformat(), order['MaDH']])
 
-        cursor.execute(query_product_stats, (from_date, to_date))
-        product_rows = cursor.fetchall()
 
-        product_stats = []
-        for row in product_rows:
-            product_stats.append({
-                'TenSP': row[0],
-                'SoLuongBan': row[1],
-                'DoanhThu': float(row[2]) if row[2] else 0
-            })
+def _decode_order_cursor(cursor):
+    """Con trỏ trang đơn hàng: (ThoiGianTao, MaDH) của dòng cuối trang trước"""
+    thoi_gian, ma_dh = _decode_cursor(cursor)
+    try:
+        return datetime.datetime.fromisoformat(thoi_gian), int(ma_dh)
+    except (TypeError, ValueError):
+        raise ListParamError("Con trỏ phân trang không hợp lệ")
+
+
+def query_orders(cursor, tu_ngay, den_ngay, after=None, limit=None):
+    """Chạy truy vấn danh sách đơn hàng trong [tu_ngay, den_ngay), người gọi tự fetchmany.
+
+    Sắp xếp và phân trang (keyset) theo (ThoiGianTao, MaDH) giảm dần; ``after`` là
+    cặp (ThoiGianTao, MaDH) của dòng cuối trang trước.
+    """
+    where = ["dh.ThoiGianTao >= ?", "dh.ThoiGianTao < ?"]
+    values = [
+        datetime.datetime.combine(tu_ngay, datetime.time.min),
+        datetime.datetime.combine(den_ngay, datetime.time.min)
+    ]
+    if after is not None:
+        # Viết dạng t <= ? AND (t < ? OR MaDH < ?) để seek được trên index
+        param = dialects.of(cursor).datetime_param
+        where.append(f"dh.ThoiGianTao <= {param} AND (dh.ThoiGianTao < {param} OR dh.MaDH < ?)")
+        values += [after[0], after[0], after[1]]
+
+    top = ""
+    if limit is not None:
+        top = "TOP (?)"
+        values.insert(0, limit)
+
+    # Điều kiện nửa mở trên ThoiGianTao (không CAST cột) để SQL Server seek được
+    # trên index IX_DonHang_ThoiGianTao_MaDH
+    cursor.execute(f"""
+        SELECT {top}
+            dh.MaDH,
+            dh.ThoiGianTao,
+            kh.HoTen as TenKhachHang,
+            nv.HoTen as TenNhanVien,
+            dh.TrangThaiXuLy,
+            dh.TongTien
+        FROM DonHang dh
+        INNER JOIN KhachHang kh ON dh.MaKH = kh.MaKH
+        INNER JOIN NhanVien nv ON dh.MaNV = nv.MaNV
+        WHERE {' AND '.join(where)}
+        ORDER BY dh.ThoiGianTao DESC, dh.MaDH DESC
+    """, values)
+    return cursor
+
+
+ORDER_FIELDS = ('MaDH', 'ThoiGianTao', 'TenKhachHang', 'TenNhanVien', 'TrangThaiXuLy', 'TongTien')
+
+
+def _order_row(row):
+    # Decimal / datetime để JSON provider tự đổi thành số / chuỗi ISO
+    return {
+        'MaDH': row[0],
+        'ThoiGianTao': row[1],
+        'TenKhachHang': row[2],
+        'TenNhanVien': row[3],
+        'TrangThaiXuLy': row[4],
+        'TongTien': row[5] or 0
+    }
+
+
+@app.route('/api/thong_ke_doanh_thu/orders', methods=['GET'])
+def thong_ke_don_hang():
+    """Danh sách đơn hàng theo khoảng ngày: phân trang (?after=&limit=, thêm
+    ?format=columns để trả dạng cột) hoặc stream NDJSON (?format=ndjson)"""
+    from_date = request.args.get('from_date')
+    to_date = request.args.get('to_date')
+
+    if not from_date or not to_date:
+        return jsonify({
+            "status": "error",
+            "message": "Thiếu thông tin ngày bắt đầu hoặc ngày kết thúc"
+        }), 400
+
+    try:
+        tu_ngay, den_ngay = parse_khoang_ngay(from_date, to_date)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "Định dạng ngày không hợp lệ (yêu cầu: YYYY-MM-DD)"
+        }), 400
 
-        # Top 5 sản phẩm bán chạy
-        top_products = product_stats[:5]
+    try:
+        after = _decode_order_cursor(request.args['after']) if request.args.get('after') else None
+        limit = int(request.args.get('limit', ORDER_PAGE_SIZE))
+    except ListParamError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit phải là số"}), 400
+    limit = max(1, min(limit, ORDER_MAX_PAGE_SIZE))
 
-        conn.close()
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            try:
+                cursor = query_orders(get_db().cursor(), tu_ngay, den_ngay, after)
+                while True:
+                    rows = cursor.fetchmany(ORDER_STREAM_CHUNK)
+                    if not rows:
+                        break
+                    yield b''.join(app.json.dumps_line(_order_row(row)) for row in rows)
+            except Exception as e:
+                # Header đã gửi đi nên chỉ báo lỗi bằng một dòng cuối
+                print("Lỗi thống kê:", e)
+                yield app.json.dumps_line({"status": "error", "message": str(e)})
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-        # Tính toán thống kê
-        total_orders = len(orders)
-        avg_revenue = total_revenue / total_orders if total_orders > 0 else 0
+    try:
+        cursor = query_orders(get_db().cursor(), tu_ngay, den_ngay, after, limit + 1)
+        rows = cursor.fetchmany(limit + 1)
+        orders = [_order_row(row) for row in rows[:limit]]
 
         return jsonify({
             "status": "success",
-            "summary": {
-                "total_orders": total_orders,
-                "total_revenue": total_revenue,
-                "completed_revenue": completed_revenue,
-                "avg_revenue": avg_revenue
-            },
-            "orders": orders,
-            "employee_stats": employee_stats,
-            "product_stats": product_stats,
-            "top_products": top_products
+            "data": to_columns(orders, ORDER_FIELDS) if wants_columns() else orders,
+            "count": len(orders),
+            "next": _encode_order_cursor(orders[-1]) if len(rows) > limit else None
         }), 200
 
     except Exception as e:
@@ -560,6 +1298,55 @@ def thong_ke_doanh_thu():
         }), 500
 
 
+def _rebuild_thong_ke(conn, tu, den):
+    rollups.ensure_schema(conn)
+    rollups.rebuild(conn, tu, den)
+    dashboard_cache.clear()
+    # Đơn hàng đã bị sửa ngoài ứng dụng: bỏ luôn hoá đơn đã render trong khoảng đó
+    if tu is None:
+        invoice_cache.clear()
+    else:
+        invoice_cache.invalidate_range(tu, den)
+    # Báo các worker gunicorn khác xoá cache của họ
+    report_generation.bump()
+
+
+@app.route('/api/thong_ke_doanh_thu/rebuild', methods=['POST'])
+def rebuild_thong_ke_doanh_thu():
+    """Tính lại bảng tổng hợp doanh thu cho một khoảng ngày (hoặc toàn bộ nếu không truyền)"""
+    data = request.get_json(silent=True) or {}
+    from_date = data.get('from_date')
+    to_date = data.get('to_date')
+
+    tu, den = None, None
+    if from_date or to_date:
+        if not from_date or not to_date:
+            return jsonify({"status": "error", "message": "Cần cả from_date và to_date"}), 400
+        try:
+            tu_ngay, den_ngay = parse_khoang_ngay(from_date, to_date)
+        except ValueError:
+            return jsonify({"status": "error", "message": "Định dạng ngày không hợp lệ (yêu cầu: YYYY-MM-DD)"}), 400
+        tu = datetime.datetime.combine(tu_ngay, datetime.time.min)
+        den = datetime.datetime.combine(den_ngay, datetime.time.min)
+
+    if is_async_request():
+        return submit_job('rebuild_thong_ke', {"from_date": from_date, "to_date": to_date})
+
+    try:
+        conn = get_db()
+        _rebuild_thong_ke(conn, tu, den)
+        return jsonify({"status": "success", "message": "Đã tính lại thống kê doanh thu"}), 200
+
+    except Exception as e:
+        if 'conn' in locals():
+            try:
+                conn.rollback()
+            except:
+                pass
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route('/api/search_employees', methods=['GET'])
 def search_employees():
     search_term = request.args.get('q', '').strip()
@@ -568,47 +1355,11 @@ def search_employees():
         return jsonify({"status": "error", "message": "Thiếu từ khóa tìm kiếm"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        search_pattern = f'%{search_term}%'
-
-        query = """
-            SELECT
-                nv.MaNV,
-                nv.HoTen,
-                nv.GioiTinh,
-                nv.Email,
-                nv.SDT,
-                nv.TrangThai,
-                nv.LuongCoBan,
-                nv.TenChucVu
-            FROM NhanVien nv
-            WHERE nv.SDT LIKE ?
-               OR nv.HoTen LIKE ?
-               OR nv.HoTen COLLATE Latin1_General_CI_AI LIKE ?
-            ORDER BY nv.TrangThai DESC, nv.HoTen ASC
-        """
-
-        cursor.execute(query, (search_pattern, search_pattern, search_pattern))
-        rows = cursor.fetchall()
-        conn.close()
-        employees = []
-        for row in rows:
-            employees.append({
-                'MaNV': row[0],
-                'HoTen': row[1],
-                'GioiTinh': row[2],
-                'Email': row[3],
-                'SDT': row[4],
-                'TrangThai': row[5],
-                'LuongCoBan': float(row[6]) if row[6] else None,
-                'TenChucVu': row[7]
-            })
+        employees = search_with_index(employee_index, 'NhanVien', NHAN_VIEN_COLUMNS, _nhan_vien_row, search_term)
 
         return jsonify({
             "status": "success",
-            "data": employees,
+            "data": to_columns(employees, NHAN_VIEN_FIELDS) if wants_columns() else employees,
             "count": len(employees)
         }), 200
 
@@ -629,18 +1380,11 @@ def edit_laptop_form(maSP):
 
 @app.route('/api/laptop/<int:maSP>', methods=['GET'])
 def get_laptop(maSP):
-    """Lấy thông tin chi tiết của một laptop theo MaSP"""
+    """Lấy thông tin chi tiết của một laptop theo MaSP (thêm ?fresh=1 để đọc thẳng DB)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        laptop = load_laptops([maSP], fresh=request.args.get('fresh') == '1').get(maSP)
 
-        cursor.execute("SELECT * FROM Laptop WHERE MaSP = ?", (maSP,))
-        columns = [column[0] for column in cursor.description]
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            laptop = dict(zip(columns, row))
+        if laptop:
             return jsonify({
                 "status": "success",
                 "data": laptop
@@ -656,160 +1400,57 @@ def get_laptop(maSP):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@app.route('/api/add_laptop', methods=['POST'])
-def add_laptop():
-    """Thêm laptop mới vào database"""
-    data = request.get_json()
+LAPTOP_WRITE_COLUMNS = ('TenSP', 'Hang', 'GiaBan', 'CauHinh', 'Kho', 'MaNCC', 'NgayNhap', 'TrangThai')
 
-    TenSP = data.get('TenSP', '').strip()
-    Hang = data.get('Hang', '').strip()
-    GiaBan = data.get('GiaBan')
-    CauHinh = data.get('CauHinh', '').strip() if data.get('CauHinh') else None
-    Kho = data.get('Kho', 0)
-    MaNCC = data.get('MaNCC')
-    NgayNhap = data.get('NgayNhap')
-    TrangThai = data.get('TrangThai', 'Active')
-
-    # Validation cơ bản
-    if not TenSP or not Hang or GiaBan is None:
-        return jsonify({
-            "status": "error",
-            "message": "Thiếu thông tin bắt buộc (Tên SP, Hãng, Giá Bán)"
-        }), 400
 
-    # Validate độ dài tên sản phẩm
-    if len(TenSP) < 3:
-        return jsonify({
-            "status": "error",
-            "message": "Tên sản phẩm phải có ít nhất 3 ký tự"
-        }), 400
+def existing_suppliers(cursor, ma_nccs):
+    """Các MaNCC trong ``ma_nccs`` có trong NhaCungCap (một query cho mỗi 2000 mã)"""
+    found = set()
+    for chunk in _chunks(list(ma_nccs), MAX_SQL_PARAMS):
+        cursor.execute(f"SELECT MaNCC FROM NhaCungCap WHERE MaNCC IN ({_placeholders(len(chunk))})", chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return found
 
-    if len(TenSP) > 255:
-        return jsonify({
-            "status": "error",
-            "message": "Tên sản phẩm không được quá 255 ký tự"
-        }), 400
 
-    # Validate hãng
-    if len(Hang) < 2:
-        return jsonify({
-            "status": "error",
-            "message": "Tên hãng phải có ít nhất 2 ký tự"
-        }), 400
+@app.route('/api/add_laptop', methods=['POST'])
+def add_laptop():
+    """Thêm laptop mới vào database"""
+    data = request.get_json()
 
-    # Validate giá bán
-    try:
-        GiaBan = float(GiaBan)
-        if GiaBan <= 0:
-            return jsonify({
-                "status": "error",
-                "message": "Giá bán phải lớn hơn 0"
-            }), 400
-        if GiaBan > 1000000000:  # 1 tỷ
-            return jsonify({
-                "status": "error",
-                "message": "Giá bán không hợp lệ (quá lớn)"
-            }), 400
-    except (ValueError, TypeError):
-        return jsonify({
-            "status": "error",
-            "message": "Giá bán phải là số"
-        }), 400
+    laptop, errors = validation.LAPTOP_THEM.validate(data)
+    if errors:
+        return jsonify({"status": "error", "message": validation.error_message(errors), "errors": errors}), 400
 
-    # Validate kho
     try:
-        Kho = int(Kho)
-        if Kho < 0:
-            return jsonify({
-                "status": "error",
-                "message": "Số lượng kho không được âm"
-            }), 400
-        if Kho > 100000:
-            return jsonify({
-                "status": "error",
-                "message": "Số lượng kho không hợp lệ (quá lớn)"
-            }), 400
-    except (ValueError, TypeError):
-        return jsonify({
-            "status": "error",
-            "message": "Số lượng kho phải là số nguyên"
-        }), 400
-
-    # Validate ngày nhập (không được tương lai)
-    if NgayNhap:
-        try:
-            ngay_nhap_date = datetime.datetime.strptime(NgayNhap, '%Y-%m-%d').date()
-            hom_nay = datetime.datetime.now().date()
-            if ngay_nhap_date > hom_nay:
-                return jsonify({
-                    "status": "error",
-                    "message": "Ngày nhập không được là tương lai"
-                }), 400
-        except ValueError:
-            return jsonify({
-                "status": "error",
-                "message": "Định dạng ngày nhập không hợp lệ (yêu cầu: YYYY-MM-DD)"
-            }), 400
-
-    # Validate trạng thái
-    valid_statuses = ['Active', 'Ngừng kinh doanh']
-    if TrangThai not in valid_statuses:
-        return jsonify({
-            "status": "error",
-            "message": f"Trạng thái không hợp lệ. Phải là: {', '.join(valid_statuses)}"
-        }), 400
+        conn = get_db()
+        cursor = conn.cursor()
 
-    # Validate MaNCC nếu có
-    if MaNCC:
-        try:
-            MaNCC = int(MaNCC)
-            conn_temp = get_db_connection()
-            cursor_temp = conn_temp.cursor()
-            cursor_temp.execute("SELECT MaNCC FROM NhaCungCap WHERE MaNCC = ?", (MaNCC,))
-            if not cursor_temp.fetchone():
-                conn_temp.close()
-                return jsonify({
-                    "status": "error",
-                    "message": f"Không tìm thấy nhà cung cấp với mã {MaNCC}"
-                }), 400
-            conn_temp.close()
-        except (ValueError, TypeError):
+        if laptop['MaNCC'] and not existing_suppliers(cursor, [laptop['MaNCC']]):
             return jsonify({
                 "status": "error",
-                "message": "Mã nhà cung cấp phải là số"
+                "message": f"Không tìm thấy nhà cung cấp với mã {laptop['MaNCC']}"
             }), 400
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        insert_query = """
-            INSERT INTO Laptop (TenSP, Hang, GiaBan, CauHinh, Kho, MaNCC, NgayNhap,TrangThai)
-            VALUES (?, ?, ?, ?, ?, ?, ?,?);
-        """
-
-        cursor.execute(insert_query, (TenSP, Hang, GiaBan, CauHinh, Kho, MaNCC,NgayNhap,TrangThai))
+        new_laptop_id = insert_returning_key(
+            cursor, 'Laptop', 'MaSP',
+            LAPTOP_WRITE_COLUMNS,
+            [laptop[c] for c in LAPTOP_WRITE_COLUMNS]
+        )
         conn.commit()
+        catalog_cache.invalidate(new_laptop_id)
 
-
-        cursor.execute("SELECT SCOPE_IDENTITY() AS MaSP")
-        result = cursor.fetchone()
-
-
-        conn.close()
-
-        print(f"✓ Thêm laptop thành công!")
+        print(f"✓ Thêm laptop thành công! MaSP: {new_laptop_id}")
         return jsonify({
             "status": "success",
-            "TenSP": TenSP,
-            "NgayNhap": NgayNhap
+            "MaSP": new_laptop_id,
+            "TenSP": laptop['TenSP'],
+            "NgayNhap": laptop['NgayNhap'].isoformat() if laptop['NgayNhap'] else None
         }), 201
 
     except Exception as e:
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         print("Lỗi:", e)
@@ -821,132 +1462,22 @@ def update_laptop(maSP):
     """Cập nhật thông tin laptop"""
     data = request.get_json()
 
-    TenSP = data.get('TenSP', '').strip()
-    Hang = data.get('Hang', '').strip()
-    GiaBan = data.get('GiaBan')
-    CauHinh = data.get('CauHinh', '').strip() if data.get('CauHinh') else None
-    Kho = data.get('Kho')
-    MaNCC = data.get('MaNCC')
-    NgayNhap = data.get('NgayNhap')
-    TrangThai = data.get('TrangThai', 'Active')
-
-    # Validation cơ bản
-    if not TenSP or not Hang or GiaBan is None:
-        return jsonify({
-            "status": "error",
-            "message": "Thiếu thông tin bắt buộc (Tên SP, Hãng, Giá Bán)"
-        }), 400
+    laptop, errors = validation.LAPTOP_SUA.validate(data)
+    if errors:
+        return jsonify({"status": "error", "message": validation.error_message(errors), "errors": errors}), 400
 
-    # Validate độ dài tên sản phẩm
-    if len(TenSP) < 3:
-        return jsonify({
-            "status": "error",
-            "message": "Tên sản phẩm phải có ít nhất 3 ký tự"
-        }), 400
-
-    if len(TenSP) > 255:
-        return jsonify({
-            "status": "error",
-            "message": "Tên sản phẩm không được quá 255 ký tự"
-        }), 400
-
-    # Validate hãng
-    if len(Hang) < 2:
-        return jsonify({
-            "status": "error",
-            "message": "Tên hãng phải có ít nhất 2 ký tự"
-        }), 400
-
-    # Validate giá bán
     try:
-        GiaBan = float(GiaBan)
-        if GiaBan <= 0:
-            return jsonify({
-                "status": "error",
-                "message": "Giá bán phải lớn hơn 0"
-            }), 400
-        if GiaBan > 1000000000:
-            return jsonify({
-                "status": "error",
-                "message": "Giá bán không hợp lệ (quá lớn)"
-            }), 400
-    except (ValueError, TypeError):
-        return jsonify({
-            "status": "error",
-            "message": "Giá bán phải là số"
-        }), 400
-
-    # Validate kho
-    try:
-        Kho = int(Kho)
-        if Kho < 0:
-            return jsonify({
-                "status": "error",
-                "message": "Số lượng kho không được âm"
-            }), 400
-        if Kho > 100000:
-            return jsonify({
-                "status": "error",
-                "message": "Số lượng kho không hợp lệ (quá lớn)"
-            }), 400
-    except (ValueError, TypeError):
-        return jsonify({
-            "status": "error",
-            "message": "Số lượng kho phải là số nguyên"
-        }), 400
-
-    # Validate ngày nhập
-    if NgayNhap:
-        try:
-            ngay_nhap_date = datetime.datetime.strptime(NgayNhap, '%Y-%m-%d').date()
-            hom_nay = datetime.datetime.now().date()
-            if ngay_nhap_date > hom_nay:
-                return jsonify({
-                    "status": "error",
-                    "message": "Ngày nhập không được là tương lai"
-                }), 400
-        except ValueError:
-            return jsonify({
-                "status": "error",
-                "message": "Định dạng ngày nhập không hợp lệ (yêu cầu: YYYY-MM-DD)"
-            }), 400
-
-    # Validate trạng thái
-    valid_statuses = ['Active', 'Ngừng kinh doanh']
-    if TrangThai not in valid_statuses:
-        return jsonify({
-            "status": "error",
-            "message": f"Trạng thái không hợp lệ. Phải là: {', '.join(valid_statuses)}"
-        }), 400
+        conn = get_db()
+        cursor = conn.cursor()
 
-    # Validate MaNCC nếu có
-    if MaNCC:
-        try:
-            MaNCC = int(MaNCC)
-            conn_temp = get_db_connection()
-            cursor_temp = conn_temp.cursor()
-            cursor_temp.execute("SELECT MaNCC FROM NhaCungCap WHERE MaNCC = ?", (MaNCC,))
-            if not cursor_temp.fetchone():
-                conn_temp.close()
-                return jsonify({
-                    "status": "error",
-                    "message": f"Không tìm thấy nhà cung cấp với mã {MaNCC}"
-                }), 400
-            conn_temp.close()
-        except (ValueError, TypeError):
+        if laptop['MaNCC'] and not existing_suppliers(cursor, [laptop['MaNCC']]):
             return jsonify({
                 "status": "error",
-                "message": "Mã nhà cung cấp phải là số"
+                "message": f"Không tìm thấy nhà cung cấp với mã {laptop['MaNCC']}"
             }), 400
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-
         cursor.execute("SELECT MaSP FROM Laptop WHERE MaSP = ?", (maSP,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({
                 "status": "error",
                 "message": "Không tìm thấy laptop"
@@ -958,9 +1489,9 @@ def update_laptop(maSP):
             WHERE MaSP = ?
         """
 
-        cursor.execute(update_query, (TenSP, Hang, GiaBan, CauHinh, Kho, MaNCC, NgayNhap, TrangThai, maSP))
+        cursor.execute(update_query, [laptop[c] for c in LAPTOP_WRITE_COLUMNS] + [maSP])
         conn.commit()
-        conn.close()
+        catalog_cache.invalidate(maSP)
 
         print(f"✓ Cập nhật laptop thành công!")
         return jsonify({
@@ -972,18 +1503,203 @@ def update_laptop(maSP):
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         print("Lỗi:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+LAPTOP_STAGING_TABLE = """
+    IF OBJECT_ID('tempdb..#LaptopNhap') IS NOT NULL DROP TABLE #LaptopNhap;
+    CREATE TABLE #LaptopNhap (
+        Dong INT NOT NULL PRIMARY KEY,
+        MaSP INT NULL,
+        TenSP NVARCHAR(255) NOT NULL,
+        Hang NVARCHAR(100) NOT NULL,
+        GiaBan DECIMAL(18, 2) NOT NULL,
+        CauHinh NVARCHAR(MAX) NULL,
+        Kho INT NULL,
+        MaNCC INT NULL,
+        NgayNhap DATE NULL,
+        TrangThai NVARCHAR(50) NOT NULL
+    );
+"""
+
+# Dòng có MaSP cập nhật laptop đó (Kho bỏ trống thì giữ nguyên), dòng không có
+# MaSP thêm mới; dòng có MaSP không tồn tại không khớp nhánh nào và bị báo lỗi
+LAPTOP_MERGE = """
+    SET NOCOUNT ON;
+    MERGE Laptop AS t
+    USING #LaptopNhap AS s
+        ON t.MaSP = s.MaSP
+    WHEN MATCHED THEN UPDATE SET
+        TenSP = s.TenSP, Hang = s.Hang, GiaBan = s.GiaBan, CauHinh = s.CauHinh,
+        Kho = ISNULL(s.Kho, t.Kho), MaNCC = s.MaNCC, NgayNhap = s.NgayNhap, TrangThai = s.TrangThai
+    WHEN NOT MATCHED BY TARGET AND s.MaSP IS NULL THEN
+        INSERT (TenSP, Hang, GiaBan, CauHinh, Kho, MaNCC, NgayNhap, TrangThai)
+        VALUES (s.TenSP, s.Hang, s.GiaBan, s.CauHinh, ISNULL(s.Kho, 0), s.MaNCC, s.NgayNhap, s.TrangThai)
+    OUTPUT $action, inserted.MaSP, s.Dong;
+"""
+
+# SQLite không có MERGE: cập nhật các dòng có MaSP bằng UPDATE ... FROM, thêm
+# các dòng còn lại từng dòng một (không tốn round trip)
+LAPTOP_UPDATE_FROM_STAGING_SQLITE = """
+    UPDATE Laptop SET
+        TenSP = s.TenSP, Hang = s.Hang, GiaBan = s.GiaBan, CauHinh = s.CauHinh,
+        Kho = ISNULL(s.Kho, Laptop.Kho), MaNCC = s.MaNCC, NgayNhap = s.NgayNhap, TrangThai = s.TrangThai
+    FROM #LaptopNhap AS s
+    WHERE Laptop.MaSP = s.MaSP;
+    SELECT s.MaSP, s.Dong FROM #LaptopNhap s JOIN Laptop l ON l.MaSP = s.MaSP;
+"""
+
+
+def _merge_staged_laptops(cursor, staged):
+    """Áp dụng các dòng đã nạp vào #LaptopNhap, trả về [(action, MaSP, Dong)]"""
+    if dialects.of(cursor).name != 'sqlite':
+        cursor.execute(LAPTOP_MERGE)
+        return cursor.fetchall()
+
+    cursor.execute(LAPTOP_UPDATE_FROM_STAGING_SQLITE)
+    applied = [('UPDATE', ma_sp, line_no) for ma_sp, line_no in cursor.fetchall()]
+    kho = 2 + LAPTOP_WRITE_COLUMNS.index('Kho')
+    for row in staged:
+        if row[1] is None:
+            values = row[2:kho] + [row[kho] if row[kho] is not None else 0] + row[kho + 1:]
+            applied.append(('INSERT', insert_returning_key(cursor, 'Laptop', 'MaSP', LAPTOP_WRITE_COLUMNS, values), row[0]))
+    return applied
+
+
+def _import_laptops(conn, stream, fmt, report, context=None):
+    """Đọc ``stream`` và thêm / cập nhật laptop theo batch, cộng dồn vào ``report``
+    (``inserted``, ``updated``, ``errors``). ``context`` như ``_import_khach_hang``."""
+    seen_ma_sps = set()
+    today = datetime.date.today()
+    suppliers = {}  # MaNCC -> có tồn tại hay không, dùng lại cho các batch sau
+    errors = report['errors']
+    processed = 0
+
+    cursor = conn.cursor()
+    cursor.execute(LAPTOP_STAGING_TABLE)
+    conn.commit()
+    try:
+        for batch in batches(read_rows(stream, fmt), IMPORT_BATCH_SIZE):
+            if context is not None:
+                context.check_cancelled()
+            valid = []
+            for line_no, data in batch:
+                if isinstance(data, ImportFormatError):
+                    errors.append({"row": line_no, "message": str(data)})
+                    continue
+                laptop, row_errors = validation.LAPTOP_NHAP.validate(data, today)
+                if not row_errors and laptop['MaSP'] is not None:
+                    if laptop['MaSP'] in seen_ma_sps:
+                        row_errors = ["MaSP bị trùng trong file"]
+                    seen_ma_sps.add(laptop['MaSP'])
+                if row_errors:
+                    errors.append({"row": line_no, "MaSP": data.get('MaSP'), "message": validation.error_message(row_errors)})
+                    continue
+                valid.append((line_no, laptop['MaSP'], laptop))
+
+            unknown = {laptop['MaNCC'] for _, _, laptop in valid
+                       if laptop['MaNCC'] and laptop['MaNCC'] not in suppliers}
+            if unknown:
+                found = existing_suppliers(cursor, unknown)
+                suppliers.update((ma_ncc, ma_ncc in found) for ma_ncc in unknown)
+            staged = []
+            for line_no, ma_sp, laptop in valid:
+                if laptop['MaNCC'] and not suppliers[laptop['MaNCC']]:
+                    errors.append({"row": line_no, "MaSP": ma_sp,
+                                   "message": f"Không tìm thấy nhà cung cấp với mã {laptop['MaNCC']}"})
+                    continue
+                staged.append([line_no, ma_sp] + [laptop[c] for c in LAPTOP_WRITE_COLUMNS])
+
+            if staged:
+                cursor.execute("TRUNCATE TABLE #LaptopNhap")
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO #LaptopNhap (Dong, MaSP, {', '.join(LAPTOP_WRITE_COLUMNS)}) "
+                    f"VALUES ({_placeholders(len(LAPTOP_WRITE_COLUMNS) + 2)})",
+                    staged
+                )
+                cursor.fast_executemany = False
+                applied = _merge_staged_laptops(cursor, staged)
+                conn.commit()
+
+                done = set()
+                for action, ma_sp, line_no in applied:
+                    done.add(line_no)
+                    catalog_cache.invalidate(ma_sp)
+                    if action == 'INSERT':
+                        report['inserted'] += 1
+                    else:
+                        report['updated'] += 1
+                for row in staged:
+                    if row[0] not in done:
+                        errors.append({"row": row[0], "MaSP": row[1], "message": "Không tìm thấy laptop"})
+
+            processed += len(batch)
+            if context is not None:
+                context.progress(processed)
+    finally:
+        try:
+            conn.rollback()
+            conn.cursor().execute("IF OBJECT_ID('tempdb..#LaptopNhap') IS NOT NULL DROP TABLE #LaptopNhap")
+            conn.commit()
+        except:
+            pass
+
+    errors.sort(key=lambda error: error['row'])
+    print(f"✓ Nhập laptop: {report['inserted']} thêm mới, {report['updated']} cập nhật, {len(errors)} dòng lỗi")
+
+
+@app.route('/api/import_laptops', methods=['POST'])
+def import_laptops():
+    """Thêm / cập nhật laptop hàng loạt từ body request (CSV, NDJSON hoặc mảng JSON).
+
+    Mỗi batch IMPORT_BATCH_SIZE dòng: kiểm tra toàn bộ trường trong một lượt,
+    kiểm tra các MaNCC chưa gặp bằng một query, nạp dòng hợp lệ vào bảng tạm
+    bằng fast_executemany rồi áp dụng bằng một câu MERGE và commit.
+    Với ``?async=1`` file được lưu tạm và nhập bằng việc nền (trả về 202).
+    """
+    try:
+        fmt = detect_format(request.args.get('format'), request.content_type)
+    except ImportFormatError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    if is_async_request():
+        return submit_import_job('import_laptops', fmt)
+
+    report = {"inserted": 0, "updated": 0, "errors": []}
+    try:
+        conn = get_db()
+        _import_laptops(conn, request.stream, fmt, report)
+        return jsonify({
+            "status": "success",
+            "inserted": report['inserted'],
+            "updated": report['updated'],
+            "rejected": len(report['errors']),
+            "errors": report['errors']
+        }), 200
+
+    except ImportFormatError as e:
+        return jsonify({"status": "error", "message": str(e), "inserted": report['inserted'],
+                        "updated": report['updated']}), 400
+    except Exception as e:
+        if 'conn' in locals():
+            try:
+                conn.rollback()
+            except:
+                pass
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e), "inserted": report['inserted'],
+                        "updated": report['updated'], "errors": report['errors']}), 500
+
+
 @app.route('/api/delete_laptop/<int:maSP>', methods=['DELETE'])
 def delete_laptop(maSP):
     """Xóa laptop khỏi database"""
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
         # Kiểm tra laptop có tồn tại không
@@ -991,7 +1707,6 @@ def delete_laptop(maSP):
         result = cursor.fetchone()
 
         if not result:
-            conn.close()
             return jsonify({
                 "status": "error",
                 "message": "Không tìm thấy laptop"
@@ -1002,7 +1717,7 @@ def delete_laptop(maSP):
         # Xóa laptop
         cursor.execute("DELETE FROM Laptop WHERE MaSP = ?", (maSP,))
         conn.commit()
-        conn.close()
+        catalog_cache.invalidate(maSP)
 
         print(f"✓ Xóa laptop thành công! MaSP: {maSP}, Tên: {ten_sp}")
         return jsonify({
@@ -1010,11 +1725,10 @@ def delete_laptop(maSP):
             "message": f"Đã xóa laptop {ten_sp}"
         }), 200
 
-    except pyodbc.IntegrityError as e:
+    except dialect.IntegrityError as e:
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         return jsonify({
@@ -1025,93 +1739,473 @@ def delete_laptop(maSP):
         if 'conn' in locals():
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         print("Lỗi:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+invoice_cache = invoices.InvoiceCache(max_size=int(os.getenv('INVOICE_CACHE_SIZE', '1000')))
+
+
+def invoice_response(html, etag):
+    """Trả HTML kèm ETag; trình duyệt gửi lại If-None-Match trùng thì trả 304"""
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/xem_hoa_don/<int:order_id>')
 def xem_hoa_don(order_id):
+    report_generation.check()
+    cached = invoice_cache.get(order_id)
+    if cached is not None:
+        return invoice_response(*cached)
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        data = invoices.fetch_invoice(get_db().cursor(), order_id)
+        if data is None:
+            return "Không tìm thấy đơn hàng", 404
 
-        # Lấy thông tin đơn hàng
-        cursor.execute("""
-            SELECT MaDH, MaKH, MaNV, NgayGiao, ThoiGianTao, TrangThaiXuLy, TongTien, GhiChu
-            FROM DonHang WHERE MaDH = ?
-        """, (order_id,))
-        don_hang = cursor.fetchone()
+        html = render_template('xemHoaDon.html', **data)
+        etag = invoices.make_etag(html)
+        if invoices.is_final(data):
+            invoice_cache.put(order_id, data['thoi_gian_tao'], html, etag)
+        return invoice_response(html, etag)
 
-        if not don_hang:
-            conn.close()
-            return "Không tìm thấy đơn hàng", 404
+    except Exception as e:
+        return f"Lỗi: {str(e)}", 500
 
-        # Lấy thông tin khách hàng
-        cursor.execute("SELECT MaKH, HoTen, SDT, DiaChi FROM KhachHang WHERE MaKH = ?", (don_hang[1],))
-        khach_hang = cursor.fetchone()
 
-        # Lấy thông tin nhân viên
-        cursor.execute("SELECT MaNV, HoTen, SDT FROM NhanVien WHERE MaNV = ?", (don_hang[2],))
-        nhan_vien = cursor.fetchone()
+EXPORT_CHUNK = 200
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+EXPORT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+export_progress = invoices.ExportProgress()
+_export_pool = None
+_export_pool_lock = threading.Lock()
 
-        # Lấy chi tiết sản phẩm
-        cursor.execute("""
-            SELECT L.TenSP, CT.SoLuong, CT.GiaBan, (CT.SoLuong * CT.GiaBan) as ThanhTien
-            FROM ChiTietDonHang CT
-            JOIN Laptop L ON CT.MaSP = L.MaSP
-            WHERE CT.MaDH = ?
-        """, (order_id,))
-        chi_tiet = cursor.fetchall()
-
-        conn.close()
-
-        # Format dữ liệu
-        def format_tien(so):
-            return "{:,.0f} ₫".format(float(so)).replace(',', '.')
-
-        # Chuẩn bị danh sách sản phẩm
-        danh_sach_sp = []
-        tong_sl = 0
-        for item in chi_tiet:
-            tong_sl += int(item[1])
-            danh_sach_sp.append({
-                'ten': item[0],
-                'soluong': int(item[1]),
-                'gia': format_tien(item[2]),
-                'thanhtien': format_tien(item[3])
-            })
-
-        # Chuẩn bị dữ liệu cho template
-        data = {
-            'ma_dh': don_hang[0],
-            'ngay_giao': don_hang[3].strftime('%d/%m/%Y') if don_hang[3] else '',
-            'ngay_tao': don_hang[4].strftime('%d/%m/%Y %H:%M') if don_hang[4] else '',
-            'trang_thai': don_hang[5] or '',
-            'ghi_chu': don_hang[7] or '',
-            'kh_ma': khach_hang[0] if khach_hang else '',
-            'kh_ten': khach_hang[1] if khach_hang else '',
-            'kh_sdt': khach_hang[2] if khach_hang else '',
-            'kh_diachi': khach_hang[3] if khach_hang else 'Chưa cập nhật',
-            'nv_ma': nhan_vien[0] if nhan_vien else '',
-            'nv_ten': nhan_vien[1] if nhan_vien else '',
-            'nv_sdt': nhan_vien[2] if nhan_vien else '',
-            'san_pham': danh_sach_sp,
-            'tong_soluong': tong_sl,
-            'tong_tien': format_tien(don_hang[6])
-        }
 
-        return render_template('xemHoaDon.html', **data)
+def get_export_pool():
+    """Process pool render hoá đơn, tạo khi cần lần đầu"""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+        return _export_pool
 
+
+def parse_export_args(args):
+    """Danh sách MaDH cần xuất từ ma_dh (danh sách hoặc chuỗi "1,2,3"), hoặc None
+    kèm khoảng ngày (from_date, to_date) nếu xuất theo ngày"""
+    ma_dh = args.get('ma_dh')
+    if ma_dh:
+        if isinstance(ma_dh, str):
+            ma_dh = ma_dh.split(',')
+        try:
+            ids = list(dict.fromkeys(int(value) for value in ma_dh))
+        except (ValueError, TypeError):
+            raise ListParamError("ma_dh phải là danh sách mã đơn hàng")
+        return ids, None
+
+    from_date = args.get('from_date')
+    to_date = args.get('to_date')
+    if not from_date or not to_date:
+        raise ListParamError("Cần ma_dh hoặc cả from_date và to_date")
+    try:
+        return None, parse_khoang_ngay(from_date, to_date)
+    except ValueError:
+        raise ListParamError("Định dạng ngày không hợp lệ (yêu cầu: YYYY-MM-DD)")
+
+
+@app.route('/api/hoa_don/export', methods=['GET', 'POST'])
+def export_hoa_don():
+    """Xuất nhiều hoá đơn thành một file HTML để in.
+
+    Tham số (query string hoặc JSON): ``ma_dh`` hoặc ``from_date`` + ``to_date``,
+    và ``export_id`` tuỳ chọn để theo dõi tiến độ qua /api/hoa_don/export/<export_id>.
+    Mỗi nhóm EXPORT_CHUNK đơn lấy bằng một round trip, render trong process pool
+    và được gửi về ngay khi xong, theo đúng thứ tự.
+    """
+    if request.method == 'POST':
+        args = request.get_json(silent=True) or {}
+    else:
+        args = request.args
+    export_id = str(args.get('export_id') or uuid.uuid4().hex)
+    if not EXPORT_ID_PATTERN.match(export_id):
+        return jsonify({"status": "error", "message": "export_id không hợp lệ"}), 400
+
+    try:
+        ids, khoang_ngay = parse_export_args(args)
+    except ListParamError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        if ids is None:
+            tu_ngay, den_ngay = khoang_ngay
+            ids = invoices.order_ids_in_range(
+                get_db().cursor(),
+                datetime.datetime.combine(tu_ngay, datetime.time.min),
+                datetime.datetime.combine(den_ngay, datetime.time.min)
+            )
     except Exception as e:
-        return f"Lỗi: {str(e)}", 500
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    if not ids:
+        return jsonify({"status": "error", "message": "Không có đơn hàng nào để xuất"}), 404
+
+    export_progress.start(export_id, len(ids))
+
+    def generate():
+        pool = get_export_pool()
+        pending = deque()
+        try:
+            yield invoices.bundle_head(f"Hóa đơn ({len(ids)})")
+            cursor = get_db().cursor()
+            for chunk in _chunks(ids, EXPORT_CHUNK):
+                data = invoices.fetch_invoices(cursor, chunk, MAX_SQL_PARAMS)
+                pending.append((len(data), pool.submit(invoices.render_many, data)))
+                # Vừa đọc DB vừa render: chỉ giữ tối đa số worker phần việc đang chờ
+                while len(pending) > EXPORT_WORKERS:
+                    count, future = pending.popleft()
+                    yield future.result()
+                    export_progress.advance(export_id, count)
+            while pending:
+                count, future = pending.popleft()
+                yield future.result()
+                export_progress.advance(export_id, count)
+            yield invoices.BUNDLE_TAIL
+            export_progress.finish(export_id)
+        except GeneratorExit:
+            for _, future in pending:
+                future.cancel()
+            export_progress.finish(export_id, "Client đã ngắt kết nối")
+            raise
+        except Exception as e:
+            # Header đã gửi đi nên chỉ báo lỗi ở cuối file
+            print("Lỗi xuất hoá đơn:", e)
+            export_progress.finish(export_id, str(e))
+            yield f"<!-- Lỗi: {e} -->\n" + invoices.BUNDLE_TAIL
+
+    response = Response(stream_with_context(generate()), mimetype='text/html')
+    response.headers['Content-Disposition'] = f'attachment; filename=hoa_don_{export_id}.html'
+    response.headers['X-Export-Id'] = export_id
+    return response
+
+
+@app.route('/api/hoa_don/export/<export_id>', methods=['GET'])
+def export_hoa_don_status(export_id):
+    """Tiến độ một lần xuất hoá đơn (chỉ trong process đang chạy lần xuất đó)"""
+    progress = export_progress.get(export_id)
+    if progress is None:
+        return jsonify({"status": "error", "message": "Không tìm thấy lần xuất này"}), 404
+    return jsonify({"status": "success", "data": progress}), 200
+
+
+
+# --- Việc nền ----------------------------------------------------------------
+# Báo cáo dài và nhập dữ liệu hàng loạt có thể gửi với ?async=1: request trả về
+# 202 cùng job_id ngay, việc chạy trong nhóm thread JOB_WORKERS của process.
+# Mỗi loại việc có giới hạn số việc chạy cùng lúc, nên việc nền dùng tối đa
+# JOB_WORKERS kết nối của pool, phần còn lại vẫn dành cho các route tương tác.
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.sqlite3'))
+JOB_SPOOL_DIR = os.getenv('JOB_SPOOL_DIR') or tempfile.gettempdir()
+JOB_LIST_LIMIT = 200
+
+job_queue = jobs.JobQueue(JOB_DB_PATH, workers=JOB_WORKERS)
+
+
+def _clear_report_caches():
+    dashboard_cache.clear()
+    invoice_cache.clear()
+
+
+# Cache dashboard / hoá đơn nằm riêng trong từng worker gunicorn: tính lại thống
+# kê ở một worker thì tăng thế hệ trong file SQLite của hàng đợi việc, worker khác
+# thấy thế hệ đổi (kiểm tra tối đa mỗi REPORT_GENERATION_CHECK giây) thì xoá cache
+report_generation = jobs.SharedGeneration(
+    job_queue, 'thong_ke', _clear_report_caches,
+    check_interval=float(os.getenv('REPORT_GENERATION_CHECK', '1')),
+)
+
+
+@contextmanager
+def pooled_connection():
+    """Mượn kết nối từ pool ngoài request (cho việc nền), trả lại khi xong"""
+    item = db_pool.acquire()
+    try:
+        yield item.connection
+    except BaseException as e:
+        try:
+            item.connection.rollback()
+        except:
+            pass
+        # Huỷ việc không làm hỏng kết nối; lỗi khác thì bỏ kết nối đi cho chắc
+        db_pool.release(item, discard=not isinstance(e, jobs.JobCancelled))
+        raise
+    db_pool.release(item)
+
+
+def is_async_request():
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+
+def submit_job(job_type, params, private=None):
+    job_queue.start()
+    job_id = job_queue.submit(job_type, params, private)
+    response = jsonify({
+        "status": "success",
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result"
+    })
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response, 202
+
+
+def submit_import_job(job_type, fmt):
+    """Lưu body request ra file tạm rồi tạo việc nhập; việc xoá file khi xong"""
+    try:
+        with tempfile.NamedTemporaryFile(dir=JOB_SPOOL_DIR, prefix='nhap_', suffix=f'.{fmt}', delete=False) as spool:
+            shutil.copyfileobj(request.stream, spool, 1024 * 1024)
+        # Đường dẫn file trên server không trả ra /api/jobs
+        return submit_job(job_type, {"format": fmt}, private={"path": spool.name})
+    except Exception as e:
+        if 'spool' in locals():
+            try:
+                os.remove(spool.name)
+            except OSError:
+                pass
+        print("Lỗi:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@contextmanager
+def _spooled_file(path):
+    try:
+        with open(path, 'rb') as stream:
+            yield stream
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _job_thong_ke_doanh_thu(params, context):
+    tu_ngay, den_ngay = parse_khoang_ngay(params['from_date'], params['to_date'])
+    hom_nay = datetime.date.today()
+    with pooled_connection() as conn:
+        rollups.ensure_schema(conn)
+        result = rollups.dashboard(conn.cursor(), tu_ngay, den_ngay)
+    dashboard_cache.put(tu_ngay, den_ngay, result, hom_nay)
+    return result
+
+
+def _job_rebuild_thong_ke(params, context):
+    tu, den = None, None
+    if params.get('from_date'):
+        tu_ngay, den_ngay = parse_khoang_ngay(params['from_date'], params['to_date'])
+        tu = datetime.datetime.combine(tu_ngay, datetime.time.min)
+        den = datetime.datetime.combine(den_ngay, datetime.time.min)
+    with pooled_connection() as conn:
+        _rebuild_thong_ke(conn, tu, den)
+    return {"message": "Đã tính lại thống kê doanh thu"}
+
+
+def _job_import_khach_hang(params, context):
+    report = {"inserted": 0, "errors": []}
+    with _spooled_file(context.private['path']) as stream, pooled_connection() as conn:
+        _import_khach_hang(conn, stream, params['format'], report, context)
+    return {"inserted": report['inserted'], "rejected": len(report['errors']), "errors": report['errors']}
+
+
+def _job_backfill_ho_ten(params, context):
+    with pooled_connection() as conn:
+        search_columns.ensure_schema(conn)
+        return search_columns.backfill_all(conn)
+
+
+def _job_import_laptops(params, context):
+    report = {"inserted": 0, "updated": 0, "errors": []}
+    with _spooled_file(context.private['path']) as stream, pooled_connection() as conn:
+        _import_laptops(conn, stream, params['format'], report, context)
+    return {"inserted": report['inserted'], "updated": report['updated'],
+            "rejected": len(report['errors']), "errors": report['errors']}
+
+
+job_queue.register('thong_ke_doanh_thu', _job_thong_ke_doanh_thu,
+                   max_concurrency=int(os.getenv('JOB_REPORT_CONCURRENCY', '2')))
+job_queue.register('rebuild_thong_ke', _job_rebuild_thong_ke, max_concurrency=1)
+job_queue.register('import_khach_hang', _job_import_khach_hang, max_concurrency=1)
+job_queue.register('import_laptops', _job_import_laptops, max_concurrency=1)
+job_queue.register('backfill_ho_ten', _job_backfill_ho_ten, max_concurrency=1)
+# Điền HoTenKhongDau cho dòng thêm / đổi tên ngoài ứng dụng
+job_queue.schedule('backfill_ho_ten', search_columns.BACKFILL_INTERVAL)
+
+
+@app.before_request
+def start_job_workers():
+    # Khởi động worker ở request đầu tiên của mỗi process (không chạy trong
+    # process giám sát của reloader khi FLASK_DEBUG=True)
+    if not job_queue.started:
+        job_queue.start()
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    status = request.args.get('status')
+    try:
+        limit = max(1, min(int(request.args.get('limit', '50')), JOB_LIST_LIMIT))
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit phải là số nguyên"}), 400
+    return jsonify({"status": "success", "data": job_queue.list(status, limit)}), 200
+
+
+@app.route('/api/job_stats', methods=['GET'])
+def job_stats():
+    return jsonify({"status": "success", "data": job_queue.stats()}), 200
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Không tìm thấy việc này"}), 404
+    return jsonify({"status": "success", "data": job}), 200
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_queue.get(job_id, with_result=True)
+    if job is None:
+        return jsonify({"status": "error", "message": "Không tìm thấy việc này"}), 404
+    if job['status'] == jobs.TRANG_THAI_LOI:
+        return jsonify({"status": "error", "message": job['error'], "job_status": job['status']}), 500
+    if job['status'] != jobs.TRANG_THAI_XONG:
+        return jsonify({"status": "error", "message": "Việc chưa hoàn tất", "job_status": job['status']}), 409
+    return jsonify({"status": "success", **job['result']}), 200
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Việc đang chờ bị huỷ ngay; việc đang chạy dừng ở điểm kiểm tra kế tiếp
+    (nhập hàng loạt: giữa hai batch, các batch đã commit được giữ lại)"""
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Không tìm thấy việc này"}), 404
+    if status in (jobs.TRANG_THAI_XONG, jobs.TRANG_THAI_LOI):
+        return jsonify({"status": "error", "message": "Việc đã kết thúc", "job_status": status}), 409
+    return jsonify({"status": "success", "job_status": status}), 200
+
+
+# Chạy production: gunicorn (gunicorn.conf.py) nạp ``app:create_app()`` trong
+# từng process worker, mỗi process có pool kết nối, cache và chỉ mục riêng
+DB_POOL_WARMUP = int(os.getenv('DB_POOL_WARMUP', os.getenv('WEB_THREADS', '4')))
+WARMUP_LAPTOPS = int(os.getenv('WARMUP_LAPTOPS', '500'))
+SHUTDOWN_TIMEOUT = float(os.getenv('WEB_SHUTDOWN_TIMEOUT', '10'))
+
+_warmed_up_pid = None
+_warmup_lock = threading.Lock()
+
+
+def _warm_schema():
+    conn = get_db()
+    rollups.ensure_schema(conn)
+    search_columns.ensure_schema(conn)
+    search_columns.backfill_all(conn)
+
+
+def _warm_search_indexes():
+    conn = get_db()
+    customer_index.ensure_fresh(conn)
+    employee_index.ensure_fresh(conn)
+
+
+def _warm_catalog():
+    """Nạp vào catalog cache các laptop bán chạy nhất 30 ngày qua"""
+    limit = min(WARMUP_LAPTOPS, catalog_cache.max_size)
+    if limit <= 0:
+        return
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT TOP (?) MaSP
+        FROM DoanhThuNgaySanPham
+        WHERE Ngay >= ?
+        GROUP BY MaSP
+        ORDER BY SUM(SoLuongBan) DESC
+    """, (limit, datetime.date.today() - datetime.timedelta(days=30)))
+    load_laptops([row[0] for row in cursor.fetchall()])
+
+
+def _warm_templates():
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def warmup():
+    """Chuẩn bị process trước khi nhận request: mở sẵn kết nối, tạo bảng / cột
+    còn thiếu, nạp chỉ mục tìm kiếm và laptop bán chạy, biên dịch template, chạy
+    worker việc nền. Bước nào lỗi thì bỏ qua, request đầu tiên tự nạp như cũ."""
+    started = time.perf_counter()
+    done = []
+
+    def step(name, func):
+        try:
+            func()
+            done.append(name)
+        except Exception as e:
+            print(f"Lỗi khởi động ({name}):", e)
+
+    step('kết nối', lambda: db_pool.prefill(DB_POOL_WARMUP))
+    with app.app_context():
+        step('schema', _warm_schema)
+        if SEARCH_INDEX_ENABLED:
+            step('chỉ mục tìm kiếm', _warm_search_indexes)
+        step('laptop bán chạy', _warm_catalog)
+    step('template', _warm_templates)
+    step('việc nền', job_queue.start)
+    print(f"Process {os.getpid()} sẵn sàng sau {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({', '.join(done)})")
+
+
+def create_app():
+    """App cho WSGI server: ``gunicorn 'app:create_app()'``. Warmup chạy một lần
+    trong mỗi process (gọi lại không chạy nữa)"""
+    global _warmed_up_pid
+    with _warmup_lock:
+        if _warmed_up_pid != os.getpid():
+            warmup()
+            _warmed_up_pid = os.getpid()
+    return app
+
+
+def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    """Dừng gọn process worker sau khi đã trả lời xong các request đang xử lý:
+    chờ việc nền đang chạy, tắt thread pool truy vấn song song và process pool
+    xuất hoá đơn, trả và đóng kết nối"""
+    deadline = time.monotonic() + timeout
+    job_queue.stop(timeout)
+    if query_runner is not None:
+        query_runner.shutdown(wait=True)
+    with _export_pool_lock:
+        if _export_pool is not None:
+            _export_pool.shutdown(wait=True, cancel_futures=True)
+    in_use = db_pool.drain(max(deadline - time.monotonic(), 0))
+    if in_use:
+        print(f"Process {os.getpid()} tắt khi còn {in_use} kết nối đang dùng")
 
 
 if __name__ == '__main__':
-    debug_mode = os.getenv('FLASK_DEBUG', 'True') == 'True'
+    # Server phát triển của Flask (một process); production chạy bằng gunicorn
+    debug_mode = os.getenv('FLASK_DEBUG', 'False') == 'True'
     host = os.getenv('FLASK_HOST', '127.0.0.1')
     port = int(os.getenv('FLASK_PORT', '5000'))
 
+    if not debug_mode:
+        create_app()
     app.run(debug=debug_mode, host=host, port=port)
@@ -0,0 +1,135 @@
+"""Benchmark /api/add_DonHang: số round trip và độ trễ theo số dòng chi tiết.
+
+Script tạo đơn hàng thật (mỗi dòng 1 sản phẩm, trừ kho thật), vì vậy chỉ chạy
+trên database thử nghiệm:
+
+    python bench/bench_add_donhang.py --lines 1 5 10 20 50 --repeat 5
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as shop  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+
+class CountingCursor:
+    """Đếm số lần cursor gửi lệnh xuống server"""
+
+    def __init__(self, cursor, counter):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_counter', counter)
+
+    def execute(self, *args):
+        self._counter.count += 1
+        self._cursor.execute(*args)
+        return self
+
+    def executemany(self, sql, params):
+        # Không có fast_executemany thì pyodbc gửi từng dòng một
+        params = list(params)
+        self._counter.count += 1 if self._cursor.fast_executemany else len(params)
+        self._cursor.executemany(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class CountingConnection:
+    def __init__(self, connection, counter):
+        self._connection = connection
+        self._counter = counter
+
+    def cursor(self):
+        return CountingCursor(self._connection.cursor(), self._counter)
+
+    def commit(self):
+        self._counter.count += 1
+        self._connection.commit()
+
+    def rollback(self):
+        self._counter.count += 1
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def pick_fixtures(max_lines, repeat):
+    conn = shop.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT TOP 1 MaKH FROM KhachHang WHERE TrangThai = 'Active'")
+    ma_kh = cursor.fetchone()[0]
+    cursor.execute("SELECT TOP 1 MaNV FROM NhanVien")
+    ma_nv = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT TOP (?) MaSP, GiaBan FROM Laptop WHERE Kho >= ? ORDER BY Kho DESC",
+        (max_lines, repeat + 1)
+    )
+    products = [(row[0], float(row[1])) for row in cursor.fetchall()]
+    conn.close()
+    if len(products) < max_lines:
+        sys.exit(f"Cần ít nhất {max_lines} sản phẩm còn >= {repeat + 1} trong kho, hiện có {len(products)}")
+    return ma_kh, ma_nv, products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 5, 10, 20, 50])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    counter = RoundTripCounter()
+    shop.db_pool = ConnectionPool(
+        lambda: CountingConnection(shop.get_db_connection(), counter), max_size=1
+    )
+    ma_kh, ma_nv, products = pick_fixtures(max(args.lines), args.repeat)
+    client = shop.app.test_client()
+    ngay_giao = datetime.date.today().isoformat()
+
+    print(f"{'dòng':>6} {'round trip':>11} {'p50 (ms)':>10} {'max (ms)':>10}")
+    for n in args.lines:
+        payload = {
+            "MaKH": ma_kh,
+            "MaNV": ma_nv,
+            "NgayGiao": ngay_giao,
+            "TrangThaiXuLy": "Chưa xử lý",
+            "GhiChu": "benchmark",
+            "ChiTiet": [{"MaSP": ma_sp, "SoLuong": 1, "GiaBan": gia} for ma_sp, gia in products[:n]],
+        }
+        # Lần đầu mở kết nối, không tính
+        client.post('/api/add_DonHang', json=payload)
+
+        latencies = []
+        round_trips = []
+        for _ in range(args.repeat):
+            counter.count = 0
+            start = time.perf_counter()
+            response = client.post('/api/add_DonHang', json=payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 201:
+                sys.exit(f"Lỗi với {n} dòng: {response.get_json()}")
+            # Trừ lần rollback khi trả kết nối về pool
+            round_trips.append(counter.count - 1)
+
+        print(f"{n:>6} {max(round_trips):>11} {statistics.median(latencies):>10.1f} {max(latencies):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
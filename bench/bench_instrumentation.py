@@ -0,0 +1,74 @@
+"""Micro-benchmark chi phí đo thời gian của ``instrumentation.py`` trên mỗi câu lệnh:
+cursor giả (không round trip) dùng trực tiếp, qua InstrumentedCursor, và qua
+InstrumentedCursor khi câu nào cũng vượt ngưỡng truy vấn chậm. Không cần database.
+
+    python bench/bench_instrumentation.py --number 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation  # noqa: E402
+
+
+SQL = """
+    SELECT MaSP, TenSP, Hang, CauHinh, GiaBan, Kho, MaNCC, TrangThai
+    FROM Laptop
+    WHERE MaSP IN (?, ?, ?, ?)
+"""
+
+
+class FakeCursor:
+    def execute(self, sql, *params):
+        return self
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    params = (1, 2, 3, 4)
+    plain = FakeConnection().cursor()
+
+    metrics = instrumentation.Metrics()
+    metrics.start_request()
+    wrapped = instrumentation.InstrumentedConnection(FakeConnection(), metrics).cursor()
+
+    slow_metrics = instrumentation.Metrics(slow_query_ms=0)
+    slow_metrics.start_request()
+    slow = instrumentation.InstrumentedConnection(FakeConnection(), slow_metrics).cursor()
+
+    plain_us = per_call_us(lambda: plain.execute(SQL, params).fetchall(), args.number)
+    wrapped_us = per_call_us(lambda: wrapped.execute(SQL, params).fetchall(), args.number)
+    # Câu chậm in ra stdout, bỏ phần in để chỉ đo phần ghi nhận
+    with contextlib.redirect_stdout(io.StringIO()):
+        slow_us = per_call_us(lambda: slow.execute(SQL, params).fetchall(), args.number // 10)
+
+    print(f"{'cursor':<28} {'µs / câu lệnh':>14}")
+    print(f"{'không đo (METRICS off)':<28} {plain_us:>14.3f}")
+    print(f"{'InstrumentedCursor':<28} {wrapped_us:>14.3f}")
+    print(f"{'InstrumentedCursor, câu chậm':<28} {slow_us:>14.3f}")
+    print(f"chi phí thêm: {wrapped_us - plain_us:.3f} µs / câu lệnh")
+    print(f"SQL chuẩn hoá: {instrumentation.normalize_sql(SQL)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark response JSON của các API danh sách: kích thước payload và thời gian
+serialize theo định dạng (mỗi dòng một object / dạng cột), JSON provider (mặc định
+của Flask / json chuẩn / orjson) và nén (gzip, brotli nếu đã cài).
+
+    python bench/bench_json.py --rows 200
+    python bench/bench_json.py --rows 200 --app      # thêm đo qua các route thật
+
+``--app`` gọi route bằng test client trên database cấu hình trong ``.env`` (hoặc
+``DB_BACKEND=sqlite``), nên cần dữ liệu mẫu từ ``bench/seed_data.py``.
+"""
+import argparse
+import datetime
+import decimal
+import gzip
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_provider  # noqa: E402
+from compression import brotli  # noqa: E402
+
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng']
+TEN = ['Văn An', 'Thị Bình', 'Hữu Cường', 'Đức Dũng', 'Minh Đạt', 'Ngọc Hà', 'Thu Hương', 'Quốc Tuấn']
+HANG = ['Dell', 'HP', 'Lenovo', 'Asus', 'Acer', 'Apple', 'MSI']
+
+LAPTOP_FIELDS = ('MaSP', 'TenSP', 'Hang', 'CauHinh', 'GiaBan', 'Kho', 'MaNCC', 'TrangThai')
+KHACH_HANG_FIELDS = ('MaKH', 'HoTen', 'GioiTinh', 'NgaySinh', 'SDT', 'DiaChi', 'TrangThai')
+
+
+def make_laptops(n, rng):
+    for ma_sp in range(1, n + 1):
+        hang = rng.choice(HANG)
+        yield {
+            'MaSP': ma_sp,
+            'TenSP': f"{hang} {rng.choice(['Inspiron', 'Pavilion', 'ThinkPad', 'Vivobook'])} {rng.randint(13, 16)}",
+            'Hang': hang,
+            'CauHinh': f"Core i{rng.choice([3, 5, 7])}, {rng.choice([8, 16, 32])}GB RAM, SSD {rng.choice([256, 512])}GB",
+            'GiaBan': decimal.Decimal(rng.randrange(8_000_000, 60_000_000, 10_000)),
+            'Kho': rng.randint(0, 200),
+            'MaNCC': rng.randint(1, 20),
+            'TrangThai': 'Đang bán',
+        }
+
+
+def make_customers(n, rng):
+    for ma_kh in range(1, n + 1):
+        yield {
+            'MaKH': ma_kh,
+            'HoTen': f"{rng.choice(HO)} {rng.choice(TEN)}",
+            'GioiTinh': rng.choice(['Nam', 'Nu']),
+            'NgaySinh': datetime.date(1960, 1, 1) + datetime.timedelta(days=rng.randrange(16000)),
+            'SDT': '09' + ''.join(rng.choice('0123456789') for _ in range(8)),
+            'DiaChi': f"{rng.randint(1, 300)} Lê Lợi, Quận {rng.randint(1, 12)}, TP. Hồ Chí Minh",
+            'TrangThai': 'Active',
+        }
+
+
+def as_rows(records):
+    # Như route hiện có: Decimal -> float, ngày -> chuỗi ISO trước khi jsonify
+    converted = []
+    for record in records:
+        record = dict(record)
+        for key, value in record.items():
+            if isinstance(value, decimal.Decimal):
+                record[key] = float(value)
+            elif isinstance(value, datetime.date):
+                record[key] = value.isoformat()
+        converted.append(record)
+    return converted
+
+
+def as_columns(records, fields):
+    return {"columns": list(fields), "rows": [[record[field] for field in fields] for record in records]}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def sizes(body):
+    result = {'raw': len(body), 'gzip': len(gzip.compress(body, compresslevel=6, mtime=0))}
+    if brotli is not None:
+        result['br'] = len(brotli.compress(body, quality=4))
+    return result
+
+
+def print_row(label, body, seconds):
+    size = sizes(body)
+    compressed = ' '.join(f"{name} {value / 1024:6.1f} KB" for name, value in size.items() if name != 'raw')
+    print(f"  {label:<34} {seconds * 1000:8.3f} ms  raw {size['raw'] / 1024:7.1f} KB  {compressed}")
+
+
+def bench_synthetic(name, records, fields, repeat):
+    app = Flask(__name__)
+    providers = [('flask mặc định', DefaultJSONProvider(app)),
+                 ('json chuẩn', json_provider.FastJSONProvider(app, 'json'))]
+    if json_provider.orjson is not None:
+        providers.append(('orjson', json_provider.FastJSONProvider(app, 'orjson')))
+
+    print(f"{name}: {len(records)} dòng (thời gian là trung vị của {repeat} lần, gồm cả dựng payload)")
+    for provider_name, provider in providers:
+        for shape, build in (('object', lambda: as_rows(records)),
+                             ('cột', lambda: as_columns(records, fields))):
+            if provider_name == 'flask mặc định' and shape == 'cột':
+                continue
+            if isinstance(provider, json_provider.FastJSONProvider):
+                # Provider mới tự xử lý Decimal / date nên dạng cột không cần đổi kiểu
+                dump = provider.dumps_bytes
+            else:
+                def dump(obj, provider=provider):
+                    return provider.dumps(obj).encode('utf-8')
+            body = dump({"status": "success", "data": build()})
+            seconds = timed(lambda: dump({"status": "success", "data": build()}), repeat)
+            print_row(f"{provider_name}, {shape}", body, seconds)
+    print()
+
+
+def bench_app(repeat):
+    import app as shop
+
+    client = shop.app.test_client()
+    with shop.app.app_context():
+        cursor = shop.get_db().cursor()
+        cursor.execute("SELECT TOP 1 HoTen FROM KhachHang ORDER BY MaKH")
+        row = cursor.fetchone()
+    term = row[0].split()[0] if row else 'Nguyễn'
+
+    urls = [
+        '/api/laptops?limit=200',
+        f'/api/search_KhachHang?q={term}&limit=100',
+        f'/api/search_employees?q={term}',
+        '/api/thong_ke_doanh_thu?from_date=2000-01-01&to_date=2100-01-01',
+    ]
+    print(f"Route thật ({shop.app.json.backend}, trung vị của {repeat} lần):")
+    for url in urls:
+        for shape in ('', 'columns'):
+            full = url + ('&format=columns' if shape else '')
+            for encoding in ('identity', 'gzip', 'br'):
+                if encoding == 'br' and brotli is None:
+                    continue
+                headers = {'Accept-Encoding': encoding}
+                response = client.get(full, headers=headers)
+                seconds = timed(lambda: client.get(full, headers=headers), repeat)
+                label = f"{url.split('?')[0]} {shape or 'object'} {encoding}"
+                print(f"  {label:<52} {response.status_code}  {seconds * 1000:8.2f} ms  "
+                      f"{len(response.get_data()) / 1024:7.1f} KB")
+    shop.shutdown(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200, help="Số dòng mỗi payload tổng hợp")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--app', action='store_true', help="Đo thêm qua các route thật")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bench_synthetic('Laptop', list(make_laptops(args.rows, rng)), LAPTOP_FIELDS, args.repeat)
+    bench_synthetic('Khách hàng', list(make_customers(args.rows, rng)), KHACH_HANG_FIELDS, args.repeat)
+    if args.app:
+        bench_app(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark tìm kiếm khách hàng: chỉ mục trigram trong bộ nhớ so với quét tuần tự
+(cùng ngữ nghĩa với ``LIKE '%...%'`` không dấu), và tuỳ chọn so với truy vấn SQL
+hiện có trên database cấu hình trong ``.env``.
+
+    python bench/bench_search.py --customers 100000
+    python bench/bench_search.py --customers 100000 --sql
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex, fold  # noqa: E402
+
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
+      'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý']
+DEM = ['Văn', 'Thị', 'Hữu', 'Đức', 'Minh', 'Ngọc', 'Thanh', 'Quốc', 'Gia', 'Thu', 'Xuân', 'Hoài']
+TEN = ['An', 'Bình', 'Cường', 'Dũng', 'Đạt', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hiếu', 'Hoa',
+       'Hùng', 'Hương', 'Khánh', 'Lan', 'Linh', 'Long', 'Mai', 'Nam', 'Nga', 'Phương',
+       'Quân', 'Quyên', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Trung', 'Tuấn', 'Vy', 'Yến']
+
+QUERIES = ['nguyen', 'Nguyễn Văn', 'duc', 'thi hương', 'an', 'tuấn', 'xyz', '0912', '5678', '123']
+
+
+def make_customers(n, seed=42):
+    rng = random.Random(seed)
+    for ma_kh in range(1, n + 1):
+        yield {
+            'MaKH': ma_kh,
+            'HoTen': f"{rng.choice(HO)} {rng.choice(DEM)} {rng.choice(TEN)}",
+            'GioiTinh': rng.choice(['Nam', 'Nu']),
+            'NgaySinh': None,
+            'SDT': '0' + ''.join(rng.choice('0123456789') for _ in range(9)),
+            'DiaChi': None,
+            'TrangThai': 'Active' if rng.random() < 0.9 else 'Inactive',
+        }
+
+
+def linear_scan(customers, folded_names, term):
+    """Ngữ nghĩa của câu SQL cũ: SDT LIKE %term% OR HoTen (không dấu) LIKE %term%,
+    ORDER BY TrangThai DESC, HoTen"""
+    query = fold(term)
+    found = [
+        (customer['TrangThai'] != 'Active', name, customer)
+        for customer, name in zip(customers, folded_names)
+        if term in customer['SDT'] or query in name
+    ]
+    found.sort(key=lambda item: item[:2])
+    return [customer for _, _, customer in found]
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def sql_search(term):
+    import app as shop
+
+    conn = shop.get_db_connection()
+    cursor = conn.cursor()
+    pattern = f'%{term}%'
+    cursor.execute(f"""
+        SELECT {shop.KHACH_HANG_COLUMNS}
+        FROM KhachHang
+        WHERE SDT LIKE ?
+           OR HoTen LIKE ?
+           OR HoTen COLLATE Latin1_General_CI_AI LIKE ?
+        ORDER BY TrangThai DESC, HoTen ASC
+    """, (pattern, pattern, pattern))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sql', action='store_true', help="Đo thêm truy vấn LIKE trên database thật")
+    args = parser.parse_args()
+
+    customers = list(make_customers(args.customers))
+    folded_names = [fold(c['HoTen']) for c in customers]
+
+    start = time.perf_counter()
+    index = SearchIndex('MaKH', lambda conn, after_key: [])
+    index.rebuild(customers)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Đo bộ nhớ bằng một lần dựng riêng vì tracemalloc làm chậm lần dựng
+    tracemalloc.start()
+    SearchIndex('MaKH', lambda conn, after_key: []).rebuild(customers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Dựng chỉ mục {args.customers} khách hàng: {build_ms:.0f} ms, bộ nhớ đỉnh ~{peak / 1024 / 1024:.0f} MB")
+
+    header = f"{'từ khoá':<14} {'kết quả':>8} {'chỉ mục (ms)':>13} {'top 20 (ms)':>12} {'quét (ms)':>10}"
+    if args.sql:
+        header += f" {'SQL (ms)':>10}"
+    print(header)
+
+    for term in QUERIES:
+        index_ms, found = timed(lambda: index.search(term), args.repeat)
+        top_ms, _ = timed(lambda: index.search(term, limit=20), args.repeat)
+        scan_ms, expected = timed(lambda: linear_scan(customers, folded_names, term), args.repeat)
+        if {c['MaKH'] for c in found} != {c['MaKH'] for c in expected}:
+            sys.exit(f"Kết quả chỉ mục khác quét tuần tự với từ khoá {term!r}")
+        line = f"{term:<14} {len(found):>8} {index_ms:>13.2f} {top_ms:>12.2f} {scan_ms:>10.2f}"
+        if args.sql:
+            sql_ms, _ = timed(lambda: sql_search(term), args.repeat)
+            line += f" {sql_ms:>10.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Micro-benchmark chi phí kiểm tra dữ liệu mỗi request: chuỗi if/strptime viết tay
+(bản sao logic cũ của add_KhachHang / add_laptop / add_DonHang) so với schema
+biên dịch sẵn trong ``validation.py``. Không cần database.
+
+    python bench/bench_validation.py --number 20000
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import validation  # noqa: E402
+
+
+def legacy_khach_hang(data):
+    HoTen = data.get('HoTen', '').strip()
+    GioiTinh = data.get('GioiTinh')
+    NgaySinh = data.get('NgaySinh')
+    SDT = data.get('SDT', '').strip()
+    TrangThai = data.get('TrangThai', 'Active')
+    if not HoTen:
+        return "Họ tên là bắt buộc"
+    if len(HoTen) < 2:
+        return "Họ tên phải có ít nhất 2 ký tự"
+    if len(HoTen) > 100:
+        return "Họ tên không được quá 100 ký tự"
+    if not SDT:
+        return "Số điện thoại là bắt buộc"
+    if not SDT.isdigit():
+        return "Số điện thoại chỉ được chứa chữ số"
+    if len(SDT) < 10 or len(SDT) > 11:
+        return "Số điện thoại phải có 10-11 chữ số"
+    valid_genders = ['Nam', 'Nu', 'Khac', None]
+    if GioiTinh not in valid_genders:
+        return "Giới tính không hợp lệ"
+    if NgaySinh:
+        try:
+            ngay_sinh_date = datetime.datetime.strptime(NgaySinh, '%Y-%m-%d').date()
+            hom_nay = datetime.datetime.now().date()
+            if ngay_sinh_date > hom_nay:
+                return "Ngày sinh không được là tương lai"
+            tuoi = (hom_nay - ngay_sinh_date).days / 365.25
+            if tuoi < 13:
+                return "Khách hàng phải ít nhất 13 tuổi"
+            if tuoi > 150:
+                return "Ngày sinh không hợp lệ"
+        except ValueError:
+            return "Định dạng ngày sinh không hợp lệ (yêu cầu: YYYY-MM-DD)"
+    valid_statuses = ['Active', 'Inactive']
+    if TrangThai not in valid_statuses:
+        return "Trạng thái không hợp lệ"
+    return None
+
+
+def legacy_laptop(data):
+    TenSP = data.get('TenSP', '').strip()
+    Hang = data.get('Hang', '').strip()
+    GiaBan = data.get('GiaBan')
+    Kho = data.get('Kho', 0)
+    MaNCC = data.get('MaNCC')
+    NgayNhap = data.get('NgayNhap')
+    TrangThai = data.get('TrangThai', 'Active')
+    if not TenSP or not Hang or GiaBan is None:
+        return "Thiếu thông tin bắt buộc (Tên SP, Hãng, Giá Bán)"
+    if len(TenSP) < 3:
+        return "Tên sản phẩm phải có ít nhất 3 ký tự"
+    if len(TenSP) > 255:
+        return "Tên sản phẩm không được quá 255 ký tự"
+    if len(Hang) < 2:
+        return "Tên hãng phải có ít nhất 2 ký tự"
+    try:
+        GiaBan = float(GiaBan)
+        if GiaBan <= 0:
+            return "Giá bán phải lớn hơn 0"
+        if GiaBan > 1000000000:
+            return "Giá bán không hợp lệ (quá lớn)"
+    except (ValueError, TypeError):
+        return "Giá bán phải là số"
+    try:
+        Kho = int(Kho)
+        if Kho < 0:
+            return "Số lượng kho không được âm"
+        if Kho > 100000:
+            return "Số lượng kho không hợp lệ (quá lớn)"
+    except (ValueError, TypeError):
+        return "Số lượng kho phải là số nguyên"
+    if NgayNhap:
+        try:
+            ngay_nhap_date = datetime.datetime.strptime(NgayNhap, '%Y-%m-%d').date()
+            hom_nay = datetime.datetime.now().date()
+            if ngay_nhap_date > hom_nay:
+                return "Ngày nhập không được là tương lai"
+        except ValueError:
+            return "Định dạng ngày nhập không hợp lệ (yêu cầu: YYYY-MM-DD)"
+    valid_statuses = ['Active', 'Ngừng kinh doanh']
+    if TrangThai not in valid_statuses:
+        return f"Trạng thái không hợp lệ. Phải là: {', '.join(valid_statuses)}"
+    if MaNCC:
+        try:
+            MaNCC = int(MaNCC)
+        except (ValueError, TypeError):
+            return "Mã nhà cung cấp phải là số"
+    return None
+
+
+def legacy_don_hang(data):
+    MaKH = data.get('MaKH')
+    MaNV = data.get('MaNV')
+    NgayGiao = data.get('NgayGiao')
+    TrangThaiXuLy = data.get('TrangThaiXuLy')
+    ChiTiet = data.get('ChiTiet', [])
+    if not MaKH or not MaNV or not NgayGiao or not TrangThaiXuLy or not ChiTiet:
+        return "Thiếu thông tin bắt buộc"
+    try:
+        MaKH = int(MaKH)
+        MaNV = int(MaNV)
+    except (ValueError, TypeError):
+        return "Mã khách hàng và mã nhân viên phải là số"
+    try:
+        ngay_giao_date = datetime.datetime.strptime(NgayGiao, '%Y-%m-%d').date()
+        hom_nay = datetime.datetime.now().date()
+        if ngay_giao_date < hom_nay:
+            return "Ngày giao hàng không được là quá khứ"
+    except ValueError:
+        return "Định dạng ngày giao không hợp lệ (yêu cầu: YYYY-MM-DD)"
+    valid_statuses = ['Chưa xử lý', 'Đang giao', 'Hoàn tất']
+    if TrangThaiXuLy not in valid_statuses:
+        return f"Trạng thái không hợp lệ. Phải là: {', '.join(valid_statuses)}"
+    for idx, item in enumerate(ChiTiet, 1):
+        maSP = item.get('MaSP')
+        soLuongDat = item.get('SoLuong')
+        giaBan = item.get('GiaBan')
+        if not maSP or not soLuongDat or giaBan is None:
+            return f"Sản phẩm thứ {idx} thiếu thông tin (MaSP, SoLuong, GiaBan)"
+        try:
+            maSP = int(maSP)
+            soLuongDat = int(soLuongDat)
+            giaBan = float(giaBan)
+        except (ValueError, TypeError):
+            return f"Sản phẩm thứ {idx} có dữ liệu không hợp lệ"
+        if soLuongDat <= 0:
+            return f"Sản phẩm thứ {idx}: Số lượng phải lớn hơn 0"
+        if giaBan <= 0:
+            return f"Sản phẩm thứ {idx}: Giá bán phải lớn hơn 0"
+    return None
+
+
+NGAY_GIAO = (datetime.date.today() + datetime.timedelta(days=3)).isoformat()
+
+CASES = [
+    ("khách hàng", legacy_khach_hang, validation.KHACH_HANG, {
+        'HoTen': 'Nguyễn Văn An', 'GioiTinh': 'Nam', 'NgaySinh': '1995-04-12',
+        'SDT': '0912345678', 'DiaChi': 'Hà Nội', 'TrangThai': 'Active'}),
+    ("laptop", legacy_laptop, validation.LAPTOP_THEM, {
+        'TenSP': 'Dell XPS 13', 'Hang': 'Dell', 'GiaBan': 32990000, 'CauHinh': 'i7/16GB/512GB',
+        'Kho': 20, 'MaNCC': 3, 'NgayNhap': '2024-05-01', 'TrangThai': 'Active'}),
+    ("đơn hàng 20 dòng", legacy_don_hang, validation.DON_HANG, {
+        'MaKH': 1, 'MaNV': 2, 'NgayGiao': NGAY_GIAO, 'TrangThaiXuLy': 'Chưa xử lý', 'GhiChu': '',
+        'ChiTiet': [{'MaSP': i, 'SoLuong': 1, 'GiaBan': 15000000} for i in range(1, 21)]}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<18} {'viết tay (µs)':>14} {'schema (µs)':>12}")
+    for name, legacy, schema, payload in CASES:
+        assert legacy(payload) is None and not schema.validate(payload)[1], name
+        legacy_us = min(timeit.repeat(lambda: legacy(payload), number=args.number, repeat=3)) / args.number * 1e6
+        schema_us = min(timeit.repeat(lambda: schema.validate(payload), number=args.number, repeat=3)) / args.number * 1e6
+        print(f"{name:<18} {legacy_us:>14.2f} {schema_us:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Load test giữ hàng: nhiều luồng cùng đặt một sản phẩm "nóng".
+
+Đặt ``Kho`` của một sản phẩm về ``--stock``, cho ``--threads`` luồng cùng gọi
+/api/add_DonHang (mỗi đơn 1 chiếc) cho tới khi hết hàng, rồi kiểm tra:
+
+- kho không bao giờ âm (có một luồng theo dõi đọc ``Kho`` liên tục),
+- số đơn thành công đúng bằng số hàng ban đầu, kho cuối cùng bằng 0.
+
+Script ghi dữ liệu thật, chỉ chạy trên database thử nghiệm:
+
+    python bench/load_hot_sku.py --stock 50 --threads 16
+"""
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as shop  # noqa: E402
+import dialects  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--masp', type=int, help="Mã sản phẩm dùng để test (mặc định lấy sản phẩm đầu tiên)")
+    args = parser.parse_args()
+
+    admin = shop.get_db_connection()
+    cursor = admin.cursor()
+    cursor.execute("SELECT TOP 1 MaKH FROM KhachHang WHERE TrangThai = 'Active'")
+    ma_kh = cursor.fetchone()[0]
+    cursor.execute("SELECT TOP 1 MaNV FROM NhanVien")
+    ma_nv = cursor.fetchone()[0]
+    if args.masp:
+        cursor.execute("SELECT MaSP, GiaBan, Kho FROM Laptop WHERE MaSP = ?", (args.masp,))
+    else:
+        cursor.execute("SELECT TOP 1 MaSP, GiaBan, Kho FROM Laptop ORDER BY MaSP")
+    ma_sp, gia_ban, kho_ban_dau = cursor.fetchone()
+    cursor.execute("UPDATE Laptop SET Kho = ? WHERE MaSP = ?", (args.stock, ma_sp))
+    admin.commit()
+
+    payload = {
+        "MaKH": ma_kh,
+        "MaNV": ma_nv,
+        "NgayGiao": datetime.date.today().isoformat(),
+        "TrangThaiXuLy": "Chưa xử lý",
+        "GhiChu": "load test hot sku",
+        "ChiTiet": [{"MaSP": ma_sp, "SoLuong": 1, "GiaBan": float(gia_ban)}],
+    }
+
+    lock = threading.Lock()
+    results = {"ok": 0, "het_hang": 0, "loi": 0}
+    errors = []
+    stop = threading.Event()
+    min_kho = [args.stock]
+    samples = [0]
+    monitor_errors = []
+
+    def monitor():
+        try:
+            watch()
+        except Exception as e:
+            # Ghi lại để báo FAIL: luồng theo dõi chết thì chưa kiểm tra được kho âm
+            monitor_errors.append(e)
+
+    def watch():
+        conn = shop.get_db_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+        # NOLOCK để đọc cả giá trị chưa commit (bắt được kho âm thoáng qua); SQLite
+        # không có hint này, đọc theo WAL chỉ thấy giá trị đã commit
+        hint = " WITH (NOLOCK)" if dialects.of(conn) is dialects.SQL_SERVER else ""
+        while not stop.is_set():
+            cur.execute(f"SELECT Kho FROM Laptop{hint} WHERE MaSP = ?", (ma_sp,))
+            kho = cur.fetchone()[0]
+            min_kho[0] = min(min_kho[0], kho)
+            samples[0] += 1
+        conn.close()
+
+    def worker():
+        client = shop.app.test_client()
+        while True:
+            response = client.post('/api/add_DonHang', json=payload)
+            with lock:
+                if response.status_code == 201:
+                    results["ok"] += 1
+                elif response.status_code == 400 and "không đủ" in response.get_json()["message"]:
+                    results["het_hang"] += 1
+                    return
+                else:
+                    results["loi"] += 1
+                    errors.append(response.get_json())
+                    return
+
+    watcher = threading.Thread(target=monitor)
+    watcher.start()
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    watcher.join()
+
+    cursor.execute("SELECT Kho FROM Laptop WHERE MaSP = ?", (ma_sp,))
+    kho_cuoi = cursor.fetchone()[0]
+    cursor.execute("UPDATE Laptop SET Kho = ? WHERE MaSP = ?", (kho_ban_dau, ma_sp))
+    admin.commit()
+    admin.close()
+
+    print(f"MaSP {ma_sp}: {results['ok']} đơn thành công / {args.stock} hàng, "
+          f"{results['het_hang']} luồng báo hết hàng, {results['loi']} lỗi, "
+          f"{elapsed:.2f}s ({results['ok'] / elapsed:.1f} đơn/s)")
+    print(f"Kho nhỏ nhất quan sát được: {min_kho[0]} ({samples[0]} lần đọc), kho cuối: {kho_cuoi}")
+    print("Pool:", shop.db_pool.stats())
+
+    failed = False
+    if monitor_errors:
+        print("FAIL: luồng theo dõi kho bị lỗi:", monitor_errors[0])
+        failed = True
+    elif samples[0] == 0:
+        print("FAIL: luồng theo dõi kho không đọc được lần nào")
+        failed = True
+    if min_kho[0] < 0 or kho_cuoi < 0:
+        print("FAIL: kho bị âm")
+        failed = True
+    if results["ok"] != args.stock or kho_cuoi != 0:
+        print("FAIL: số đơn thành công không khớp số hàng ban đầu")
+        failed = True
+    if errors:
+        print("FAIL: có lỗi ngoài hết hàng, ví dụ:", errors[0])
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
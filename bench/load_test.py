@@ -0,0 +1,494 @@
+"""Load test các route chính với tải đọc / ghi trộn lẫn: p50/p95/p99, throughput và
+số round trip database theo route, lưu JSON để so giữa các commit.
+
+Mỗi luồng chọn kịch bản theo tỉ trọng của ``--mix`` (``read``, ``mixed``, ``write``,
+chỉnh thêm bằng ``--weights laptop_list=30,add_DonHang=5``). Mã sản phẩm được chọn
+lệch theo Zipf như ``seed_data.py`` nên có "hàng hot". Mặc định chạy qua Flask test
+client trong cùng process; ``--url`` gửi HTTP tới server đang chạy (gunicorn...).
+Số round trip lấy từ header ``Server-Timing`` (cần ``METRICS_ENABLED=True``).
+
+Dữ liệu mẫu (mã sản phẩm, khách hàng, từ khoá tìm kiếm, khoảng ngày) đọc từ database
+cấu hình trong ``.env``; kịch bản ghi tạo đơn hàng / khách hàng thật, chỉ chạy trên
+database thử nghiệm:
+
+    python bench/seed_data.py --customers 20000 --order-lines 100000
+    python bench/load_test.py --mix mixed --threads 8 --duration 30 --output before.json
+    python bench/load_test.py --mix read --url http://127.0.0.1:8000 --output after.json
+    python bench/load_test.py --compare before.json after.json
+"""
+import argparse
+import contextlib
+import datetime
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+import dialects  # noqa: E402
+from search_index import fold  # noqa: E402
+from seed_data import SkewedPicker  # noqa: E402
+
+
+MIXES = {
+    'read': {
+        'laptop_list': 25, 'laptop_detail': 20, 'gia_sanpham': 10, 'search_KhachHang': 20,
+        'search_employees': 5, 'thong_ke_doanh_thu': 8, 'thong_ke_orders': 5, 'xem_hoa_don': 7,
+    },
+    'mixed': {
+        'laptop_list': 20, 'laptop_detail': 15, 'gia_sanpham': 8, 'search_KhachHang': 15,
+        'search_employees': 4, 'thong_ke_doanh_thu': 7, 'thong_ke_orders': 4, 'xem_hoa_don': 7,
+        'add_DonHang': 15, 'add_KhachHang': 5,
+    },
+    'write': {'add_DonHang': 75, 'add_KhachHang': 25},
+}
+
+KHOANG_NGAY = [1, 7, 30, 90, 365]
+PERCENTILES = (50, 95, 99)
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+# --- dữ liệu mẫu -------------------------------------------------------------
+
+class Fixtures:
+    """Các mã / từ khoá có thật trong database để kịch bản dùng"""
+
+    def __init__(self, cursor, sku_skew, seed):
+        rng = random.Random(seed)
+        cursor.execute("SELECT MaSP FROM Laptop")
+        self.ma_sps = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT MaSP, GiaBan FROM Laptop WHERE TrangThai = 'Active' AND Kho > 0")
+        self.gia = {ma_sp: float(gia) for ma_sp, gia in cursor.fetchall()}
+        cursor.execute("SELECT DISTINCT Hang FROM Laptop")
+        self.hangs = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT TOP (?) MaKH FROM KhachHang WHERE TrangThai = 'Active'", (50000,))
+        self.ma_khs = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT MaNV FROM NhanVien WHERE TrangThai = 'Active'")
+        self.ma_nvs = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT MIN(MaDH), MAX(MaDH) FROM DonHang")
+        self.min_dh, self.max_dh = cursor.fetchone()
+        # Đọc cột trực tiếp (không qua MIN/MAX) để SQLite trả về datetime như pyodbc
+        cursor.execute("SELECT TOP 1 ThoiGianTao FROM DonHang ORDER BY ThoiGianTao")
+        first = cursor.fetchone()
+        cursor.execute("SELECT TOP 1 ThoiGianTao FROM DonHang ORDER BY ThoiGianTao DESC")
+        last = cursor.fetchone()
+        today = datetime.date.today()
+        self.first_day = first[0].date() if first else today
+        self.last_day = last[0].date() if last else today
+
+        cursor.execute("SELECT TOP (?) HoTen, SDT FROM KhachHang", (2000,))
+        self.customer_terms = _search_terms(cursor.fetchall(), rng)
+        cursor.execute("SELECT HoTen, SDT FROM NhanVien")
+        self.employee_terms = _search_terms(cursor.fetchall(), rng)
+
+        if not self.gia or not self.ma_khs or not self.ma_nvs or self.max_dh is None:
+            sys.exit("Database chưa có dữ liệu, chạy bench/seed_data.py trước")
+        self.san_pham = SkewedPicker(self.gia, sku_skew, random.Random(seed))
+        self.counts = {}
+        for table in ('Laptop', 'KhachHang', 'NhanVien', 'DonHang', 'ChiTietDonHang'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            self.counts[table] = cursor.fetchone()[0]
+
+
+def _search_terms(rows, rng):
+    """Từ khoá kiểu người dùng gõ: tên, họ + đệm, tên không dấu, vài số điện thoại"""
+    terms = []
+    for ho_ten, sdt in rows:
+        words = ho_ten.split()
+        kind = rng.random()
+        if kind < 0.35:
+            terms.append(words[-1])
+        elif kind < 0.6:
+            terms.append(' '.join(words[:2]))
+        elif kind < 0.8:
+            terms.append(fold(words[-1]))
+        else:
+            start = rng.randint(0, len(sdt) - 4)
+            terms.append(sdt[start:start + 4])
+    return terms or ['an']
+
+
+# --- client ------------------------------------------------------------------
+
+class TestClient:
+    """Gọi route qua Flask test client (không qua mạng)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        data = response.get_data()
+        return response.status_code, response.headers.get('Server-Timing'), data
+
+
+class HttpClient:
+    """Gọi route qua HTTP, giữ kết nối keep-alive cho mỗi luồng"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, self.prefix + path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, response.getheader('Server-Timing'), data
+            except (http.client.HTTPException, ConnectionError):
+                # Server đóng kết nối keep-alive: mở lại và thử một lần nữa
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+
+# --- kịch bản ----------------------------------------------------------------
+
+class Scenarios:
+    """Mỗi kịch bản trả về (method, path, body) của một request; ``observe`` nhận
+    response để kịch bản sau dùng tiếp (con trỏ trang sau của danh sách laptop)"""
+
+    def __init__(self, fixtures, rng, thread_id):
+        self.fx = fixtures
+        self.rng = rng
+        self.thread_id = thread_id
+        self.laptop_query = None
+        self.next_laptop_page = None
+        self.new_customers = 0
+
+    def observe(self, name, status, data):
+        if name == 'laptop_list' and status == 200:
+            next_cursor = json.loads(data).get('next')
+            self.next_laptop_page = dict(self.laptop_query, after=next_cursor) if next_cursor else None
+
+    def laptop_list(self):
+        if self.next_laptop_page and self.rng.random() < 0.3:
+            query = self.laptop_query = self.next_laptop_page
+            return 'GET', '/api/laptops?' + urlencode(query), None
+        query = {'limit': 20}
+        kind = self.rng.random()
+        if kind < 0.4:
+            query['Hang'] = self.rng.choice(self.fx.hangs)
+        elif kind < 0.6:
+            low = self.rng.choice([10, 15, 20, 30]) * 1_000_000
+            query.update(min_price=low, max_price=low + 10_000_000, sort='GiaBan')
+        if self.rng.random() < 0.3:
+            query['order'] = 'desc'
+        self.laptop_query = query
+        return 'GET', '/api/laptops?' + urlencode(query), None
+
+    def laptop_detail(self):
+        if self.rng.random() < 0.8:
+            ma_sp = self.fx.san_pham.pick()
+        else:
+            ma_sp = self.rng.choice(self.fx.ma_sps)
+        return 'GET', f'/api/laptop/{ma_sp}', None
+
+    def gia_sanpham(self):
+        ids = {self.fx.san_pham.pick() for _ in range(self.rng.randint(1, 10))}
+        return 'POST', '/api/get_gia_sanpham', {'ids': sorted(ids)}
+
+    def search_KhachHang(self):
+        q = self.rng.choice(self.fx.customer_terms)
+        return 'GET', '/api/search_KhachHang?' + urlencode({'q': q, 'limit': 20}), None
+
+    def search_employees(self):
+        return 'GET', '/api/search_employees?' + urlencode({'q': self.rng.choice(self.fx.employee_terms)}), None
+
+    def _khoang_ngay(self):
+        span = self.rng.choice(KHOANG_NGAY)
+        total = max((self.fx.last_day - self.fx.first_day).days - span, 0)
+        tu = self.fx.first_day + datetime.timedelta(days=self.rng.randint(0, total))
+        return {'from_date': tu.isoformat(), 'to_date': (tu + datetime.timedelta(days=span - 1)).isoformat()}
+
+    def thong_ke_doanh_thu(self):
+        return 'GET', '/api/thong_ke_doanh_thu?' + urlencode(self._khoang_ngay()), None
+
+    def thong_ke_orders(self):
+        query = dict(self._khoang_ngay(), limit=50)
+        return 'GET', '/api/thong_ke_doanh_thu/orders?' + urlencode(query), None
+
+    def xem_hoa_don(self):
+        return 'GET', f'/xem_hoa_don/{self.rng.randint(self.fx.min_dh, self.fx.max_dh)}', None
+
+    def add_DonHang(self):
+        ma_sps = {self.fx.san_pham.pick() for _ in range(self.rng.choice([1, 1, 1, 2, 3]))}
+        return 'POST', '/api/add_DonHang', {
+            'MaKH': self.rng.choice(self.fx.ma_khs),
+            'MaNV': self.rng.choice(self.fx.ma_nvs),
+            'NgayGiao': datetime.date.today().isoformat(),
+            'TrangThaiXuLy': self.rng.choice(['Chưa xử lý', 'Chưa xử lý', 'Hoàn tất']),
+            'GhiChu': 'load test',
+            'ChiTiet': [{'MaSP': ma_sp, 'SoLuong': 1, 'GiaBan': self.fx.gia[ma_sp]} for ma_sp in ma_sps],
+        }
+
+    def add_KhachHang(self):
+        # Đầu số 089 không có trong dữ liệu sinh ra; trùng giữa các lần chạy thì nhận 400
+        self.new_customers += 1
+        so = (int(time.time()) * 1000 + self.thread_id * 100_000 + self.new_customers) % 10_000_000
+        return 'POST', '/api/add_KhachHang', {
+            'HoTen': 'Khách Thử Tải', 'SDT': f'089{so:07d}', 'GioiTinh': 'Nam', 'TrangThai': 'Active'
+        }
+
+
+def parse_weights(mix, overrides):
+    weights = dict(MIXES[mix])
+    for item in filter(None, (overrides or '').split(',')):
+        name, _, value = item.partition('=')
+        if name.strip() not in set().union(*MIXES.values()):
+            sys.exit(f"Không có kịch bản {name.strip()}")
+        weights[name.strip()] = float(value)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+# --- chạy --------------------------------------------------------------------
+
+def run(make_client, fixtures, weights, threads, duration, max_requests, seed):
+    """Chạy ``threads`` luồng tới hết ``duration`` giây hoặc ``max_requests`` request.
+
+    Trả về (dict kịch bản -> danh sách mẫu, số giây đã chạy); mỗi mẫu là
+    (ms, status, số round trip hoặc None, ms database hoặc None).
+    """
+    names = list(weights)
+    cum_weights = list(itertools.accumulate(weights[name] for name in names))
+    deadline = time.perf_counter() + duration if duration else None
+    budget = [max_requests]
+    budget_lock = threading.Lock()
+    results = [dict() for _ in range(threads)]
+    failures = []
+
+    def worker(i):
+        rng = random.Random(seed * 1000 + i)
+        client = make_client()
+        scenarios = Scenarios(fixtures, rng, i)
+        samples = results[i]
+        while deadline is None or time.perf_counter() < deadline:
+            if max_requests:
+                with budget_lock:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+            name = rng.choices(names, cum_weights=cum_weights)[0]
+            method, path, body = getattr(scenarios, name)()
+            start = time.perf_counter()
+            try:
+                status, server_timing, data = client.request(method, path, body)
+            except Exception as e:
+                failures.append(f"{name}: {e}")
+                samples.setdefault(name, []).append(((time.perf_counter() - start) * 1000, 0, None, None))
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            match = _SERVER_TIMING_DB.search(server_timing or '')
+            samples.setdefault(name, []).append((
+                elapsed, status,
+                int(match.group(2)) if match else None,
+                float(match.group(1)) if match else None,
+            ))
+            scenarios.observe(name, status, data)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {}
+    for samples in results:
+        for name, values in samples.items():
+            merged.setdefault(name, []).extend(values)
+    for failure in failures[:5]:
+        print("Lỗi gọi request:", failure)
+    return merged, elapsed
+
+
+def percentile(sorted_values, p):
+    """Percentile kiểu nearest-rank"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample[0] for sample in samples)
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample[1])] = statuses.get(str(sample[1]), 0) + 1
+    round_trips = sorted(sample[2] for sample in samples if sample[2] is not None)
+    db_ms = [sample[3] for sample in samples if sample[3] is not None]
+    summary = {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        # 4xx là từ chối nghiệp vụ (hết hàng, trùng SĐT...), chỉ 5xx / lỗi kết nối tính là lỗi
+        "errors": sum(1 for sample in samples if sample[1] >= 500 or sample[1] == 0),
+        "status": statuses,
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(percentile(latencies, p), 3)
+    if round_trips:
+        summary["db_round_trips_mean"] = round(sum(round_trips) / len(round_trips), 2)
+        summary["db_round_trips_p95"] = percentile(round_trips, 95)
+        summary["db_ms_mean"] = round(sum(db_ms) / len(db_ms), 3)
+    return summary
+
+
+def git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def print_report(report):
+    print(f"{'route':<20} {'req':>7} {'req/s':>8} {'lỗi':>5} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'max':>8} {'round trip':>10}")
+    rows = sorted(report["routes"].items()) + [("TỔNG", report["total"])]
+    for name, s in rows:
+        round_trips = f"{s['db_round_trips_mean']:.1f}" if 'db_round_trips_mean' in s else '-'
+        print(f"{name:<20} {s['requests']:>7} {s['throughput_rps']:>8.1f} {s['errors']:>5} "
+              f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f} {round_trips:>10}")
+    print("(thời gian tính bằng ms)")
+
+
+def compare(base_path, new_path):
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'route':<20} {'p50 (ms)':>20} {'p95 (ms)':>20} {'p99 (ms)':>20} {'req/s':>18} {'round trip':>14}")
+
+    def cell(old, value, width, fmt='.2f'):
+        if old is None or value is None:
+            return f"{'-':>{width}}"
+        change = f"{(value - old) / old * 100:+.0f}%" if old else ''
+        return f"{f'{old:{fmt}} → {value:{fmt}} {change}':>{width}}"
+
+    names = sorted(set(base["routes"]) | set(new["routes"]))
+    for name, old, cur in [(n, base["routes"].get(n), new["routes"].get(n)) for n in names] + \
+            [("TỔNG", base["total"], new["total"])]:
+        if not old or not cur:
+            print(f"{name:<20} (chỉ có ở một lần chạy)")
+            continue
+        print(f"{name:<20} {cell(old['p50_ms'], cur['p50_ms'], 20)} {cell(old['p95_ms'], cur['p95_ms'], 20)} "
+              f"{cell(old['p99_ms'], cur['p99_ms'], 20)} "
+              f"{cell(old['throughput_rps'], cur['throughput_rps'], 18, '.1f')} "
+              f"{cell(old.get('db_round_trips_mean'), cur.get('db_round_trips_mean'), 14, '.1f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--weights', help="Đổi tỉ trọng: tên=số,... (0 để bỏ kịch bản)")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help="Số giây đo (0: chỉ giới hạn bằng --requests)")
+    parser.add_argument('--requests', type=int, default=0, help="Dừng sau số request này")
+    parser.add_argument('--warmup', type=float, default=5, help="Số giây chạy trước khi đo (làm nóng cache)")
+    parser.add_argument('--url', help="Gửi HTTP tới server này thay vì dùng Flask test client")
+    parser.add_argument('--sku-skew', type=float, default=1.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Lưu kết quả JSON vào file này")
+    parser.add_argument('--verbose', action='store_true', help="Không ẩn log của ứng dụng khi chạy in-process")
+    parser.add_argument('--compare', nargs=2, metavar=('CU.json', 'MOI.json'),
+                        help="So hai file kết quả rồi thoát")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.duration and not args.requests:
+        sys.exit("Cần --duration hoặc --requests")
+
+    load_dotenv()
+    weights = parse_weights(args.mix, args.weights)
+    backend = os.getenv('DB_BACKEND', 'mssql')
+    conn = dialects.get(backend).connect()
+    fixtures = Fixtures(conn.cursor(), args.sku_skew, args.seed)
+    conn.close()
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+        quiet = contextlib.nullcontext()
+    else:
+        # Cần header Server-Timing để đếm round trip
+        os.environ.setdefault('METRICS_ENABLED', 'True')
+        import app as shop
+
+        def make_client():
+            return TestClient(shop.app)
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    print(f"Load test '{args.mix}' ({backend}, {args.url or 'test client'}), {args.threads} luồng, "
+          f"dữ liệu: {', '.join(f'{t} {c}' for t, c in fixtures.counts.items())}")
+    with quiet:
+        if args.warmup:
+            run(make_client, fixtures, weights, args.threads, args.warmup, 0, args.seed + 1)
+        samples, elapsed = run(make_client, fixtures, weights, args.threads,
+                               args.duration, args.requests, args.seed)
+
+    all_samples = [sample for values in samples.values() for sample in values]
+    if not all_samples:
+        sys.exit("Không có request nào được gửi")
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.datetime.now().isoformat(timespec='seconds'),
+            "backend": backend,
+            "target": args.url or 'test_client',
+            "mix": args.mix,
+            "weights": weights,
+            "threads": args.threads,
+            "duration_s": round(elapsed, 3),
+            "seed": args.seed,
+            "data": fixtures.counts,
+            "python": platform.python_version(),
+        },
+        "routes": {name: summarize(values, elapsed) for name, values in samples.items()},
+        "total": summarize(all_samples, elapsed),
+    }
+    print_report(report)
+    if "db_round_trips_mean" not in report["total"]:
+        print("Không có header Server-Timing (METRICS_ENABLED=False?), không đếm được round trip")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print("Đã lưu", args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+"""Sinh dữ liệu giả cho cửa hàng ở quy mô tuỳ chọn, để đo hiệu năng khi dữ liệu lớn.
+
+Thêm nhà cung cấp, laptop, nhân viên, khách hàng (họ tên, địa chỉ tiếng Việt) và
+đơn hàng trải đều trong ``--days`` ngày gần nhất. Độ phổ biến sản phẩm và khách hàng
+lệch theo phân phối Zipf (``--sku-skew``, ``--customer-skew``): vài mã bán rất chạy,
+phần lớn bán lẻ tẻ. Cùng ``--seed`` cho cùng dữ liệu. Cuối cùng tính lại bảng tổng
+hợp doanh thu cho khoảng ngày vừa sinh.
+
+Script ghi vào database cấu hình trong ``.env`` (hoặc ``DB_BACKEND=sqlite``), chỉ
+chạy trên database thử nghiệm:
+
+    python bench/seed_data.py --skus 1000 --customers 20000 --order-lines 100000
+    python bench/seed_data.py --skus 10000 --customers 500000 --order-lines 5000000
+"""
+import argparse
+import bisect
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+import dialects  # noqa: E402
+import rollups  # noqa: E402
+
+
+# Tỉ lệ gần đúng các họ phổ biến
+HO = [('Nguyễn', 38), ('Trần', 11), ('Lê', 9.5), ('Phạm', 7), ('Hoàng', 3), ('Huỳnh', 2),
+      ('Phan', 4.5), ('Vũ', 3.9), ('Võ', 2), ('Đặng', 2.1), ('Bùi', 2), ('Đỗ', 1.4),
+      ('Hồ', 1.3), ('Ngô', 1.3), ('Dương', 1), ('Lý', 0.5), ('Trương', 1), ('Đinh', 0.8),
+      ('Lâm', 0.6), ('Mai', 0.5), ('Trịnh', 0.5), ('Đoàn', 0.5), ('Cao', 0.4), ('Tạ', 0.2)]
+DEM_NAM = ['Văn', 'Hữu', 'Đức', 'Minh', 'Quốc', 'Thành', 'Công', 'Gia', 'Xuân', 'Hoàng',
+           'Anh', 'Trọng', 'Tuấn', 'Quang', 'Đình', 'Ngọc']
+DEM_NU = ['Thị', 'Ngọc', 'Thu', 'Thanh', 'Kim', 'Minh', 'Phương', 'Bảo', 'Hoài', 'Mỹ',
+          'Diệu', 'Thuỳ', 'Khánh', 'Hồng', 'Xuân', 'Tuyết']
+TEN_NAM = ['An', 'Bình', 'Cường', 'Dũng', 'Đạt', 'Hải', 'Hiếu', 'Hùng', 'Huy', 'Khang',
+           'Khoa', 'Kiên', 'Long', 'Lộc', 'Minh', 'Nam', 'Nghĩa', 'Phát', 'Phong', 'Phúc',
+           'Quân', 'Sơn', 'Tài', 'Thắng', 'Thịnh', 'Toàn', 'Trung', 'Tuấn', 'Việt', 'Vinh']
+TEN_NU = ['Anh', 'Chi', 'Dung', 'Giang', 'Hà', 'Hạnh', 'Hằng', 'Hoa', 'Hương', 'Huyền',
+          'Lan', 'Linh', 'Loan', 'Mai', 'My', 'Nga', 'Ngân', 'Ngọc', 'Nhung', 'Oanh',
+          'Phương', 'Quyên', 'Tâm', 'Thảo', 'Thư', 'Trang', 'Uyên', 'Vân', 'Vy', 'Yến']
+
+DUONG = ['Lê Lợi', 'Trần Hưng Đạo', 'Nguyễn Huệ', 'Hai Bà Trưng', 'Lý Thường Kiệt',
+         'Điện Biên Phủ', 'Cách Mạng Tháng Tám', 'Nguyễn Trãi', 'Phan Đình Phùng',
+         'Lê Duẩn', 'Võ Văn Tần', 'Hoàng Văn Thụ', 'Nguyễn Văn Cừ', 'Pasteur', 'Láng Hạ']
+KHU_VUC = [('Quận 1', 'TP. Hồ Chí Minh'), ('Quận 3', 'TP. Hồ Chí Minh'), ('Quận 7', 'TP. Hồ Chí Minh'),
+           ('Thủ Đức', 'TP. Hồ Chí Minh'), ('Bình Thạnh', 'TP. Hồ Chí Minh'), ('Ba Đình', 'Hà Nội'),
+           ('Cầu Giấy', 'Hà Nội'), ('Đống Đa', 'Hà Nội'), ('Hoàn Kiếm', 'Hà Nội'),
+           ('Hải Châu', 'Đà Nẵng'), ('Ninh Kiều', 'Cần Thơ'), ('Lê Chân', 'Hải Phòng'),
+           ('TP. Biên Hoà', 'Đồng Nai'), ('TP. Thủ Dầu Một', 'Bình Dương'), ('TP. Huế', 'Thừa Thiên Huế')]
+
+# Đầu số di động của khách hàng; load test dùng đầu số khác (089) nên không trùng
+DAU_SO_KHACH = ['090', '091', '093', '094', '096', '097', '098', '032', '033', '035',
+                '070', '076', '077', '081', '083', '085']
+DAU_SO_NHAN_VIEN = '028'
+
+# hãng -> (tỉ trọng, các dòng máy, giá thấp nhất, giá cao nhất) tính theo triệu đồng
+HANG = {
+    'Dell': (18, ['Inspiron 14', 'Inspiron 15', 'Vostro 3520', 'Latitude 5440', 'XPS 13', 'G15'], 12, 55),
+    'HP': (16, ['Pavilion 14', 'Victus 16', 'ProBook 450', 'EliteBook 840', 'Envy x360', '15s'], 11, 50),
+    'Lenovo': (17, ['IdeaPad Slim 3', 'IdeaPad 5', 'ThinkPad E14', 'ThinkPad X1 Carbon', 'Legion 5', 'Yoga 7'], 10, 60),
+    'Asus': (16, ['Vivobook 15', 'Zenbook 14', 'TUF Gaming F15', 'ROG Strix G16', 'ExpertBook B1'], 10, 65),
+    'Acer': (12, ['Aspire 5', 'Aspire 7', 'Swift Go 14', 'Nitro 5', 'Predator Helios'], 9, 50),
+    'Apple': (9, ['MacBook Air M2', 'MacBook Air M3', 'MacBook Pro 14', 'MacBook Pro 16'], 24, 90),
+    'MSI': (7, ['Modern 14', 'Katana 15', 'Cyborg 15', 'Prestige 14', 'Stealth 16'], 14, 70),
+    'LG': (3, ['Gram 14', 'Gram 16', 'Gram Style'], 25, 45),
+    'Gigabyte': (2, ['G5', 'Aorus 15', 'Aero 14'], 18, 55),
+}
+CPU = ['Intel Core i3-1215U', 'Intel Core i5-1235U', 'Intel Core i5-12450H', 'Intel Core i7-1355U',
+       'Intel Core i7-13700H', 'Intel Core Ultra 5 125H', 'Intel Core Ultra 7 155H',
+       'AMD Ryzen 5 7530U', 'AMD Ryzen 7 7735HS', 'AMD Ryzen 9 7940HS']
+RAM = [8, 16, 16, 16, 32, 32, 64]
+SSD = [256, 512, 512, 512, 1024, 1024, 2048]
+GPU = ['', '', '', ', RTX 3050', ', RTX 4050', ', RTX 4060', ', RTX 4070']
+
+NHA_CUNG_CAP = ['Phong Vũ', 'An Phát', 'Hoàng Hà', 'Thế Giới Số', 'Phúc Anh', 'Hanoicomputer',
+                'GearVN', 'Digiworld', 'FPT Trading', 'Synnex FPT', 'Viễn Sơn', 'Minh Thông']
+CHUC_VU = [('Nhân viên bán hàng', 8), ('Thu ngân', 7), ('Kỹ thuật viên', 9), ('Trưởng ca', 12),
+           ('Quản lý cửa hàng', 20)]
+
+TRANG_THAI_DON_HANG = ['Chưa xử lý', 'Đang giao', 'Hoàn tất']
+
+
+def zipf_cum_weights(n, skew):
+    """Trọng số tích luỹ Zipf cho ``n`` phần tử: phần tử hạng k có trọng số 1/k^skew"""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+class SkewedPicker:
+    """Chọn ngẫu nhiên theo Zipf; thứ hạng được xáo trộn nên mã nhỏ không phải mã hot"""
+
+    def __init__(self, items, skew, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = zipf_cum_weights(len(self.items), skew)
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+        self.rng = rng
+
+    def pick(self):
+        i = bisect.bisect(self.cum_weights, self.rng.random() * self.total)
+        return self.items[min(i, len(self.items) - 1)]
+
+    def hottest(self, n):
+        return self.items[:n]
+
+
+def ho_ten(rng, nu=None):
+    if nu is None:
+        nu = rng.random() < 0.5
+    ho = rng.choices([h for h, _ in HO], weights=[w for _, w in HO])[0]
+    if nu:
+        return f"{ho} {rng.choice(DEM_NU)} {rng.choice(TEN_NU)}", 'Nu'
+    return f"{ho} {rng.choice(DEM_NAM)} {rng.choice(TEN_NAM)}", 'Nam'
+
+
+def dia_chi(rng):
+    quan, tinh = rng.choice(KHU_VUC)
+    return f"{rng.randint(1, 399)} {rng.choice(DUONG)}, {quan}, {tinh}"
+
+
+def so_dien_thoai(n, dau_so):
+    """Số thứ ``n`` (không trùng với các ``n`` khác): đầu số xoay vòng, 7 số sau hoán vị"""
+    dau = dau_so[n % len(dau_so)]
+    # 7919 nguyên tố cùng nhau với 10^7 nên phép nhân (cộng độ lệch) là một hoán vị
+    return f"{dau}{((n // len(dau_so)) * 7919 + 1234567) % 10_000_000:07d}"
+
+
+def laptop(rng, today):
+    hang = rng.choices(list(HANG), weights=[spec[0] for spec in HANG.values()])[0]
+    _, dong_may, gia_min, gia_max = HANG[hang]
+    ram = rng.choice(RAM)
+    ssd = rng.choice(SSD)
+    cpu = 'Apple M' if hang == 'Apple' else rng.choice(CPU)
+    gia = Decimal(round(rng.uniform(gia_min, gia_max) * 100) * 10_000)
+    return (
+        f"{hang} {rng.choice(dong_may)} {ram}GB/{ssd}GB",
+        hang,
+        f"{cpu}, {ram}GB RAM, SSD {ssd}GB{'' if hang == 'Apple' else rng.choice(GPU)}",
+        gia,
+        min(int(rng.paretovariate(1.2) * 20), 5000),
+        today - datetime.timedelta(days=rng.randint(0, 720)),
+        'Active' if rng.random() < 0.95 else 'Ngừng kinh doanh',
+    )
+
+
+def insert_batches(conn, sql, rows, batch_size, label):
+    """executemany từng batch, commit mỗi batch, in tiến độ"""
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    total = 0
+    start = time.perf_counter()
+    for batch in _batches(rows, batch_size):
+        cursor.executemany(sql, batch)
+        conn.commit()
+        total += len(batch)
+        print(f"\r  {label}: {total}", end='', flush=True)
+    elapsed = time.perf_counter() - start
+    if total:
+        print(f"\r  {label}: {total} ({total / elapsed:.0f} dòng/s)")
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_rows(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def seed(conn, args):
+    rng = random.Random(args.seed)
+    cursor = conn.cursor()
+    today = datetime.date.today()
+
+    if args.suppliers:
+        start = count_rows(cursor, 'NhaCungCap')
+        insert_batches(conn, "INSERT INTO NhaCungCap (TenNCC, SDT, Email, DiaChi) VALUES (?, ?, ?, ?)", (
+            (f"{NHA_CUNG_CAP[n % len(NHA_CUNG_CAP)]} {n // len(NHA_CUNG_CAP) + 1}",
+             so_dien_thoai(start + n, ['024']), f"ncc{start + n}@example.vn", dia_chi(rng))
+            for n in range(args.suppliers)
+        ), args.batch, "Nhà cung cấp")
+    cursor.execute("SELECT MaNCC FROM NhaCungCap")
+    ma_nccs = [row[0] for row in cursor.fetchall()]
+
+    if args.skus:
+        insert_batches(conn, """
+            INSERT INTO Laptop (TenSP, Hang, CauHinh, GiaBan, Kho, NgayNhap, TrangThai, MaNCC)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (laptop(rng, today) + (rng.choice(ma_nccs) if ma_nccs else None,) for _ in range(args.skus)),
+            args.batch, "Laptop")
+
+    if args.employees:
+        start = count_rows(cursor, 'NhanVien')
+
+        def nhan_vien(n):
+            ten, gioi_tinh = ho_ten(rng)
+            chuc_vu, luong = rng.choices(CHUC_VU, weights=[60, 15, 15, 7, 3])[0]
+            return (ten, gioi_tinh, f"nv{start + n}@laptopshop.vn", so_dien_thoai(start + n, [DAU_SO_NHAN_VIEN]),
+                    'Active' if rng.random() < 0.9 else 'Inactive', Decimal(luong * 1_000_000), chuc_vu)
+
+        insert_batches(conn, """
+            INSERT INTO NhanVien (HoTen, GioiTinh, Email, SDT, TrangThai, LuongCoBan, TenChucVu)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (nhan_vien(n) for n in range(args.employees)), args.batch, "Nhân viên")
+
+    if args.customers:
+        start = count_rows(cursor, 'KhachHang')
+
+        def khach_hang(n):
+            ten, gioi_tinh = ho_ten(rng)
+            ngay_sinh = today - datetime.timedelta(days=rng.randint(16 * 365, 70 * 365))
+            return (ten, gioi_tinh, ngay_sinh if rng.random() < 0.7 else None,
+                    so_dien_thoai(start + n, DAU_SO_KHACH),
+                    dia_chi(rng) if rng.random() < 0.8 else None,
+                    'Active' if rng.random() < 0.97 else 'Inactive')
+
+        insert_batches(conn, """
+            INSERT INTO KhachHang (HoTen, GioiTinh, NgaySinh, SDT, DiaChi, TrangThai)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (khach_hang(n) for n in range(args.customers)), args.batch, "Khách hàng")
+
+    if args.order_lines:
+        seed_orders(conn, rng, args)
+
+
+def seed_orders(conn, rng, args):
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    cursor.execute("SELECT MaSP, GiaBan FROM Laptop")
+    gia = dict(cursor.fetchall())
+    cursor.execute("SELECT MaKH FROM KhachHang WHERE TrangThai = 'Active'")
+    ma_khs = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT MaNV FROM NhanVien")
+    ma_nvs = [row[0] for row in cursor.fetchall()]
+    if not gia or not ma_khs or not ma_nvs:
+        sys.exit("Cần có laptop, khách hàng Active và nhân viên trước khi sinh đơn hàng")
+
+    san_pham = SkewedPicker(gia, args.sku_skew, rng)
+    khach_hang = SkewedPicker(ma_khs, args.customer_skew, rng)
+    now = datetime.datetime.now().replace(microsecond=0)
+    window = args.days * 86400
+    max_lines = min(args.max_lines, len(gia))
+
+    def don_hang():
+        """Một đơn (các cột DonHang, danh sách (MaSP, SoLuong, GiaBan))"""
+        # Đơn gần đây nhiều hơn đơn cũ một chút (cửa hàng đang tăng trưởng)
+        thoi_gian = now - datetime.timedelta(seconds=int(window * rng.random() ** 1.3))
+        # Số dòng theo phân phối hình học, trung bình ~avg_lines
+        so_dong = 1
+        while so_dong < max_lines and rng.random() < 1 - 1 / args.avg_lines:
+            so_dong += 1
+        chon = set()
+        while len(chon) < so_dong:
+            chon.add(san_pham.pick())
+        dong = [(ma_sp, 1 if rng.random() < 0.85 else rng.randint(2, 3), gia[ma_sp]) for ma_sp in chon]
+        tuoi = (now - thoi_gian).days
+        if tuoi > 7:
+            trang_thai = 'Hoàn tất' if rng.random() < 0.92 else rng.choice(TRANG_THAI_DON_HANG[:2])
+        else:
+            trang_thai = rng.choice(TRANG_THAI_DON_HANG)
+        tong_tien = sum(so_luong * gia_ban for _, so_luong, gia_ban in dong)
+        ngay_giao = thoi_gian.date() + datetime.timedelta(days=rng.randint(0, 5))
+        return (khach_hang.pick(), rng.choice(ma_nvs), ngay_giao, thoi_gian, trang_thai, tong_tien, ''), dong
+
+    total_lines = 0
+    total_orders = 0
+    start = time.perf_counter()
+    while total_lines < args.order_lines:
+        batch = []
+        while len(batch) < args.batch and total_lines < args.order_lines:
+            order = don_hang()
+            batch.append(order)
+            total_lines += len(order[1])
+
+        cursor.execute("SELECT ISNULL(MAX(MaDH), 0) FROM DonHang")
+        last_id = cursor.fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO DonHang (MaKH, MaNV, NgayGiao, ThoiGianTao, TrangThaiXuLy, TongTien, GhiChu)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [order for order, _ in batch])
+        # Cột identity tăng theo thứ tự dòng được chèn trong một phiên
+        cursor.execute("SELECT MaDH FROM DonHang WHERE MaDH > ? ORDER BY MaDH", (last_id,))
+        ma_dhs = [row[0] for row in cursor.fetchall()]
+        if len(ma_dhs) != len(batch):
+            conn.rollback()
+            sys.exit("Có ứng dụng khác đang ghi DonHang, không xác định được MaDH vừa tạo")
+        cursor.executemany(
+            "INSERT INTO ChiTietDonHang (MaDH, MaSP, SoLuong, GiaBan) VALUES (?, ?, ?, ?)",
+            [(ma_dh,) + line for ma_dh, (_, lines) in zip(ma_dhs, batch) for line in lines]
+        )
+        conn.commit()
+        total_orders += len(batch)
+        print(f"\r  Đơn hàng: {total_orders} ({total_lines} dòng)", end='', flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"\r  Đơn hàng: {total_orders} ({total_lines} dòng, {total_lines / elapsed:.0f} dòng/s)")
+
+    print("  Tính lại bảng tổng hợp doanh thu...")
+    rollups.ensure_schema(conn)
+    # rebuild xoá / tính lại theo cả ngày nên khoảng phải bắt đầu và kết thúc lúc 0 giờ
+    tu = datetime.datetime.combine(now.date() - datetime.timedelta(days=args.days + 1), datetime.time())
+    rollups.rebuild(conn, tu, datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suppliers', type=int, default=20)
+    parser.add_argument('--skus', type=int, default=1000)
+    parser.add_argument('--employees', type=int, default=50)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--order-lines', type=int, default=100000, help="Tổng số dòng ChiTietDonHang")
+    parser.add_argument('--avg-lines', type=float, default=1.6, help="Số dòng trung bình mỗi đơn")
+    parser.add_argument('--max-lines', type=int, default=8, help="Số dòng tối đa mỗi đơn")
+    parser.add_argument('--days', type=int, default=365, help="Đơn hàng trải trong số ngày gần nhất")
+    parser.add_argument('--sku-skew', type=float, default=1.1, help="Số mũ Zipf độ phổ biến sản phẩm")
+    parser.add_argument('--customer-skew', type=float, default=0.6, help="Số mũ Zipf số đơn mỗi khách")
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    load_dotenv()
+    dialect = dialects.get(os.getenv('DB_BACKEND', 'mssql'))
+    conn = dialect.connect()
+    start = time.perf_counter()
+    print(f"Sinh dữ liệu ({dialect.name}, seed {args.seed}):")
+    seed(conn, args)
+
+    cursor = conn.cursor()
+    counts = {table: count_rows(cursor, table)
+              for table in ('NhaCungCap', 'Laptop', 'NhanVien', 'KhachHang', 'DonHang', 'ChiTietDonHang')}
+    conn.close()
+    print(f"Xong sau {time.perf_counter() - start:.1f}s. Số dòng hiện có:",
+          ', '.join(f"{table} {count}" for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Đọc file nhập hàng loạt (CSV / NDJSON / JSON) trực tiếp từ body request.
+
+CSV và NDJSON được đọc từng dòng từ stream nên bộ nhớ không phụ thuộc kích
+thước file; JSON (một mảng object) phải đọc cả file nên chỉ hợp với file nhỏ.
+"""
+import csv
+import io
+import json
+
+
+FORMATS = ('csv', 'ndjson', 'json')
+
+_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json': 'json',
+}
+
+
+class ImportFormatError(ValueError):
+    """File nhập không đọc được (sai định dạng, thiếu header...)"""
+
+
+def detect_format(requested, content_type):
+    """``?format=`` nếu có, nếu không thì đoán theo Content-Type"""
+    if requested:
+        fmt = requested.lower()
+        if fmt not in FORMATS:
+            raise ImportFormatError(f"format phải là một trong: {', '.join(FORMATS)}")
+        return fmt
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype not in _CONTENT_TYPES:
+        raise ImportFormatError("Không xác định được định dạng file, hãy truyền ?format=csv|ndjson|json")
+    return _CONTENT_TYPES[mimetype]
+
+
+def read_rows(stream, fmt):
+    """Sinh ra (số dòng, dict) cho từng bản ghi; dòng hỏng sinh ra (số dòng, ImportFormatError).
+
+    Số dòng tính từ 1 cho bản ghi dữ liệu đầu tiên (không tính header CSV).
+    Giá trị rỗng trong CSV được đổi thành None.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            raise ImportFormatError("File CSV thiếu dòng header")
+        for line_no, row in enumerate(reader, start=1):
+            yield line_no, {k.strip(): (v if v != '' else None) for k, v in row.items() if k}
+    elif fmt == 'ndjson':
+        line_no = 0
+        for line in text:
+            if not line.strip():
+                continue
+            line_no += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, ImportFormatError("Dòng không phải JSON hợp lệ")
+                continue
+            if not isinstance(row, dict):
+                yield line_no, ImportFormatError("Mỗi dòng phải là một object JSON")
+                continue
+            yield line_no, row
+    else:
+        try:
+            rows = json.load(text)
+        except ValueError:
+            raise ImportFormatError("File JSON không hợp lệ")
+        if not isinstance(rows, list):
+            raise ImportFormatError("File JSON phải là một mảng object")
+        for line_no, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                yield line_no, ImportFormatError("Phần tử phải là một object JSON")
+                continue
+            yield line_no, row
+
+
+def batches(rows, size):
+    """Gom iterator thành các list tối đa ``size`` phần tử"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
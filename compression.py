@@ -0,0 +1,86 @@
+"""Nén response (brotli hoặc gzip) theo ``Accept-Encoding`` của trình duyệt.
+
+Chỉ nén response đủ lớn (``min_size`` byte) có kiểu văn bản / JSON; response
+stream (xuất hoá đơn, danh sách đơn NDJSON) và file gửi thẳng được giữ nguyên.
+Brotli chỉ dùng khi đã cài module ``brotli``, không thì dùng gzip có sẵn.
+Nếu đã có reverse proxy (nginx) nén response thì tắt bằng ``COMPRESS_ENABLED=False``.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/plain',
+])
+
+
+class Compressor:
+    """Hook ``after_request`` nén body; đăng ký bằng ``init_app(app)``.
+
+    Nén bằng mức vừa phải (gzip 6, brotli 4) vì response sinh theo từng request,
+    mức cao hơn tốn CPU mà chỉ nhỏ thêm vài phần trăm.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def choose_encoding(self, accept_encodings):
+        """Encoding được trình duyệt chấp nhận với q cao nhất, ưu tiên br khi bằng nhau"""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, response):
+        # Cùng một tài nguyên có thể trả nén hoặc không tuỳ Accept-Encoding, còn 304
+        # không có body để biết bản 200 có nén hay không: ETag của response văn bản /
+        # JSON và của 304 luôn là ETag yếu để hai đường trả cùng một validator
+        # (If-None-Match so sánh yếu nên vẫn khớp)
+        if not response.direct_passthrough and (
+                response.status_code == 304 or response.mimetype in COMPRESSIBLE_MIMETYPES):
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            data = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            data = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
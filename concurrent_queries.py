@@ -0,0 +1,111 @@
+"""Chạy song song các truy vấn độc lập của một request, mỗi truy vấn trên một kết
+nối mượn từ pool, để thời gian chờ database bằng câu chậm nhất thay vì tổng các câu.
+
+Cả nhóm có chung một hạn chót: quá hạn thì các câu đang chạy bị huỷ bằng
+``cursor.cancel()`` (SQL Server nhận lệnh huỷ, kết nối bị bỏ khỏi pool), các câu
+chưa bắt đầu không chạy nữa và ``run`` ném ``QueryTimeout``. Nhờ vậy một câu tổng
+hợp chậm không giữ thread / kết nối mãi.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from db_pool import PoolTimeout
+
+
+class QueryTimeout(Exception):
+    """Nhóm truy vấn không xong trước hạn chót"""
+
+
+class _Group:
+    """Trạng thái một lần ``run``: đã huỷ chưa và các cursor đang chạy"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.cancelled = False
+        self.cursors = set()
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        # Giữ khoá trong lúc huỷ: cursor chỉ được trả về pool sau khi ra khỏi
+        # ``cursors``, nên không huỷ nhầm câu của request khác
+        with self.lock:
+            self.cancelled = True
+            for cursor in self.cursors:
+                try:
+                    cursor.cancel()
+                except Exception as e:
+                    print("Lỗi huỷ truy vấn:", e)
+
+
+class ConcurrentQueries:
+    """Thread pool dùng chung của process để chạy truy vấn song song.
+
+    ``run({"tên": hàm(cursor), ...}, timeout)`` trả về dict tên -> kết quả của hàm.
+    Nếu ``metrics`` được truyền vào, số câu lệnh / thời gian database của các
+    thread được cộng vào request đang gọi ``run``.
+    """
+
+    def __init__(self, pool, max_workers=4, metrics=None):
+        self._pool = pool
+        self._metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query')
+
+    def run(self, queries, timeout):
+        group = _Group(time.monotonic() + timeout)
+        stats = self._metrics.current() if self._metrics is not None else None
+        futures = {
+            self._executor.submit(self._call, func, group, stats): name
+            for name, func in queries.items()
+        }
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+
+        failed = next((f for f in done if not f.cancelled() and f.exception() is not None), None)
+        if pending or failed is not None:
+            # Câu lỗi hoặc quá hạn: các câu còn lại không còn ý nghĩa, huỷ luôn
+            group.cancel()
+            for future in pending:
+                future.cancel()
+            if failed is not None and not isinstance(failed.exception(), QueryTimeout):
+                raise failed.exception()
+            raise QueryTimeout(f"Truy vấn không xong sau {timeout:g} giây")
+        return {name: future.result() for future, name in futures.items()}
+
+    def _call(self, func, group, stats):
+        if stats is not None:
+            self._metrics.bind(stats)
+        try:
+            remaining = group.deadline - time.monotonic()
+            if group.cancelled or remaining <= 0:
+                raise QueryTimeout("Đã huỷ trước khi chạy")
+            try:
+                item = self._pool.acquire(timeout=remaining)
+            except PoolTimeout as e:
+                raise QueryTimeout(str(e))
+
+            started = False
+            discard = False
+            try:
+                cursor = item.connection.cursor()
+                with group.lock:
+                    if not group.cancelled:
+                        group.cursors.add(cursor)
+                        started = True
+                if not started:
+                    raise QueryTimeout("Đã huỷ trước khi chạy")
+                return func(cursor)
+            except BaseException:
+                # Câu bị huỷ / lỗi giữa chừng: kết nối có thể còn dở, bỏ đi cho chắc
+                discard = started
+                raise
+            finally:
+                if started:
+                    with group.lock:
+                        group.cursors.discard(cursor)
+                self._pool.release(item, discard=discard)
+        finally:
+            if stats is not None:
+                self._metrics.bind(None)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
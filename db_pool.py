@@ -0,0 +1,242 @@
+"""Pool kết nối database dùng chung cho các route.
+
+Mỗi lần ``pyodbc.connect`` là một lần bắt tay đăng nhập đầy đủ với SQL Server,
+nên thay vì mở/đóng kết nối theo từng request, app mượn kết nối từ pool và trả
+lại khi request kết thúc.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Không mượn được kết nối trong thời gian chờ cho phép"""
+
+
+class PooledConnection:
+    """Kết nối thật kèm thông tin thời điểm tạo / dùng gần nhất"""
+
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+def default_ping(connection):
+    """Round trip nhẹ nhất để kiểm tra kết nối còn sống"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+class ConnectionPool:
+    """Pool kết nối có giới hạn kích thước, tự loại kết nối rảnh quá lâu
+    (idle_timeout) hoặc sống quá lâu (max_lifetime).
+
+    Kết nối chỉ bị ping khi đã rảnh lâu hơn ``ping_interval`` giây, còn kết nối
+    vừa được dùng thì coi như còn sống, không tốn thêm round trip.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=30, idle_timeout=300,
+                 max_lifetime=1800, ping_interval=30, ping=default_ping):
+        self._connect = connect
+        self._ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        # LIFO: kết nối vừa trả được dùng lại trước, kết nối cũ nằm ở đầu
+        # hàng đợi và bị loại dần theo idle_timeout
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._size = 0
+
+        self._created = 0
+        self._checkouts = 0
+        self._recycled = 0
+        self._evicted = 0
+        self._discarded = 0
+        self._ping_failures = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def acquire(self, timeout=None):
+        """Mượn một kết nối, chờ tối đa ``timeout`` giây (mặc định ``self.timeout``)
+        nếu pool đã đầy"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            item = None
+            with self._cond:
+                if self._idle:
+                    item = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Không lấy được kết nối sau {timeout:g} giây "
+                            f"(pool tối đa {self.max_size} kết nối)"
+                        )
+                    self._waits += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if item is None:
+                item = self._open()
+            elif not self._validate(item):
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+            return item
+
+    def release(self, item, discard=False):
+        """Trả kết nối về pool; ``discard=True`` khi kết nối có thể đã hỏng"""
+        if not discard:
+            try:
+                # Huỷ transaction còn dở để request sau nhận kết nối sạch
+                item.connection.rollback()
+            except Exception:
+                discard = True
+
+        if discard or self._expired(item, time.monotonic()):
+            with self._cond:
+                if discard:
+                    self._discarded += 1
+                else:
+                    self._recycled += 1
+            self._close(item)
+            return
+
+        item.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(item)
+            stale = self._pop_idle_stale(item.last_used)
+            self._cond.notify()
+        for old in stale:
+            self._close(old)
+
+    def prefill(self, n):
+        """Mở sẵn kết nối cho tới khi pool có ``n`` kết nối (không vượt max_size),
+        để các request đầu tiên không phải chờ đăng nhập. Trả về số kết nối mở thêm"""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._size >= min(n, self.max_size):
+                    return opened
+                self._size += 1
+            item = self._open()
+            with self._cond:
+                self._idle.appendleft(item)
+                self._cond.notify()
+            opened += 1
+
+    def close_all(self):
+        """Đóng toàn bộ kết nối đang rảnh (dùng khi tắt ứng dụng)"""
+        with self._cond:
+            items = list(self._idle)
+            self._idle.clear()
+        for item in items:
+            self._close(item)
+
+    def drain(self, timeout=None):
+        """Chờ tối đa ``timeout`` giây cho các kết nối đang mượn được trả rồi đóng
+        toàn bộ. Trả về số kết nối vẫn đang bị giữ khi hết thời gian chờ"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._size > len(self._idle):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                # release() chỉ đánh thức một luồng chờ, nên tự kiểm tra lại định kỳ
+                self._cond.wait(0.1 if remaining is None else min(remaining, 0.1))
+            in_use = self._size - len(self._idle)
+        self.close_all()
+        return in_use
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "created": self._created,
+                "checkouts": self._checkouts,
+                "recycled": self._recycled,
+                "evicted": self._evicted,
+                "discarded": self._discarded,
+                "ping_failures": self._ping_failures,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+            }
+
+    def _open(self):
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return PooledConnection(connection)
+
+    def _close(self, item):
+        try:
+            item.connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _expired(self, item, now):
+        return self.max_lifetime and now - item.created_at > self.max_lifetime
+
+    def _pop_idle_stale(self, now):
+        # Phần tử đầu deque là kết nối rảnh lâu nhất
+        stale = []
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            stale.append(self._idle.popleft())
+            self._evicted += 1
+        return stale
+
+    def _validate(self, item):
+        now = time.monotonic()
+        if self._expired(item, now):
+            with self._cond:
+                self._recycled += 1
+            self._close(item)
+            return False
+
+        idle_for = now - item.last_used
+        if idle_for > self.idle_timeout:
+            with self._cond:
+                self._evicted += 1
+            self._close(item)
+            return False
+
+        if idle_for > self.ping_interval:
+            try:
+                self._ping(item.connection)
+            except Exception:
+                with self._cond:
+                    self._ping_failures += 1
+                self._close(item)
+                return False
+        return True
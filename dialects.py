@@ -0,0 +1,155 @@
+"""Khác biệt giữa các loại database mà ứng dụng chạy được: SQL Server (qua
+pyodbc, mặc định) và SQLite (``sqlite_backend.py``, chạy trên một máy không
+cần dịch vụ ngoài, dùng cho benchmark và chạy thử).
+
+Câu SQL thông thường trong app viết theo T-SQL; backend SQLite tự chuyển phần
+cú pháp đơn giản (``TOP``, ``OUTPUT INSERTED``, bảng tạm ``#``...). Những chỗ
+không dịch máy móc được (MERGE, batch có biến, kiểm tra catalog, DDL) hỏi
+dialect của kết nối qua ``of(cursor)`` rồi chọn câu lệnh tương ứng.
+"""
+import os
+
+
+class SqlServerDialect:
+    name = 'mssql'
+    # Tham số so sánh với cột DATETIME: ép lại về DATETIME để giá trị đã đọc ra
+    # (pyodbc trả tới micro giây) khớp đúng giá trị trong cột (bước 1/300 giây)
+    datetime_param = "CAST(? AS DATETIME)"
+
+    def connect(self):
+        import pyodbc
+
+        driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
+        server = os.getenv('DB_SERVER', 'localhost')
+        database = os.getenv('DB_DATABASE', 'DataLapTopShop')
+        uid = os.getenv('DB_UID', 'sa')
+        pwd = os.getenv('DB_PWD', '')
+
+        return pyodbc.connect(
+            f'DRIVER={{{driver}}};'
+            f'SERVER={server};'
+            f'DATABASE={database};'
+            f'UID={uid};'
+            f'PWD={pwd}'
+        )
+
+    @property
+    def IntegrityError(self):
+        import pyodbc
+        return pyodbc.IntegrityError
+
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT OBJECT_ID(?, N'U')", (f"dbo.{table}",))
+        return cursor.fetchone()[0] is not None
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute("SELECT COL_LENGTH(?, ?)", (f"dbo.{table}", column))
+        return cursor.fetchone()[0] is not None
+
+    def index_exists(self, cursor, name):
+        cursor.execute("SELECT 1 FROM sys.indexes WHERE name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def create_index_sql(self, name, table, columns, include=()):
+        sql = f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+        if include:
+            sql += f" INCLUDE ({', '.join(include)})"
+        return sql
+
+    def drop_index_sql(self, name, table):
+        return f"DROP INDEX {name} ON {table}"
+
+    def add_computed_column_sql(self, table, column, expression, type_name):
+        # SQL Server suy ra kiểu của cột tính từ biểu thức
+        return f"ALTER TABLE {table} ADD {column} AS {expression} PERSISTED"
+
+    def trigger_exists(self, cursor, name):
+        cursor.execute("SELECT OBJECT_ID(?, N'TR')", (f"dbo.{name}",))
+        return cursor.fetchone()[0] is not None
+
+    def clear_on_update_trigger_sql(self, name, table, key, source, target):
+        # UPDATE() theo cả câu lệnh: chỉ xoá khi câu UPDATE đổi source mà không tự ghi target
+        return f"""
+            CREATE TRIGGER {name} ON {table} AFTER UPDATE AS
+            BEGIN
+                SET NOCOUNT ON;
+                IF UPDATE({source}) AND NOT UPDATE({target})
+                    UPDATE t SET {target} = NULL
+                    FROM {table} t INNER JOIN inserted i ON t.{key} = i.{key}
+            END
+        """
+
+
+class SqliteDialect:
+    name = 'sqlite'
+    # Cột thời gian lưu chuỗi ISO, tham số đi qua cùng adapter nên so sánh trực tiếp
+    datetime_param = "?"
+
+    def connect(self):
+        import sqlite_backend
+        return sqlite_backend.connect(os.getenv('SQLITE_PATH', 'laptop_shop.sqlite3'))
+
+    @property
+    def IntegrityError(self):
+        import sqlite3
+        return sqlite3.IntegrityError
+
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    def column_exists(self, cursor, table, column):
+        # table_xinfo liệt kê cả cột tính (GENERATED)
+        cursor.execute(f"SELECT 1 FROM pragma_table_xinfo('{table}') WHERE name = ?", (column,))
+        return cursor.fetchone() is not None
+
+    def index_exists(self, cursor, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def create_index_sql(self, name, table, columns, include=()):
+        # SQLite không có INCLUDE; index thường vẫn dùng được cho điều kiện lọc
+        return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+    def drop_index_sql(self, name, table):
+        return f"DROP INDEX IF EXISTS {name}"
+
+    def add_computed_column_sql(self, table, column, expression, type_name):
+        # ALTER TABLE của SQLite chỉ thêm được cột tính VIRTUAL (tính khi đọc); cần
+        # khai báo kiểu để cột có affinity TEXT, LIKE 'abc%' mới dùng được index
+        return f"ALTER TABLE {table} ADD COLUMN {column} {type_name} GENERATED ALWAYS AS ({expression}) VIRTUAL"
+
+    def trigger_exists(self, cursor, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def clear_on_update_trigger_sql(self, name, table, key, source, target):
+        # Trigger theo từng dòng: target không đổi trong câu UPDATE thì coi như không tự ghi
+        return f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER UPDATE OF {source} ON {table}
+            WHEN NEW.{target} IS OLD.{target}
+            BEGIN
+                UPDATE {table} SET {target} = NULL WHERE {key} = NEW.{key};
+            END
+        """
+
+
+SQL_SERVER = SqlServerDialect()
+SQLITE = SqliteDialect()
+
+DIALECTS = {
+    SQL_SERVER.name: SQL_SERVER,
+    SQLITE.name: SQLITE,
+}
+
+
+def get(name):
+    if name not in DIALECTS:
+        raise ValueError(f"DB_BACKEND phải là một trong: {', '.join(DIALECTS)}")
+    return DIALECTS[name]
+
+
+def of(connection_or_cursor):
+    """Dialect của một kết nối / cursor; kết nối pyodbc không có thuộc tính này
+    nên mặc định là SQL Server"""
+    return getattr(connection_or_cursor, 'dialect', SQL_SERVER)
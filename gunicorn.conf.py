@@ -0,0 +1,54 @@
+"""Cấu hình gunicorn cho production, đọc từ biến môi trường / ``.env``.
+
+    gunicorn 'app:create_app()'
+
+(gunicorn tự nạp file này khi chạy trong thư mục gốc của dự án.)
+"""
+import multiprocessing
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv('WEB_BIND', f"{os.getenv('FLASK_HOST', '127.0.0.1')}:{os.getenv('FLASK_PORT', '5000')}")
+
+# Mỗi worker là một process có pool kết nối, cache và chỉ mục tìm kiếm riêng:
+# database phải chịu được workers * DB_POOL_SIZE kết nối. Cache thống kê / hoá đơn
+# được xoá ở mọi worker sau khi rebuild nhờ bộ đếm thế hệ trong file JOB_DB_PATH,
+# nên các worker phải dùng chung file đó
+workers = int(os.getenv('WEB_WORKERS', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+# Phần lớn thời gian request là chờ database nên mỗi worker chạy nhiều thread
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+
+# Khởi động lại worker sau chừng ấy request; jitter để các worker không cùng
+# khởi động lại một lúc
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+# Khi nhận SIGTERM, worker ngừng nhận kết nối mới và có chừng này giây để trả lời
+# nốt request đang xử lý và chạy worker_exit
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+
+# Không preload: mỗi worker tự import app và warmup sau khi fork, vì kết nối
+# database và thread worker việc nền không dùng chung được giữa các process
+preload_app = False
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    if int(os.getenv('DB_POOL_SIZE', '10')) < threads:
+        worker.log.warning("DB_POOL_SIZE nhỏ hơn WEB_THREADS, các thread sẽ phải chờ kết nối")
+
+
+def worker_exit(server, worker):
+    # Worker đã dừng vòng nhận request (tắt server hoặc đủ max_requests)
+    shop = sys.modules.get('app')
+    if shop is not None:
+        shop.shutdown()
@@ -0,0 +1,280 @@
+"""Đo thời gian request và câu lệnh SQL.
+
+``InstrumentedConnection`` bọc kết nối pyodbc: mọi ``execute`` / ``executemany``
+trên cursor của nó được đếm và đo thời gian, cộng vào request đang chạy trên
+thread đó và vào số liệu chung. ``Metrics`` giữ histogram thời gian theo route,
+nhật ký truy vấn chậm (gộp theo câu SQL đã chuẩn hoá) và xuất ra định dạng text
+của Prometheus. Khi tắt, app dùng kết nối pyodbc trực tiếp và không đăng ký hook
+nào, nên không tốn gì thêm.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w@#.])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Câu SQL gọn một dòng, hằng số thay bằng ``?`` và danh sách ``(?, ?, ...)``
+    gộp thành ``(...)`` để các câu chỉ khác tham số được tính là một"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PARAM_LIST.sub('(...)', sql)
+    sql = _VALUES_LIST.sub(r'\1', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class Histogram:
+    """Histogram tích luỹ kiểu Prometheus (không tự khoá, ``Metrics`` khoá hộ)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    """Số câu lệnh và tổng thời gian database của một request"""
+
+    __slots__ = ('started', 'elapsed', 'db_count', 'db_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.db_count = 0
+        self.db_time = 0.0
+
+
+class Metrics:
+    def __init__(self, slow_query_ms=200, max_slow_queries=200, buckets=DEFAULT_BUCKETS):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_slow_queries = max_slow_queries
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests = {}      # (route, method, status) -> Histogram
+        self._request_db = {}    # route -> [số câu lệnh, tổng thời gian]
+        self._statements = Histogram(buckets)
+        self._errors = 0
+        self._slow_total = 0
+        self._slow = OrderedDict()  # SQL chuẩn hoá -> thống kê, LRU
+
+    # --- request -----------------------------------------------------------
+
+    def start_request(self):
+        self._local.stats = RequestStats()
+
+    def finish_request(self, route, method, status):
+        """Ghi thời gian request vào histogram, trả về RequestStats (hoặc None)"""
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return None
+        self._local.stats = None
+        elapsed = stats.elapsed = time.perf_counter() - stats.started
+        key = (route, method, status)
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram(self.buckets)
+            histogram.observe(elapsed)
+            totals = self._request_db.setdefault(route, [0, 0.0])
+            totals[0] += stats.db_count
+            totals[1] += stats.db_time
+        return stats
+
+    def current(self):
+        return getattr(self._local, 'stats', None)
+
+    def bind(self, stats):
+        """Cho thread khác cộng số liệu database vào request ``stats``"""
+        self._local.stats = stats
+
+    # --- câu lệnh ----------------------------------------------------------
+
+    def record_statement(self, sql, elapsed, failed=False):
+        stats = getattr(self._local, 'stats', None)
+        with self._lock:
+            # Trong khoá vì nhiều thread có thể cùng cộng vào một request (bind)
+            if stats is not None:
+                stats.db_count += 1
+                stats.db_time += elapsed
+            self._statements.observe(elapsed)
+            if failed:
+                self._errors += 1
+        if elapsed >= self.slow_query_seconds:
+            self._record_slow(sql, elapsed)
+
+    def _record_slow(self, sql, elapsed):
+        normalized = normalize_sql(sql)
+        with self._lock:
+            entry = self._slow.get(normalized)
+            if entry is None:
+                entry = self._slow[normalized] = {"sql": normalized, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            self._slow.move_to_end(normalized)
+            self._slow_total += 1
+            entry["count"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+            entry["last_at"] = time.time()
+            while len(self._slow) > self.max_slow_queries:
+                self._slow.popitem(last=False)
+        print(f"Truy vấn chậm {elapsed * 1000:.1f} ms: {normalized[:500]}")
+
+    def slow_queries(self, limit=50):
+        """Các câu chậm, câu tốn tổng thời gian nhiều nhất trước"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._slow.values()]
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return entries[:limit]
+
+    # --- xuất --------------------------------------------------------------
+
+    def render_prometheus(self, gauges=None):
+        """Số liệu dạng text của Prometheus; ``gauges`` là dict tên -> giá trị thêm vào"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP http_request_duration_seconds Thời gian xử lý request theo route.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (route, method, status), histogram in sorted(self._requests.items()):
+                labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+                _histogram_lines(lines, 'http_request_duration_seconds', labels, histogram)
+
+            lines.append("# HELP db_statements_per_route_total Số câu lệnh SQL theo route.")
+            lines.append("# TYPE db_statements_per_route_total counter")
+            for route, (count, _) in sorted(self._request_db.items()):
+                lines.append(f'db_statements_per_route_total{{route="{_escape(route)}"}} {count}')
+            lines.append("# HELP db_time_per_route_seconds_total Thời gian chờ database theo route.")
+            lines.append("# TYPE db_time_per_route_seconds_total counter")
+            for route, (_, total) in sorted(self._request_db.items()):
+                lines.append(f'db_time_per_route_seconds_total{{route="{_escape(route)}"}} {total:.6f}')
+
+            lines.append("# HELP db_statement_duration_seconds Thời gian mỗi câu lệnh SQL.")
+            lines.append("# TYPE db_statement_duration_seconds histogram")
+            _histogram_lines(lines, 'db_statement_duration_seconds', '', self._statements)
+            lines.append("# HELP db_statement_errors_total Số câu lệnh SQL bị lỗi.")
+            lines.append("# TYPE db_statement_errors_total counter")
+            lines.append(f"db_statement_errors_total {self._errors}")
+            lines.append("# HELP db_slow_statements_total Số câu lệnh chậm hơn ngưỡng.")
+            lines.append("# TYPE db_slow_statements_total counter")
+            lines.append(f"db_slow_statements_total {self._slow_total}")
+
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(lines, name, labels, histogram):
+    prefix = f"{labels}," if labels else ''
+    for bound, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ''
+    lines.append(f"{name}_sum{suffix} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+
+
+class InstrumentedCursor:
+    """Cursor pyodbc có đo thời gian ``execute`` / ``executemany``; các thuộc tính
+    khác (fetch*, nextset, fast_executemany...) chuyển thẳng cho cursor thật"""
+
+    __slots__ = ('_cursor', '_metrics')
+
+    def __init__(self, cursor, metrics):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_metrics', metrics)
+
+    def execute(self, sql, *params):
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        except Exception:
+            self._metrics.record_statement(sql, time.perf_counter() - started, failed=True)
+            raise
+        self._metrics.record_statement(sql, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, params):
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, params)
+        except Exception:
+            self._metrics.record_statement(sql, time.perf_counter() - started, failed=True)
+            raise
+        self._metrics.record_statement(sql, time.perf_counter() - started)
+
+    # Các hàm đọc kết quả gọi rất thường xuyên: chuyển thẳng, tránh đường
+    # __getattr__ (chậm vì phải thất bại ở lượt tìm thuộc tính thường trước)
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, *size):
+        return self._cursor.fetchmany(*size)
+
+    def nextset(self):
+        return self._cursor.nextset()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    """Kết nối pyodbc trả về InstrumentedCursor"""
+
+    __slots__ = ('_connection', '_metrics')
+
+    def __init__(self, connection, metrics):
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, '_metrics', metrics)
+
+    def cursor(self):
+        return InstrumentedCursor(self._connection.cursor(), self._metrics)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
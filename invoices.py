@@ -0,0 +1,272 @@
+"""Dữ liệu hoá đơn cho ``xemHoaDon.html``, cache HTML của hoá đơn đã hoàn tất và
+xuất nhiều hoá đơn thành một file.
+
+Thông tin đơn hàng, khách hàng, nhân viên lấy bằng một câu JOIN, chi tiết sản
+phẩm gửi chung batch nên mỗi hoá đơn chỉ tốn một round trip. Đơn ở trạng thái
+cuối (hoàn tất) không còn thay đổi, nên HTML đã render được giữ lại theo MaDH
+kèm ETag để in lại không cần chạm database.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from rollups import TRANG_THAI_HOAN_TAT
+
+
+TRANG_THAI_CUOI = frozenset([TRANG_THAI_HOAN_TAT])
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+_HEADER_SELECT = """
+    SELECT DH.MaDH, DH.NgayGiao, DH.ThoiGianTao, DH.TrangThaiXuLy, DH.TongTien, DH.GhiChu,
+           KH.MaKH, KH.HoTen, KH.SDT, KH.DiaChi,
+           NV.MaNV, NV.HoTen, NV.SDT
+    FROM DonHang DH
+    LEFT JOIN KhachHang KH ON KH.MaKH = DH.MaKH
+    LEFT JOIN NhanVien NV ON NV.MaNV = DH.MaNV
+"""
+
+_LINES_SELECT = """
+    SELECT CT.MaDH, L.TenSP, CT.SoLuong, CT.GiaBan, (CT.SoLuong * CT.GiaBan) as ThanhTien
+    FROM ChiTietDonHang CT
+    JOIN Laptop L ON CT.MaSP = L.MaSP
+"""
+
+INVOICE_QUERY = f"""
+    SET NOCOUNT ON;
+    {_HEADER_SELECT}
+    WHERE DH.MaDH = ?;
+    {_LINES_SELECT}
+    WHERE CT.MaDH = ?;
+"""
+
+
+def format_tien(so):
+    return "{:,.0f} ₫".format(float(so)).replace(',', '.')
+
+
+def build_invoice(header, lines):
+    """Dữ liệu cho template từ dòng header (theo thứ tự cột của INVOICE_QUERY) và
+    các dòng chi tiết (MaDH, TenSP, SoLuong, GiaBan, ThanhTien)"""
+    danh_sach_sp = []
+    tong_sl = 0
+    for item in lines:
+        tong_sl += int(item[2])
+        danh_sach_sp.append({
+            'ten': item[1],
+            'soluong': int(item[2]),
+            'gia': format_tien(item[3]),
+            'thanhtien': format_tien(item[4])
+        })
+
+    return {
+        'ma_dh': header[0],
+        'ngay_giao': header[1].strftime('%d/%m/%Y') if header[1] else '',
+        'ngay_tao': header[2].strftime('%d/%m/%Y %H:%M') if header[2] else '',
+        'thoi_gian_tao': header[2],
+        'trang_thai': header[3] or '',
+        'ghi_chu': header[5] or '',
+        'kh_ma': header[6] if header[6] is not None else '',
+        'kh_ten': header[7] or '',
+        'kh_sdt': header[8] or '',
+        'kh_diachi': header[9] if header[6] is not None else 'Chưa cập nhật',
+        'nv_ma': header[10] if header[10] is not None else '',
+        'nv_ten': header[11] or '',
+        'nv_sdt': header[12] or '',
+        'san_pham': danh_sach_sp,
+        'tong_soluong': tong_sl,
+        'tong_tien': format_tien(header[4])
+    }
+
+
+def fetch_invoice(cursor, ma_dh):
+    """Dữ liệu một hoá đơn trong một round trip, hoặc None nếu không có đơn"""
+    cursor.execute(INVOICE_QUERY, (ma_dh, ma_dh))
+    header = cursor.fetchone()
+    if header is None:
+        return None
+    cursor.nextset()
+    return build_invoice(header, cursor.fetchall())
+
+
+def fetch_invoices(cursor, ma_dhs, max_params=2000):
+    """Dữ liệu nhiều hoá đơn theo thứ tự ``ma_dhs`` (bỏ qua mã không tồn tại).
+
+    Mỗi nhóm ``max_params / 2`` đơn tốn một round trip: header và chi tiết gửi
+    chung một batch với cùng danh sách IN.
+    """
+    per_batch = max_params // 2
+    found = {}
+    for i in range(0, len(ma_dhs), per_batch):
+        chunk = list(ma_dhs[i:i + per_batch])
+        placeholders = ', '.join(['?'] * len(chunk))
+        cursor.execute(f"""
+            SET NOCOUNT ON;
+            {_HEADER_SELECT}
+            WHERE DH.MaDH IN ({placeholders});
+            {_LINES_SELECT}
+            WHERE CT.MaDH IN ({placeholders});
+        """, chunk + chunk)
+        headers = cursor.fetchall()
+        cursor.nextset()
+        lines = {}
+        for line in cursor.fetchall():
+            lines.setdefault(line[0], []).append(line)
+        for header in headers:
+            found[header[0]] = build_invoice(header, lines.get(header[0], []))
+    return [found[ma_dh] for ma_dh in ma_dhs if ma_dh in found]
+
+
+def order_ids_in_range(cursor, from_datetime, to_datetime):
+    """MaDH của các đơn có ThoiGianTao trong [from, to), tăng dần"""
+    cursor.execute("""
+        SELECT MaDH FROM DonHang
+        WHERE ThoiGianTao >= ? AND ThoiGianTao < ?
+        ORDER BY MaDH
+    """, (from_datetime, to_datetime))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def is_final(invoice):
+    return invoice['trang_thai'] in TRANG_THAI_CUOI
+
+
+def make_etag(html):
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()
+
+
+class InvoiceCache:
+    """Cache HTML hoá đơn đã hoàn tất theo MaDH (LRU, không hết hạn).
+
+    Chỉ nhận hoá đơn ở trạng thái cuối; khi đơn bị sửa ngoài luồng bình thường
+    phải gọi ``invalidate`` / ``invalidate_range`` / ``clear``.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ma_dh):
+        """Trả về (html, etag) hoặc None"""
+        with self._lock:
+            entry = self._entries.get(ma_dh)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(ma_dh)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, ma_dh, thoi_gian_tao, html, etag):
+        with self._lock:
+            self._entries[ma_dh] = (thoi_gian_tao, html, etag)
+            self._entries.move_to_end(ma_dh)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, ma_dh):
+        with self._lock:
+            self._entries.pop(ma_dh, None)
+
+    def invalidate_range(self, from_datetime, to_datetime):
+        """Xoá hoá đơn có ThoiGianTao trong [from, to)"""
+        with self._lock:
+            for ma_dh in [ma_dh for ma_dh, entry in self._entries.items()
+                          if entry[0] is None or from_datetime <= entry[0] < to_datetime]:
+                del self._entries[ma_dh]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0
+            }
+
+
+# --- Xuất nhiều hoá đơn thành một file HTML -------------------------------
+
+BUNDLE_TAIL = "</div>\n</body>\n</html>\n"
+
+_env = None
+
+
+def _template_env():
+    """Môi trường Jinja riêng của process render (không cần app Flask)"""
+    global _env
+    if _env is None:
+        _env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(['html']))
+    return _env
+
+
+def bundle_head(title):
+    style = _template_env().get_template('_hoaDonStyle.html').render()
+    return (
+        '<!DOCTYPE html>\n<html lang="vi">\n<head>\n<meta charset="UTF-8">\n'
+        f'<title>{title}</title>\n{style}\n'
+        '<style>\n  .invoice { margin-bottom: 30px; page-break-after: always; }\n</style>\n'
+        '</head>\n<body>\n<div class="container">\n'
+    )
+
+
+def render_many(invoices):
+    """Render phần thân hoá đơn cho từng dữ liệu hoá đơn (chạy trong process pool)"""
+    template = _template_env().get_template('_hoaDon.html')
+    return ''.join(template.render(**invoice) for invoice in invoices)
+
+
+class ExportProgress:
+    """Tiến độ các lần xuất hoá đơn gần nhất trong process này, theo export_id"""
+
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self._exports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, export_id, total):
+        with self._lock:
+            self._exports[export_id] = {
+                "export_id": export_id,
+                "status": "running",
+                "total": total,
+                "rendered": 0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "error": None
+            }
+            self._exports.move_to_end(export_id)
+            while len(self._exports) > self.max_size:
+                self._exports.popitem(last=False)
+
+    def advance(self, export_id, count):
+        with self._lock:
+            entry = self._exports.get(export_id)
+            if entry is not None:
+                entry["rendered"] += count
+
+    def finish(self, export_id, error=None):
+        with self._lock:
+            entry = self._exports.get(export_id)
+            if entry is not None:
+                entry["status"] = "failed" if error else "done"
+                entry["error"] = error
+                entry["finished_at"] = time.time()
+
+    def get(self, export_id):
+        with self._lock:
+            entry = self._exports.get(export_id)
+            return dict(entry) if entry is not None else None
@@ -0,0 +1,432 @@
+"""Hàng đợi việc nền (báo cáo dài, nhập dữ liệu hàng loạt) chạy ngoài thread request.
+
+Việc được lưu trong một file SQLite nên trạng thái / kết quả còn đọc được sau
+khi request gửi việc đã kết thúc, và mọi process của ứng dụng đều thấy. Mỗi
+process có một nhóm thread worker cố định; mỗi loại việc có giới hạn số việc
+chạy đồng thời để báo cáo nặng không chiếm hết kết nối database của các route
+tương tác.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+
+TRANG_THAI_CHO = 'queued'
+TRANG_THAI_CHAY = 'running'
+TRANG_THAI_XONG = 'done'
+TRANG_THAI_LOI = 'failed'
+TRANG_THAI_HUY = 'cancelled'
+TRANG_THAI_KET_THUC = frozenset([TRANG_THAI_XONG, TRANG_THAI_LOI, TRANG_THAI_HUY])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    private TEXT,
+    result TEXT,
+    error TEXT,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return False  # process này vừa khởi động nên chưa chạy việc nào
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobCancelled(Exception):
+    """Việc bị huỷ giữa chừng (handler ném ra khi thấy ``context.cancelled()``)"""
+
+
+class UnknownJobType(ValueError):
+    """Loại việc chưa được đăng ký"""
+
+
+class JobContext:
+    """Truyền cho handler: báo tiến độ, kiểm tra yêu cầu huỷ và ``private`` (dữ
+    liệu riêng của việc, không trả ra API)"""
+
+    def __init__(self, queue, job_id, private=None):
+        self._queue = queue
+        self.job_id = job_id
+        self.private = private or {}
+        self._last_check = 0
+        self._cancelled = False
+
+    def progress(self, done, total=None):
+        self._queue._update(self.job_id, progress_done=done, progress_total=total)
+
+    def cancelled(self):
+        """True nếu đã có yêu cầu huỷ (đọc SQLite tối đa mỗi giây một lần)"""
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_check >= 1:
+            self._last_check = now
+            self._cancelled = self._queue._cancel_requested(self.job_id)
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+
+class SharedGeneration:
+    """Bộ đếm thế hệ dùng chung giữa các process qua file SQLite của hàng đợi.
+
+    Process làm dữ liệu cũ đi (tính lại thống kê) gọi ``bump()``; các process khác
+    gọi ``check()`` trước khi đọc cache của mình, thấy thế hệ đổi thì chạy
+    ``on_change()`` (xoá cache). Đọc SQLite tối đa mỗi ``check_interval`` giây.
+    """
+
+    def __init__(self, queue, name, on_change, check_interval=1.0):
+        self._queue = queue
+        self.name = name
+        self._on_change = on_change
+        self.check_interval = check_interval
+        self._seen = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Tăng thế hệ; process gọi tự xoá cache của mình nên không chạy on_change"""
+        with self._queue._connect() as db:
+            db.execute(
+                "INSERT INTO generations (name, generation) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET generation = generation + 1",
+                (self.name,)
+            )
+            generation = db.execute("SELECT generation FROM generations WHERE name = ?", (self.name,)).fetchone()[0]
+        with self._lock:
+            self._seen = generation
+            self._checked_at = time.monotonic()
+
+    def check(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            with self._queue._connect() as db:
+                row = db.execute("SELECT generation FROM generations WHERE name = ?", (self.name,)).fetchone()
+            generation = row[0] if row else 0
+            if self._seen is not None and generation != self._seen:
+                self._on_change()
+            self._seen = generation
+
+
+class JobQueue:
+    """Hàng đợi việc lưu trong SQLite, chạy bằng ``workers`` thread.
+
+    ``register(loại, handler, max_concurrency)``: ``handler(params, context)``
+    trả về kết quả (JSON được) hoặc ném lỗi. ``schedule(loại, interval)``: tạo
+    việc loại đó định kỳ trong lúc worker chạy.
+    """
+
+    def __init__(self, path, workers=2, poll_interval=1.0):
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._running = {}  # loại việc -> số việc đang chạy trong process này
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._schedules = []
+        self._local = threading.local()
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # File tạo trước khi có cột private
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if 'private' not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN private TEXT")
+
+    def register(self, job_type, handler, max_concurrency=1):
+        self._handlers[job_type] = (handler, max_concurrency)
+        self._running.setdefault(job_type, 0)
+
+    def schedule(self, job_type, interval, params=None):
+        """Tạo việc ``job_type`` mỗi ``interval`` giây (gọi trước ``start``). Các process
+        dùng chung file SQLite nên mỗi kỳ chỉ có một việc dù process nào cũng lên lịch"""
+        self._schedules.append((job_type, interval, params or {}))
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Khởi động worker (gọi một lần mỗi process, gọi lại không có tác dụng)"""
+        with self._cond:
+            if self._threads:
+                return
+            self._fail_orphaned()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            if self._schedules:
+                thread = threading.Thread(target=self._schedule_loop, name="job-scheduler", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _fail_orphaned(self):
+        """Việc "running" của process trên máy này đã chết (bị ngắt giữa chừng) chuyển sang lỗi"""
+        host = socket.gethostname()
+        with self._connect() as db:
+            rows = db.execute("SELECT id, worker FROM jobs WHERE status = ?", (TRANG_THAI_CHAY,)).fetchall()
+            for job_id, worker in rows:
+                worker_host, _, pid = (worker or '').rpartition(':')
+                if worker_host == host and not _process_alive(int(pid)):
+                    db.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                        (TRANG_THAI_LOI, "Ứng dụng khởi động lại khi việc đang chạy", time.time(), job_id)
+                    )
+
+    def stop(self, timeout=None):
+        """Ngừng nhận việc mới và chờ việc đang chạy xong, tổng cộng tối đa ``timeout``
+        giây. Việc chưa xong khi process thoát sẽ bị đánh dấu lỗi ở lần khởi động sau"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def submit(self, job_type, params=None, private=None):
+        """``params`` trả lại trong trạng thái việc; ``private`` (ví dụ đường dẫn file
+        trên server) chỉ handler đọc được qua ``context.private``"""
+        if job_type not in self._handlers:
+            raise UnknownJobType(f"Không có loại việc {job_type}")
+        with self._connect() as db:
+            job_id = self._insert(db, job_type, params, private)
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def _insert(self, db, job_type, params, private=None):
+        job_id = uuid.uuid4().hex
+        db.execute(
+            "INSERT INTO jobs (id, type, status, params, private, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, job_type, TRANG_THAI_CHO, json.dumps(params or {}, ensure_ascii=False),
+             json.dumps(private, ensure_ascii=False) if private else None, time.time())
+        )
+        return job_id
+
+    def get(self, job_id, with_result=False):
+        columns = "id, type, status, params, error, progress_done, progress_total, created_at, started_at, finished_at"
+        if with_result:
+            columns += ", result"
+        with self._connect() as db:
+            row = db.execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        columns = "id, type, status, params, error, progress_done, progress_total, created_at, started_at, finished_at"
+        with self._connect() as db:
+            if status:
+                rows = db.execute(
+                    f"SELECT {columns} FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = db.execute(f"SELECT {columns} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Huỷ việc: việc đang chờ bị huỷ ngay, việc đang chạy dừng ở lần kiểm tra kế tiếp.
+
+        Trả về trạng thái sau khi huỷ, hoặc None nếu không có việc này.
+        """
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (TRANG_THAI_HUY, time.time(), job_id, TRANG_THAI_CHO)
+            )
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, TRANG_THAI_CHAY))
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        with self._cond:
+            running = dict(self._running)
+        return {
+            "workers": self.workers,
+            "running_here": running,
+            "limits": {job_type: limit for job_type, (_, limit) in self._handlers.items()},
+            "by_status": counts
+        }
+
+    def _connect(self):
+        # Mỗi thread một kết nối SQLite; ``with`` commit / rollback từng thao tác
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _to_dict(self, row):
+        job = {
+            "id": row[0],
+            "type": row[1],
+            "status": row[2],
+            "params": json.loads(row[3]),
+            "error": row[4],
+            "progress": {"done": row[5], "total": row[6]},
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
+        if len(row) > 10:
+            job["result"] = json.loads(row[10]) if row[10] is not None else None
+        return job
+
+    def _update(self, job_id, **fields):
+        fields = {k: v for k, v in fields.items() if v is not None}
+        if not fields:
+            return
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def _finish(self, job_id, status, **fields):
+        """Ghi trạng thái cuối, chỉ khi việc vẫn đang "running": không đè lên việc đã
+        bị huỷ hay đã bị ``_fail_orphaned`` đánh dấu lỗi trong lúc handler chạy"""
+        fields = {k: v for k, v in fields.items() if v is not None}
+        fields['status'] = status
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self._connect() as db:
+            db.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND status = ?",
+                list(fields.values()) + [job_id, TRANG_THAI_CHAY]
+            )
+
+    def _cancel_requested(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self):
+        """Nhận việc chờ lâu nhất thuộc loại chưa đạt giới hạn đồng thời"""
+        with self._cond:
+            available = [job_type for job_type, (_, limit) in self._handlers.items()
+                         if self._running[job_type] < limit]
+        if not available:
+            return None
+
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            # Giới hạn đồng thời tính cả việc của các process khác dùng chung file SQLite
+            running = dict(db.execute(
+                "SELECT type, COUNT(*) FROM jobs WHERE status = ? GROUP BY type", (TRANG_THAI_CHAY,)
+            ).fetchall())
+            available = [job_type for job_type in available
+                         if running.get(job_type, 0) < self._handlers[job_type][1]]
+            if not available:
+                return None
+            row = db.execute(
+                f"SELECT id, type, params, private FROM jobs WHERE status = ? AND type IN ({', '.join('?' * len(available))}) "
+                f"ORDER BY created_at LIMIT 1",
+                [TRANG_THAI_CHO] + available
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, worker = ? WHERE id = ?",
+                (TRANG_THAI_CHAY, time.time(), f"{socket.gethostname()}:{os.getpid()}", row[0])
+            )
+        with self._cond:
+            self._running[row[1]] += 1
+        return row[0], row[1], json.loads(row[2]), json.loads(row[3]) if row[3] else None
+
+    def _schedule_loop(self):
+        due = {job_type: 0 for job_type, _, _ in self._schedules}
+        while True:
+            now = time.monotonic()
+            for job_type, interval, params in self._schedules:
+                if now < due[job_type]:
+                    continue
+                due[job_type] = now + interval
+                try:
+                    self._submit_if_due(job_type, interval, params)
+                except Exception as e:
+                    print(f"Lỗi lên lịch việc nền {job_type}:", e)
+            if self._stopped.wait(max(min(due.values()) - time.monotonic(), 0)):
+                return
+
+    def _submit_if_due(self, job_type, interval, params):
+        """Tạo việc định kỳ nếu chưa có việc cùng loại đang chờ / chạy hay vừa tạo
+        trong ``interval`` giây (kể cả do process khác tạo)"""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            pending, last_created = db.execute(
+                "SELECT COUNT(CASE WHEN status IN (?, ?) THEN 1 END), MAX(created_at) FROM jobs WHERE type = ?",
+                (TRANG_THAI_CHO, TRANG_THAI_CHAY, job_type)
+            ).fetchone()
+            if pending or (last_created is not None and time.time() - last_created < interval):
+                return None
+            # Việc định kỳ chỉ giữ lại lần lỗi / huỷ, không để các lần xong làm đầy bảng
+            db.execute("DELETE FROM jobs WHERE type = ? AND status = ?", (job_type, TRANG_THAI_XONG))
+            job_id = self._insert(db, job_type, params)
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def _work(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            claimed = self._claim()
+            if claimed is None:
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(self.poll_interval)
+                continue
+
+            job_id, job_type, params, private = claimed
+            handler = self._handlers[job_type][0]
+            try:
+                result = handler(params, JobContext(self, job_id, private))
+                self._finish(job_id, TRANG_THAI_XONG, finished_at=time.time(),
+                             result=json.dumps(result, ensure_ascii=False, default=str))
+            except JobCancelled:
+                self._finish(job_id, TRANG_THAI_HUY, finished_at=time.time())
+            except Exception as e:
+                print(f"Lỗi việc nền {job_type} {job_id}:", e)
+                traceback.print_exc()
+                self._finish(job_id, TRANG_THAI_LOI, error=str(e), finished_at=time.time())
+            finally:
+                with self._cond:
+                    self._running[job_type] -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,79 @@
+"""Giữ hàng trong kho một cách nguyên tử khi tạo đơn.
+
+Thay vì đọc ``Kho`` rồi trừ sau (hai đơn đồng thời cùng thấy đủ hàng và đẩy kho
+xuống âm), mỗi sản phẩm được trừ bằng ``UPDATE ... WHERE Kho >= ?`` và kiểm tra
+số dòng bị ảnh hưởng. Các câu UPDATE luôn chạy theo thứ tự ``MaSP`` tăng dần nên
+hai transaction không thể khoá chéo nhau theo thứ tự ngược lại.
+"""
+import random
+import time
+
+import dialects
+
+
+# SQLSTATE của SQL Server khi transaction bị chọn làm nạn nhân deadlock (lỗi 1205)
+DEADLOCK_SQLSTATE = '40001'
+
+
+class InsufficientStock(Exception):
+    """Sản phẩm không còn đủ hàng tại thời điểm trừ kho"""
+
+    def __init__(self, ma_sp):
+        super().__init__(f"Sản phẩm với mã {ma_sp} không đủ trong kho")
+        self.ma_sp = ma_sp
+
+
+def reserve_stock(cursor, quantities, max_params=2000):
+    """Trừ kho cho ``{MaSP: SoLuong}`` trong transaction hiện tại.
+
+    Các câu UPDATE được gửi theo batch (một round trip cho tối đa
+    ``max_params / 4`` sản phẩm). Batch dừng ở sản phẩm đầu tiên không đủ hàng
+    và hàm ném ``InsufficientStock``; khi đó người gọi phải rollback.
+    """
+    ma_sps = sorted(quantities)
+    if dialects.of(cursor).name == 'sqlite':
+        # SQLite chạy trong process, không tốn round trip: trừ từng sản phẩm
+        for ma_sp in ma_sps:
+            cursor.execute("UPDATE Laptop SET Kho = Kho - ? WHERE MaSP = ? AND Kho >= ?",
+                           (quantities[ma_sp], ma_sp, quantities[ma_sp]))
+            if cursor.rowcount == 0:
+                raise InsufficientStock(ma_sp)
+        return
+
+    per_batch = max_params // 4
+    for i in range(0, len(ma_sps), per_batch):
+        statements = ["SET NOCOUNT ON;", "DECLARE @thieu INT = NULL;"]
+        params = []
+        for ma_sp in ma_sps[i:i + per_batch]:
+            statements.append(
+                "IF @thieu IS NULL BEGIN "
+                "UPDATE Laptop SET Kho = Kho - ? WHERE MaSP = ? AND Kho >= ?; "
+                "IF @@ROWCOUNT = 0 SET @thieu = ?; "
+                "END"
+            )
+            params.extend((quantities[ma_sp], ma_sp, quantities[ma_sp], ma_sp))
+        statements.append("SELECT @thieu;")
+
+        cursor.execute("\n".join(statements), params)
+        thieu = cursor.fetchone()[0]
+        if thieu is not None:
+            raise InsufficientStock(thieu)
+
+
+def is_deadlock(error):
+    args = getattr(error, 'args', ())
+    return bool(args) and (args[0] == DEADLOCK_SQLSTATE or '(1205)' in str(error))
+
+
+def run_with_deadlock_retry(conn, work, attempts=3, backoff=0.05):
+    """Chạy ``work()`` (một transaction trọn vẹn, tự commit) và chạy lại khi
+    transaction bị SQL Server huỷ vì deadlock."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return work()
+        except Exception as e:
+            if not is_deadlock(e) or attempt == attempts:
+                raise
+            conn.rollback()
+            print(f"Deadlock khi tạo đơn, thử lại lần {attempt}")
+            time.sleep(backoff * attempt * (1 + random.random()))
@@ -0,0 +1,400 @@
+"""Bảng tổng hợp doanh thu theo ngày cho trang thống kê.
+
+Thay vì quét ``DonHang`` / ``ChiTietDonHang`` mỗi lần mở dashboard, doanh thu
+được cộng dồn theo (ngày, nhân viên) và (ngày, sản phẩm) ngay trong transaction
+tạo đơn. Dashboard chỉ cần cộng vài dòng mỗi ngày trong khoảng cần xem.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+import dialects
+
+
+TRANG_THAI_HOAN_TAT = 'Hoàn tất'
+
+TABLES = {
+    'DoanhThuNgayNhanVien': """
+        CREATE TABLE DoanhThuNgayNhanVien (
+            Ngay DATE NOT NULL,
+            MaNV INT NOT NULL,
+            SoDonHang INT NOT NULL,
+            TongDoanhThu DECIMAL(18, 2) NOT NULL,
+            SoDonHoanTat INT NOT NULL,
+            DoanhThuHoanTat DECIMAL(18, 2) NOT NULL,
+            CONSTRAINT PK_DoanhThuNgayNhanVien PRIMARY KEY (Ngay, MaNV)
+        )
+    """,
+    'DoanhThuNgaySanPham': """
+        CREATE TABLE DoanhThuNgaySanPham (
+            Ngay DATE NOT NULL,
+            MaSP INT NOT NULL,
+            SoLuongBan INT NOT NULL,
+            DoanhThu DECIMAL(18, 2) NOT NULL,
+            CONSTRAINT PK_DoanhThuNgaySanPham PRIMARY KEY (Ngay, MaSP)
+        )
+    """,
+}
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(conn):
+    """Tạo bảng tổng hợp nếu chưa có (mỗi process chỉ kiểm tra một lần).
+
+    Lần đầu tạo bảng sẽ tổng hợp lại toàn bộ lịch sử đơn hàng.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        dialect = dialects.of(conn)
+        cursor = conn.cursor()
+        moi_tao = False
+        for table, statement in TABLES.items():
+            if not dialect.table_exists(cursor, table):
+                cursor.execute(statement)
+                moi_tao = True
+        # Lọc theo khoảng ThoiGianTao và phân trang danh sách đơn theo
+        # (ThoiGianTao, MaDH) giảm dần trên cùng một index
+        if not dialect.index_exists(cursor, 'IX_DonHang_ThoiGianTao_MaDH'):
+            cursor.execute(dialect.create_index_sql(
+                'IX_DonHang_ThoiGianTao_MaDH', 'DonHang', ['ThoiGianTao DESC', 'MaDH DESC'],
+                include=['MaKH', 'MaNV', 'TrangThaiXuLy', 'TongTien']))
+        # Index cũ chỉ có ThoiGianTao, đã được index trên thay thế
+        if dialect.index_exists(cursor, 'IX_DonHang_ThoiGianTao'):
+            cursor.execute(dialect.drop_index_sql('IX_DonHang_ThoiGianTao', 'DonHang'))
+        conn.commit()
+        if moi_tao:
+            rebuild(conn)
+        _schema_ready = True
+
+
+# SQLite không có MERGE: cộng dồn bằng INSERT ... ON CONFLICT (khoá ghi của
+# SQLite đã tuần tự hoá các transaction ghi nên không cần HOLDLOCK)
+_UPSERT_NHAN_VIEN_SQLITE = """
+    INSERT INTO DoanhThuNgayNhanVien (Ngay, MaNV, SoDonHang, TongDoanhThu, SoDonHoanTat, DoanhThuHoanTat)
+    VALUES (?, ?, 1, ?, ?, ?)
+    ON CONFLICT (Ngay, MaNV) DO UPDATE SET
+        SoDonHang = SoDonHang + 1,
+        TongDoanhThu = TongDoanhThu + excluded.TongDoanhThu,
+        SoDonHoanTat = SoDonHoanTat + excluded.SoDonHoanTat,
+        DoanhThuHoanTat = DoanhThuHoanTat + excluded.DoanhThuHoanTat
+"""
+
+_UPSERT_SAN_PHAM_SQLITE = """
+    INSERT INTO DoanhThuNgaySanPham (Ngay, MaSP, SoLuongBan, DoanhThu)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (Ngay, MaSP) DO UPDATE SET
+        SoLuongBan = SoLuongBan + excluded.SoLuongBan,
+        DoanhThu = DoanhThu + excluded.DoanhThu
+"""
+
+
+def record_order(cursor, thoi_gian_tao, ma_nv, tong_tien, trang_thai, lines, max_params=2000):
+    """Cộng một đơn hàng mới vào bảng tổng hợp, chạy trong transaction tạo đơn.
+
+    ``lines`` là danh sách (MaSP, SoLuong, GiaBan). MERGE dùng HOLDLOCK để hai
+    đơn cùng ngày / cùng nhân viên không cùng INSERT một khoá.
+    """
+    ngay = thoi_gian_tao.date()
+    hoan_tat = trang_thai == TRANG_THAI_HOAN_TAT
+
+    san_pham = {}
+    for ma_sp, so_luong, gia_ban in lines:
+        sl, dt = san_pham.get(ma_sp, (0, 0))
+        san_pham[ma_sp] = (sl + so_luong, dt + so_luong * gia_ban)
+
+    da_hoan_tat = tong_tien if hoan_tat else 0
+    if dialects.of(cursor).name == 'sqlite':
+        cursor.execute(_UPSERT_NHAN_VIEN_SQLITE, (ngay, ma_nv, tong_tien, int(hoan_tat), da_hoan_tat))
+        cursor.executemany(_UPSERT_SAN_PHAM_SQLITE, [
+            (ngay, ma_sp, so_luong, doanh_thu) for ma_sp, (so_luong, doanh_thu) in sorted(san_pham.items())
+        ])
+        return
+
+    statements = ["""
+        MERGE DoanhThuNgayNhanVien WITH (HOLDLOCK) AS t
+        USING (SELECT ? AS Ngay, ? AS MaNV) AS s
+            ON t.Ngay = s.Ngay AND t.MaNV = s.MaNV
+        WHEN MATCHED THEN UPDATE SET
+            SoDonHang = t.SoDonHang + 1,
+            TongDoanhThu = t.TongDoanhThu + ?,
+            SoDonHoanTat = t.SoDonHoanTat + ?,
+            DoanhThuHoanTat = t.DoanhThuHoanTat + ?
+        WHEN NOT MATCHED THEN
+            INSERT (Ngay, MaNV, SoDonHang, TongDoanhThu, SoDonHoanTat, DoanhThuHoanTat)
+            VALUES (s.Ngay, s.MaNV, 1, ?, ?, ?);
+    """]
+    params = [ngay, ma_nv, tong_tien, int(hoan_tat), da_hoan_tat, tong_tien, int(hoan_tat), da_hoan_tat]
+
+    items = sorted(san_pham.items())
+    per_batch = (max_params - len(params)) // 3
+    for i in range(0, len(items), per_batch):
+        chunk = items[i:i + per_batch]
+        statements.append(f"""
+            MERGE DoanhThuNgaySanPham WITH (HOLDLOCK) AS t
+            USING (VALUES {', '.join(['(?, ?, ?)'] * len(chunk))}) AS s (MaSP, SoLuong, DoanhThu)
+                ON t.Ngay = ? AND t.MaSP = s.MaSP
+            WHEN MATCHED THEN UPDATE SET
+                SoLuongBan = t.SoLuongBan + s.SoLuong,
+                DoanhThu = t.DoanhThu + s.DoanhThu
+            WHEN NOT MATCHED THEN
+                INSERT (Ngay, MaSP, SoLuongBan, DoanhThu)
+                VALUES (?, s.MaSP, s.SoLuong, s.DoanhThu);
+        """)
+        for ma_sp, (so_luong, doanh_thu) in chunk:
+            params.extend((ma_sp, so_luong, doanh_thu))
+        params.extend((ngay, ngay))
+
+        cursor.execute("\n".join(statements), params)
+        statements = []
+        params = []
+
+    if statements:
+        cursor.execute("\n".join(statements), params)
+
+
+def rebuild(conn, from_datetime=None, to_datetime=None):
+    """Tính lại bảng tổng hợp từ dữ liệu gốc cho khoảng [from, to), mặc định toàn bộ.
+
+    Dùng khi trạng thái đơn hàng bị sửa trực tiếp trong database.
+    """
+    where = []
+    params = []
+    ngay_where = []
+    ngay_params = []
+    if from_datetime is not None:
+        where.append("dh.ThoiGianTao >= ?")
+        params.append(from_datetime)
+        ngay_where.append("Ngay >= ?")
+        ngay_params.append(from_datetime.date())
+    if to_datetime is not None:
+        where.append("dh.ThoiGianTao < ?")
+        params.append(to_datetime)
+        ngay_where.append("Ngay < ?")
+        ngay_params.append(to_datetime.date())
+    where_sql = "WHERE " + " AND ".join(where) if where else ""
+    ngay_sql = "WHERE " + " AND ".join(ngay_where) if ngay_where else ""
+
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM DoanhThuNgayNhanVien {ngay_sql}", ngay_params)
+    cursor.execute(f"DELETE FROM DoanhThuNgaySanPham {ngay_sql}", ngay_params)
+    cursor.execute(f"""
+        INSERT INTO DoanhThuNgayNhanVien (Ngay, MaNV, SoDonHang, TongDoanhThu, SoDonHoanTat, DoanhThuHoanTat)
+        SELECT
+            CAST(dh.ThoiGianTao AS DATE),
+            dh.MaNV,
+            COUNT(*),
+            ISNULL(SUM(dh.TongTien), 0),
+            SUM(CASE WHEN dh.TrangThaiXuLy = ? THEN 1 ELSE 0 END),
+            ISNULL(SUM(CASE WHEN dh.TrangThaiXuLy = ? THEN dh.TongTien ELSE 0 END), 0)
+        FROM DonHang dh
+        {where_sql}
+        GROUP BY CAST(dh.ThoiGianTao AS DATE), dh.MaNV
+    """, [TRANG_THAI_HOAN_TAT, TRANG_THAI_HOAN_TAT] + params)
+    cursor.execute(f"""
+        INSERT INTO DoanhThuNgaySanPham (Ngay, MaSP, SoLuongBan, DoanhThu)
+        SELECT
+            CAST(dh.ThoiGianTao AS DATE),
+            ct.MaSP,
+            SUM(ct.SoLuong),
+            ISNULL(SUM(ct.SoLuong * ct.GiaBan), 0)
+        FROM ChiTietDonHang ct
+        INNER JOIN DonHang dh ON ct.MaDH = dh.MaDH
+        {where_sql}
+        GROUP BY CAST(dh.ThoiGianTao AS DATE), ct.MaSP
+    """, params)
+    conn.commit()
+
+
+# Thứ tự cột của employee_stats / product_stats khi trả dạng cột
+EMPLOYEE_FIELDS = ('TenNhanVien', 'SoDonHang', 'TongDoanhThu')
+PRODUCT_FIELDS = ('TenSP', 'SoLuongBan', 'DoanhThu')
+
+_SUMMARY_SQL = """
+    SELECT
+        ISNULL(SUM(SoDonHang), 0),
+        ISNULL(SUM(TongDoanhThu), 0),
+        ISNULL(SUM(DoanhThuHoanTat), 0)
+    FROM DoanhThuNgayNhanVien
+    WHERE Ngay >= ? AND Ngay < ?;
+"""
+
+_EMPLOYEE_SQL = """
+    SELECT
+        nv.HoTen as TenNhanVien,
+        SUM(r.SoDonHang) as SoDonHang,
+        SUM(r.TongDoanhThu) as TongDoanhThu
+    FROM DoanhThuNgayNhanVien r
+    INNER JOIN NhanVien nv ON r.MaNV = nv.MaNV
+    WHERE r.Ngay >= ? AND r.Ngay < ?
+    GROUP BY nv.MaNV, nv.HoTen
+    ORDER BY TongDoanhThu DESC;
+"""
+
+_PRODUCT_SQL = """
+    SELECT
+        l.TenSP,
+        SUM(r.SoLuongBan) as SoLuongBan,
+        SUM(r.DoanhThu) as DoanhThu
+    FROM DoanhThuNgaySanPham r
+    INNER JOIN Laptop l ON r.MaSP = l.MaSP
+    WHERE r.Ngay >= ? AND r.Ngay < ?
+    GROUP BY l.MaSP, l.TenSP
+    ORDER BY SoLuongBan DESC;
+"""
+
+
+def _summary(row):
+    total_orders, total_revenue, completed_revenue = row
+    return {
+        "total_orders": total_orders,
+        "total_revenue": float(total_revenue),
+        "completed_revenue": float(completed_revenue),
+        "avg_revenue": float(total_revenue) / total_orders if total_orders > 0 else 0
+    }
+
+
+def _employee_stats(rows):
+    return [
+        {
+            'TenNhanVien': row[0],
+            'SoDonHang': row[1],
+            'TongDoanhThu': float(row[2]) if row[2] else 0
+        }
+        for row in rows
+    ]
+
+
+def _product_stats(rows):
+    return [
+        {
+            'TenSP': row[0],
+            'SoLuongBan': row[1],
+            'DoanhThu': float(row[2]) if row[2] else 0
+        }
+        for row in rows
+    ]
+
+
+def _dashboard_result(summary, employee_stats, product_stats):
+    return {
+        "summary": summary,
+        "employee_stats": employee_stats,
+        "product_stats": product_stats,
+        # Top 5 sản phẩm bán chạy
+        "top_products": product_stats[:5]
+    }
+
+
+def dashboard(cursor, from_date, to_date):
+    """Tổng hợp, doanh số theo nhân viên và theo sản phẩm trong [from_date, to_date).
+
+    Ba câu SELECT được gửi trong cùng một batch (một round trip) và đọc lần
+    lượt bằng ``cursor.nextset()``.
+    """
+    cursor.execute(
+        "SET NOCOUNT ON;\n" + _SUMMARY_SQL + _EMPLOYEE_SQL + _PRODUCT_SQL,
+        (from_date, to_date) * 3
+    )
+
+    summary = _summary(cursor.fetchone())
+    cursor.nextset()
+    employee_stats = _employee_stats(cursor.fetchall())
+    cursor.nextset()
+    product_stats = _product_stats(cursor.fetchall())
+    return _dashboard_result(summary, employee_stats, product_stats)
+
+
+def dashboard_concurrent(runner, from_date, to_date, timeout):
+    """Như ``dashboard`` nhưng ba câu chạy song song trên ba kết nối của
+    ``runner`` (``ConcurrentQueries``): thời gian chờ bằng câu chậm nhất thay vì
+    tổng ba câu. Ném ``QueryTimeout`` nếu không xong sau ``timeout`` giây.
+    """
+    params = (from_date, to_date)
+
+    def summary(cursor):
+        cursor.execute(_SUMMARY_SQL, params)
+        return _summary(cursor.fetchone())
+
+    def employees(cursor):
+        cursor.execute(_EMPLOYEE_SQL, params)
+        return _employee_stats(cursor.fetchall())
+
+    def products(cursor):
+        cursor.execute(_PRODUCT_SQL, params)
+        return _product_stats(cursor.fetchall())
+
+    results = runner.run(
+        {"summary": summary, "employees": employees, "products": products},
+        timeout
+    )
+    return _dashboard_result(results["summary"], results["employees"], results["products"])
+
+
+class DashboardCache:
+    """Cache kết quả dashboard theo khoảng ngày [from, to).
+
+    Khoảng đã đóng (kết thúc trước hôm nay) không bao giờ đổi nên được giữ mãi
+    (chỉ bị đẩy ra theo LRU); khoảng có hôm nay chỉ giữ ``open_ttl`` giây và bị
+    xoá ngay khi có đơn mới trong khoảng đó. Cache nằm trong từng process, nên
+    process khác chỉ thấy đơn mới sau khi hết TTL.
+    """
+
+    def __init__(self, max_size=256, open_ttl=30):
+        self.max_size = max_size
+        self.open_ttl = open_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, from_date, to_date):
+        key = (from_date, to_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, from_date, to_date, value, today):
+        """``today``: ngày lấy *trước khi* chạy truy vấn, để kết quả tính trước nửa
+        đêm (còn thiếu đơn của hôm đó) không bị coi là khoảng đã đóng"""
+        closed = to_date <= today
+        expires_at = None if closed else time.monotonic() + self.open_ttl
+        with self._lock:
+            self._entries[(from_date, to_date)] = (expires_at, value)
+            self._entries.move_to_end((from_date, to_date))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_date(self, ngay):
+        """Xoá các khoảng chứa ngày ``ngay`` (khi có đơn mới trong ngày đó)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] <= ngay < key[1]]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "open_ttl": self.open_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0
+            }
@@ -0,0 +1,112 @@
+"""Cột tìm kiếm tính sẵn cho KhachHang / NhanVien.
+
+``HoTen COLLATE Latin1_General_CI_AI LIKE '%...%'`` không dùng được index nên
+mỗi lần tìm là một lần quét bảng. Migration này thêm:
+
+- ``HoTenKhongDau``: họ tên chữ thường, bỏ dấu (cùng hàm ``fold`` với chỉ mục
+  trong bộ nhớ), app ghi khi thêm mới. Dòng thêm / đổi tên ngoài app (và toàn
+  bộ NhanVien) được ``backfill_all`` điền lúc khởi động và bằng việc nền định kỳ:
+  trigger đặt cột về NULL khi ``HoTen`` đổi mà câu UPDATE không ghi
+  ``HoTenKhongDau``, nên chỉ cần điền các dòng NULL;
+- ``SDTDaoNguoc``: cột tính ``REVERSE(SDT) PERSISTED`` để tra đuôi số bằng
+  ``LIKE 'số đảo%'``;
+
+cùng index trên hai cột này và trên ``SDT``, để tìm theo đầu họ tên / đầu số /
+đuôi số là index seek.
+"""
+import threading
+
+import dialects
+from search_index import fold
+
+
+TABLES = {
+    'KhachHang': 'MaKH',
+    'NhanVien': 'MaNV',
+}
+
+
+def _migrate(cursor, dialect, table):
+    if not dialect.column_exists(cursor, table, 'HoTenKhongDau'):
+        cursor.execute(f"ALTER TABLE {table} ADD HoTenKhongDau NVARCHAR(100) NULL")
+    if not dialect.column_exists(cursor, table, 'SDTDaoNguoc'):
+        cursor.execute(dialect.add_computed_column_sql(table, 'SDTDaoNguoc', 'REVERSE(SDT)', 'VARCHAR(15)'))
+    for column in ('HoTenKhongDau', 'SDT', 'SDTDaoNguoc'):
+        if not dialect.index_exists(cursor, f'IX_{table}_{column}'):
+            cursor.execute(dialect.create_index_sql(f'IX_{table}_{column}', table, [column]))
+    trigger = f'TR_{table}_HoTenKhongDau'
+    if not dialect.trigger_exists(cursor, trigger):
+        cursor.execute(dialect.clear_on_update_trigger_sql(trigger, table, TABLES[table], 'HoTen', 'HoTenKhongDau'))
+
+
+# Khoảng thời gian (giây) giữa hai lần chạy việc nền điền HoTenKhongDau
+BACKFILL_INTERVAL = 60
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(conn):
+    """Thêm cột / index / trigger nếu chưa có (mỗi process chỉ kiểm tra một lần)"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        dialect = dialects.of(conn)
+        cursor = conn.cursor()
+        for table in TABLES:
+            _migrate(cursor, dialect, table)
+        conn.commit()
+        _schema_ready = True
+
+
+def backfill_all(conn):
+    """Điền HoTenKhongDau còn NULL ở mọi bảng, trả về {bảng: số dòng đã cập nhật}"""
+    return {table: backfill(conn, table, key) for table, key in TABLES.items()}
+
+
+def backfill(conn, table, key, batch_size=1000):
+    """Điền HoTenKhongDau cho các dòng còn NULL, commit theo từng batch để không
+    giữ khoá trên cả bảng. Trả về số dòng đã cập nhật."""
+    cursor = conn.cursor()
+    updated = 0
+    last_key = None
+    while True:
+        if last_key is None:
+            cursor.execute(f"""
+                SELECT TOP (?) {key}, HoTen FROM {table}
+                WHERE HoTenKhongDau IS NULL
+                ORDER BY {key}
+            """, (batch_size,))
+        else:
+            cursor.execute(f"""
+                SELECT TOP (?) {key}, HoTen FROM {table}
+                WHERE HoTenKhongDau IS NULL AND {key} > ?
+                ORDER BY {key}
+            """, (batch_size, last_key))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        cursor.fast_executemany = True
+        cursor.executemany(
+            f"UPDATE {table} SET HoTenKhongDau = ? WHERE {key} = ?",
+            [(fold(row[1]), row[0]) for row in rows]
+        )
+        cursor.fast_executemany = False
+        conn.commit()
+
+        updated += len(rows)
+        last_key = rows[-1][0]
+
+    if updated:
+        print(f"Đã backfill HoTenKhongDau cho {updated} dòng {table}")
+    return updated
+
+
+def like_escape(text):
+    """Thoát các ký tự đặc biệt của LIKE trong từ khoá người dùng nhập, dùng kèm
+    ``LIKE ? ESCAPE '\\'`` (cú pháp chung của SQL Server và SQLite)"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('[', '\\[')
@@ -0,0 +1,273 @@
+"""Chỉ mục tìm kiếm trong bộ nhớ cho khách hàng / nhân viên.
+
+``LIKE '%tu khoa%'`` kèm ``COLLATE Latin1_General_CI_AI`` buộc SQL Server quét
+toàn bảng mỗi lần gõ phím. Chỉ mục này giữ họ tên đã bỏ dấu tiếng Việt, danh
+sách trigram -> bản ghi, và danh sách số điện thoại đã sắp xếp (xuôi và ngược)
+để tra theo đầu số / đuôi số, rồi xếp hạng kết quả.
+"""
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d), gộp khoảng trắng"""
+    if not text:
+        return ''
+    text = text.lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _State:
+    """Toàn bộ dữ liệu chỉ mục; khi nạp lại toàn bộ thì thay cả object một lần"""
+
+    def __init__(self):
+        self.records = []        # slot -> bản ghi gốc (dict)
+        self.names = []          # slot -> họ tên đã bỏ dấu
+        self.phones = []         # slot -> số điện thoại
+        self.alive = []          # slot -> False khi bản ghi đã được thay bằng slot mới
+        self.order = []          # slot -> (không Active, họ tên, khoá) để xếp hạng khi cùng hạng
+        self.slot_of = {}        # khoá chính -> slot hiện hành
+        self.name_grams = {}     # trigram họ tên -> [slot]
+        self.phone_grams = {}    # trigram số điện thoại -> [slot]
+        self.by_phone = []       # [(SDT, slot)] sắp xếp theo SDT
+        self.by_phone_rev = []   # [(SDT đảo ngược, slot)] sắp xếp, để tra đuôi số
+        # Khoá lớn nhất đã đọc từ database; không tính bản ghi process này tự
+        # add(), vì process khác có thể đã thêm các khoá nhỏ hơn mà chưa nạp
+        self.loaded_key = None
+
+
+class SearchIndex:
+    """Chỉ mục họ tên + SDT cho một bảng.
+
+    ``loader(conn, after_key)`` trả về các bản ghi (dict có khoá ``key_field``,
+    ``HoTen``, ``SDT``, ``TrangThai``) có khoá lớn hơn ``after_key``, hoặc toàn
+    bộ bảng khi ``after_key`` là None. Các bản ghi mới được nạp thêm sau mỗi
+    ``refresh_interval`` giây, toàn bộ chỉ mục được nạp lại sau mỗi
+    ``rebuild_interval`` giây để nhận cả các dòng bị sửa / xoá.
+
+    Mỗi lần nạp thêm đọc lại ``refresh_overlap`` khoá cuối đã nạp, để nhận cả
+    các dòng có khoá nhỏ hơn nhưng commit muộn; bản ghi không đổi thì bỏ qua.
+    """
+
+    def __init__(self, key_field, loader, refresh_interval=30, rebuild_interval=600, refresh_overlap=1000):
+        self.key_field = key_field
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.refresh_overlap = refresh_overlap
+        self._state = None
+        self._write_lock = threading.Lock()
+        self._refreshed_at = 0
+        self._rebuilt_at = 0
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    def ensure_fresh(self, conn):
+        """Nạp chỉ mục lần đầu (chặn), sau đó nạp thêm / nạp lại khi tới hạn.
+
+        Nếu một request khác đang nạp thì dùng luôn dữ liệu hiện có.
+        """
+        now = time.monotonic()
+        if self._state is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        if not self._write_lock.acquire(blocking=self._state is None):
+            return
+        try:
+            now = time.monotonic()
+            if self._state is None or now - self._rebuilt_at >= self.rebuild_interval:
+                self.rebuild(self._loader(conn, None))
+            elif now - self._refreshed_at >= self.refresh_interval:
+                after_key = self._state.loaded_key
+                if after_key is not None:
+                    after_key -= self.refresh_overlap
+                self._add_many(self._state, self._loader(conn, after_key), loaded=True)
+                self._refreshed_at = now
+        finally:
+            self._write_lock.release()
+
+    def rebuild(self, records):
+        state = _State()
+        self._add_many(state, records, loaded=True)
+        self._state = state
+        self._rebuilt_at = self._refreshed_at = time.monotonic()
+
+    def add(self, record):
+        """Thêm / cập nhật một bản ghi (gọi sau khi INSERT đã commit)"""
+        if self._state is None:
+            return
+        with self._write_lock:
+            self._add_many(self._state, [record])
+
+    def _add_many(self, state, records, loaded=False):
+        """``loaded=True``: bản ghi đọc từ database, cập nhật ``loaded_key``"""
+        added_phones = []
+        for record in records:
+            key = record[self.key_field]
+            if loaded and (state.loaded_key is None or key > state.loaded_key):
+                state.loaded_key = key
+            old_slot = state.slot_of.get(key)
+            if old_slot is not None and state.records[old_slot] == record:
+                continue
+
+            slot = len(state.records)
+            name = fold(record.get('HoTen'))
+            phone = record.get('SDT') or ''
+
+            state.records.append(record)
+            state.names.append(name)
+            state.phones.append(phone)
+            state.alive.append(True)
+            state.order.append((record.get('TrangThai') != 'Active', name, key))
+            for gram in trigrams(name):
+                state.name_grams.setdefault(gram, []).append(slot)
+            for gram in trigrams(phone):
+                state.phone_grams.setdefault(gram, []).append(slot)
+            added_phones.append((phone, slot))
+
+            if old_slot is not None:
+                state.alive[old_slot] = False
+            state.slot_of[key] = slot
+
+        if len(added_phones) <= 64:
+            # Ít bản ghi (add() sau mỗi lần thêm khách hàng, lượt nạp thêm định kỳ):
+            # chèn thẳng vào danh sách đang dùng, không chép / sắp xếp lại cả danh sách
+            for phone, slot in added_phones:
+                bisect.insort(state.by_phone, (phone, slot))
+                bisect.insort(state.by_phone_rev, (phone[::-1], slot))
+        else:
+            # Nhiều bản ghi: sắp xếp bản sao rồi thay một lần, để luồng đang tìm
+            # không thấy danh sách dở dang
+            state.by_phone = sorted(state.by_phone + added_phones)
+            state.by_phone_rev = sorted(state.by_phone_rev + [(phone[::-1], slot) for phone, slot in added_phones])
+
+    def search(self, term, limit=None):
+        """Trả về danh sách bản ghi khớp ``term``, đã xếp hạng.
+
+        Thứ tự: khớp chính xác, khớp đầu (đầu số / đầu họ tên / đầu một từ),
+        khớp đuôi số, rồi khớp ở giữa; cùng hạng thì Active trước, theo họ tên.
+        """
+        state = self._state
+        keyed = self._ranked(state, term)
+        if limit is not None:
+            keyed = heapq.nsmallest(limit, keyed)
+        else:
+            keyed.sort()
+        return [state.records[slot] for _, _, slot in keyed]
+
+    def search_page(self, term, limit, after=None):
+        """Một trang kết quả cho typeahead: (bản ghi, vị trí trang sau hoặc None).
+
+        ``after`` là vị trí trả về từ trang trước, dạng
+        ``[hạng, không Active, họ tên không dấu, khoá]``. Chỉ giữ ``limit + 1``
+        phần tử khi chọn nên không phải sắp xếp toàn bộ kết quả khớp.
+        """
+        state = self._state
+        keyed = self._ranked(state, term)
+        if after is not None:
+            position = (after[0], tuple(after[1:]))
+            keyed = [item for item in keyed if item[:2] > position]
+        keyed = heapq.nsmallest(limit + 1, keyed)
+
+        next_after = None
+        if len(keyed) > limit:
+            keyed = keyed[:limit]
+            rank, order, _ = keyed[-1]
+            next_after = [rank, *order]
+        return [state.records[slot] for _, _, slot in keyed], next_after
+
+    def _ranked(self, state, term):
+        query = fold(term)
+        if not query:
+            return []
+
+        ranked = {}
+        if query.isdigit():
+            self._search_phone(state, query, ranked)
+        self._search_name(state, query, ranked)
+
+        order = state.order
+        return [(rank, order[slot], slot) for slot, rank in ranked.items()]
+
+    @staticmethod
+    def _rank(ranked, slot, rank):
+        if rank < ranked.get(slot, 99):
+            ranked[slot] = rank
+
+    def _search_phone(self, state, query, ranked):
+        alive = state.alive
+        # Đầu số: các SDT bắt đầu bằng query nằm liền nhau trong danh sách đã sắp xếp
+        start = bisect.bisect_left(state.by_phone, (query,))
+        for phone, slot in state.by_phone[start:]:
+            if not phone.startswith(query):
+                break
+            if alive[slot]:
+                self._rank(ranked, slot, 0 if phone == query else 1)
+
+        reversed_query = query[::-1]
+        start = bisect.bisect_left(state.by_phone_rev, (reversed_query,))
+        for phone, slot in state.by_phone_rev[start:]:
+            if not phone.startswith(reversed_query):
+                break
+            if alive[slot]:
+                self._rank(ranked, slot, 3)
+
+        for slot in self._candidates(state.phone_grams, state.phones, query):
+            if alive[slot] and query in state.phones[slot]:
+                self._rank(ranked, slot, 4)
+
+    def _search_name(self, state, query, ranked):
+        names = state.names
+        alive = state.alive
+        word_start = ' ' + query
+        for slot in self._candidates(state.name_grams, names, query):
+            name = names[slot]
+            if query not in name or not alive[slot]:
+                continue
+            if name == query:
+                rank = 0
+            elif name.startswith(query):
+                rank = 1
+            elif word_start in name:
+                rank = 2
+            else:
+                rank = 4
+            if rank < ranked.get(slot, 99):
+                ranked[slot] = rank
+
+    def _candidates(self, grams, values, query):
+        """Các slot có thể chứa ``query``: danh sách trigram ngắn nhất, hoặc tất cả
+        nếu query ngắn hơn 3 ký tự. Người gọi vẫn phải kiểm tra lại chuỗi con."""
+        if len(query) < 3:
+            return range(len(values))
+        shortest = None
+        for gram in trigrams(query):
+            postings = grams.get(gram)
+            if not postings:
+                return ()
+            if shortest is None or len(postings) < len(shortest):
+                shortest = postings
+        return shortest
+
+    def stats(self):
+        state = self._state
+        if state is None:
+            return {"ready": False}
+        return {
+            "ready": True,
+            "records": len(state.slot_of),
+            "slots": len(state.records),
+            "name_trigrams": len(state.name_grams),
+            "phone_trigrams": len(state.phone_grams),
+            "loaded_key": state.loaded_key
+        }
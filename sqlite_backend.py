@@ -0,0 +1,344 @@
+"""Backend SQLite có giao diện giống pyodbc, để chạy toàn bộ ứng dụng (và
+benchmark) trên một máy không có SQL Server.
+
+``connect(path)`` trả về kết nối có ``cursor()`` / ``commit()`` / ``rollback()``
+như pyodbc. Câu T-SQL được dịch trước khi chạy (kết quả dịch được cache):
+
+- batch nhiều câu lệnh được tách theo ``;`` và chia tham số theo số ``?``,
+  các tập kết quả đọc lần lượt bằng ``nextset()`` như SQL Server;
+- ``SET NOCOUNT ON`` bị bỏ; ``SELECT TOP (?)`` / ``TOP n`` thành ``LIMIT`` ở
+  cuối câu (``TOP`` phải là tham số đầu tiên của câu lệnh);
+- ``INSERT ... OUTPUT INSERTED.cột VALUES (...)`` thành ``RETURNING``;
+- ``CAST(x AS DATE)`` thành ``date(x)``, ``ISNULL(`` thành ``IFNULL(`` (ISNULL là
+  toán tử của SQLite), ``TRUNCATE TABLE`` thành ``DELETE FROM``;
+- bảng tạm ``#Ten`` thành ``temp.Ten``, ``NVARCHAR(MAX)`` thành ``TEXT``.
+
+Các thay thế chỉ áp dụng ngoài chuỗi ``'...'``. ``REVERSE`` được đăng ký
+thành hàm. ``LIKE`` giữ nguyên của SQLite (phân biệt hoa thường, để tìm theo
+đầu chuỗi dùng được index; các cột tìm kiếm đã là chữ thường / chữ số), ký tự
+đặc biệt thoát bằng ``ESCAPE '\\'``. MERGE, batch có biến và DDL kiểm tra
+catalog không dịch được: các module tự chọn câu lệnh theo ``dialects.of(cursor)``.
+"""
+import datetime
+import decimal
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+
+import dialects
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS NhaCungCap (
+    MaNCC INTEGER PRIMARY KEY AUTOINCREMENT,
+    TenNCC NVARCHAR(255) NOT NULL,
+    SDT VARCHAR(15),
+    Email VARCHAR(100),
+    DiaChi NVARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS Laptop (
+    MaSP INTEGER PRIMARY KEY AUTOINCREMENT,
+    TenSP NVARCHAR(255) NOT NULL,
+    Hang NVARCHAR(100) NOT NULL,
+    CauHinh TEXT,
+    GiaBan DECIMAL(18, 2) NOT NULL,
+    Kho INT NOT NULL DEFAULT 0 CHECK (Kho >= 0),
+    MaNCC INT REFERENCES NhaCungCap (MaNCC),
+    NgayNhap DATE,
+    TrangThai NVARCHAR(50) NOT NULL DEFAULT 'Active'
+);
+
+CREATE TABLE IF NOT EXISTS KhachHang (
+    MaKH INTEGER PRIMARY KEY AUTOINCREMENT,
+    HoTen NVARCHAR(100) NOT NULL,
+    GioiTinh NVARCHAR(10),
+    NgaySinh DATE,
+    SDT VARCHAR(15) NOT NULL UNIQUE,
+    DiaChi NVARCHAR(255),
+    TrangThai NVARCHAR(20) NOT NULL DEFAULT 'Active'
+);
+
+CREATE TABLE IF NOT EXISTS NhanVien (
+    MaNV INTEGER PRIMARY KEY AUTOINCREMENT,
+    HoTen NVARCHAR(100) NOT NULL,
+    GioiTinh NVARCHAR(10),
+    Email VARCHAR(100),
+    SDT VARCHAR(15) NOT NULL UNIQUE,
+    TrangThai NVARCHAR(20) NOT NULL DEFAULT 'Active',
+    LuongCoBan DECIMAL(18, 2),
+    TenChucVu NVARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS DonHang (
+    MaDH INTEGER PRIMARY KEY AUTOINCREMENT,
+    MaKH INT NOT NULL REFERENCES KhachHang (MaKH),
+    MaNV INT NOT NULL REFERENCES NhanVien (MaNV),
+    NgayGiao DATE,
+    ThoiGianTao DATETIME NOT NULL,
+    TrangThaiXuLy NVARCHAR(50) NOT NULL,
+    TongTien DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    GhiChu NVARCHAR(500)
+);
+
+CREATE TABLE IF NOT EXISTS ChiTietDonHang (
+    MaDH INT NOT NULL REFERENCES DonHang (MaDH),
+    MaSP INT NOT NULL REFERENCES Laptop (MaSP),
+    SoLuong INT NOT NULL CHECK (SoLuong > 0),
+    GiaBan DECIMAL(18, 2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_ChiTietDonHang_MaDH ON ChiTietDonHang (MaDH);
+CREATE INDEX IF NOT EXISTS IX_ChiTietDonHang_MaSP ON ChiTietDonHang (MaSP);
+"""
+
+
+# --- kiểu dữ liệu ------------------------------------------------------------
+
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(decimal.Decimal, float)
+# Cột khai báo DATE / DATETIME / DECIMAL đọc ra cùng kiểu Python như pyodbc
+sqlite3.register_converter('DATE', lambda raw: datetime.date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter('DATETIME', lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('DECIMAL', lambda raw: decimal.Decimal(raw.decode()))
+
+
+# --- hàm T-SQL ---------------------------------------------------------------
+
+def _reverse(value):
+    return value[::-1] if value is not None else None
+
+
+# --- dịch T-SQL --------------------------------------------------------------
+
+_TOKEN = re.compile(r"'(?:[^']|'')*'|;|\?|[^';?]+")
+_NOCOUNT = re.compile(r"^\s*SET\s+NOCOUNT\s+ON\s*$", re.IGNORECASE)
+_TOP_PARAM = re.compile(r"^(\s*SELECT)\s+TOP\s*\(\s*\?\s*\)", re.IGNORECASE)
+_TOP_NUMBER = re.compile(r"^(\s*SELECT)\s+TOP\s*\(?\s*(\d+)\s*\)?", re.IGNORECASE)
+_OUTPUT_INSERTED = re.compile(r"\bOUTPUT\s+INSERTED\.(\w+)\s+(VALUES\s*\(.*\))\s*$", re.IGNORECASE | re.DOTALL)
+_CAST_DATE = re.compile(r"\bCAST\s*\(\s*([\w.]+)\s+AS\s+DATE\s*\)", re.IGNORECASE)
+_TRUNCATE = re.compile(r"\bTRUNCATE\s+TABLE\b", re.IGNORECASE)
+_DROP_TEMP = re.compile(
+    r"\bIF\s+OBJECT_ID\s*\(\s*'tempdb\.\.#(\w+)'\s*\)\s+IS\s+NOT\s+NULL\s+DROP\s+TABLE\s+#\w+", re.IGNORECASE)
+_CREATE_TEMP = re.compile(r"\bCREATE\s+TABLE\s+#(\w+)", re.IGNORECASE)
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_TEMP_NAME = re.compile(r"#(\w+)")
+_NVARCHAR_MAX = re.compile(r"\bN?VARCHAR\s*\(\s*MAX\s*\)", re.IGNORECASE)
+_UNICODE_PREFIX = re.compile(r"\bN$")
+_ISNULL = re.compile(r"\bISNULL\s*\(", re.IGNORECASE)
+_CREATE_TRIGGER = re.compile(r"\s*CREATE\s+TRIGGER\b", re.IGNORECASE)
+_ENDS_WITH_END = re.compile(r"\bEND\s*$", re.IGNORECASE)
+
+
+def _split(sql):
+    """Tách batch thành [(câu lệnh, số tham số)], bỏ qua ``;`` / ``?`` trong chuỗi
+    và ``;`` trong thân ``CREATE TRIGGER ... BEGIN ... END``"""
+    statements = []
+    parts = []
+    count = 0
+    for token in _TOKEN.findall(sql):
+        if token == ';':
+            text = ''.join(parts)
+            if _CREATE_TRIGGER.match(text) and not _ENDS_WITH_END.search(text):
+                parts.append(token)
+                continue
+            statements.append((''.join(parts), count))
+            parts = []
+            count = 0
+            continue
+        if token == '?':
+            count += 1
+        parts.append(token)
+    statements.append((''.join(parts), count))
+    return [(text, count) for text, count in statements if text.strip()]
+
+
+def _translate_statement(text):
+    """Trả về (câu SQLite, tham số TOP có phải chuyển xuống cuối không)"""
+    move_top = False
+    limit = ''
+    match = _TOP_PARAM.match(text)
+    if match:
+        text = match.group(1) + ' ' + text[match.end():]
+        limit = ' LIMIT ?'
+        move_top = True
+    else:
+        match = _TOP_NUMBER.match(text)
+        if match:
+            text = match.group(1) + ' ' + text[match.end():]
+            limit = f' LIMIT {match.group(2)}'
+    text = _OUTPUT_INSERTED.sub(r'\2 RETURNING \1', text)
+    text = _CAST_DATE.sub(r'date(\1)', text)
+    text = _TRUNCATE.sub('DELETE FROM', text)
+    text = _DROP_TEMP.sub(r'DROP TABLE IF EXISTS temp.\1', text)
+    text = _CREATE_TEMP.sub(r'CREATE TEMP TABLE \1', text)
+    text = _NVARCHAR_MAX.sub('TEXT', text)
+    # Phần còn lại chỉ thay ngoài chuỗi: phần tử lẻ của split là chuỗi '...'
+    parts = _LITERAL.split(text)
+    for i in range(0, len(parts), 2):
+        part = _TEMP_NAME.sub(r'temp.\1', parts[i])
+        part = _ISNULL.sub('IFNULL(', part)
+        if i + 1 < len(parts):
+            # N'...' của T-SQL: bỏ tiền tố N ngay trước chuỗi
+            part = _UNICODE_PREFIX.sub('', part)
+        parts[i] = part
+    return ''.join(parts).rstrip() + limit, move_top
+
+
+@lru_cache(maxsize=2048)
+def translate(sql):
+    """Batch T-SQL thành tuple các (câu SQLite, số tham số, chuyển tham số TOP)"""
+    translated = []
+    for text, count in _split(sql):
+        if _NOCOUNT.match(text):
+            continue
+        text, move_top = _translate_statement(text)
+        translated.append((text, count, move_top))
+    return tuple(translated)
+
+
+def _arrange(params, count, move_top):
+    params = list(params)
+    if len(params) != count:
+        raise sqlite3.ProgrammingError(f"Câu lệnh cần {count} tham số, nhận {len(params)}")
+    if move_top:
+        params.append(params.pop(0))
+    return params
+
+
+# --- kết nối / cursor --------------------------------------------------------
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def connect(path):
+    """Mở kết nối SQLite dạng pyodbc, tạo bảng nếu file chưa có (mỗi process một lần)"""
+    db = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA foreign_keys=ON")
+    db.execute("PRAGMA synchronous=NORMAL")
+    # LIKE phân biệt hoa thường thì SQLite mới dùng index thường cho LIKE 'abc%'
+    db.execute("PRAGMA case_sensitive_like=ON")
+    db.create_function('REVERSE', 1, _reverse, deterministic=True)
+    if path not in _schema_ready:
+        with _schema_lock:
+            if path not in _schema_ready:
+                db.executescript(SCHEMA)
+                _schema_ready.add(path)
+    return SqliteConnection(db)
+
+
+class SqliteConnection:
+    dialect = dialects.SQLITE
+
+    def __init__(self, db):
+        self._db = db
+
+    def cursor(self):
+        return SqliteCursor(self._db)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def close(self):
+        self._db.close()
+
+
+class SqliteCursor:
+    """Cursor dạng pyodbc: ``execute`` nhận batch T-SQL, ``nextset()`` chuyển tập kết quả"""
+
+    dialect = dialects.SQLITE
+
+    def __init__(self, db):
+        self._db = db
+        self._cursor = db.cursor()
+        self._sets = []      # tập kết quả phía sau tập hiện tại: (description, list dòng)
+        self._buffered = None  # dòng của tập hiện tại nếu đã đọc sẵn, None nếu đọc từ cursor
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False  # chỉ để tương thích pyodbc
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        statements = translate(sql)
+
+        results = []
+        offset = 0
+        self.rowcount = -1
+        for index, (text, count, move_top) in enumerate(statements):
+            args = _arrange(params[offset:offset + count], count, move_top)
+            offset += count
+            self._cursor.execute(text, args)
+            if self._cursor.description is None:
+                self.rowcount = self._cursor.rowcount
+            elif index == len(statements) - 1:
+                results.append((self._cursor.description, None))  # đọc dần từ cursor
+            else:
+                results.append((self._cursor.description, self._cursor.fetchall()))
+        if offset != len(params):
+            raise sqlite3.ProgrammingError(f"Batch cần {offset} tham số, nhận {len(params)}")
+
+        self._sets = results
+        self._next_set()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        statements = translate(sql)
+        if len(statements) != 1:
+            raise sqlite3.ProgrammingError("executemany chỉ nhận một câu lệnh")
+        text, count, move_top = statements[0]
+        self._cursor.executemany(text, (_arrange(params, count, move_top) for params in seq_of_params))
+        self.rowcount = self._cursor.rowcount
+        self._sets = []
+        self.description = None
+        self._buffered = None
+
+    def _next_set(self):
+        if not self._sets:
+            self.description = None
+            self._buffered = None
+            return False
+        self.description, rows = self._sets.pop(0)
+        self._buffered = iter(rows) if rows is not None else None
+        return True
+
+    def nextset(self):
+        return self._next_set() or None
+
+    def fetchone(self):
+        if self.description is None:
+            raise sqlite3.ProgrammingError("Câu lệnh không trả về dòng nào")
+        if self._buffered is not None:
+            return next(self._buffered, None)
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        if self._buffered is not None:
+            return [row for _, row in zip(range(size), self._buffered)]
+        return self._cursor.fetchmany(size) if self.description is not None else []
+
+    def fetchall(self):
+        if self._buffered is not None:
+            return list(self._buffered)
+        return self._cursor.fetchall() if self.description is not None else []
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def cancel(self):
+        """Dừng câu lệnh đang chạy (gọi từ thread khác) như ``pyodbc.Cursor.cancel``.
+        SQLite chỉ ngắt được cả kết nối, mà mỗi kết nối pool chỉ chạy một cursor"""
+        self._db.interrupt()
+
+    def close(self):
+        self._cursor.close()
@@ -0,0 +1,304 @@
+"""Kiểm tra dữ liệu ghi theo schema khai báo.
+
+Mỗi schema được biên dịch một lần khi import module thành danh sách hàm kiểm
+tra; tập giá trị hợp lệ là frozenset, thông báo lỗi được dựng sẵn, mỗi trường
+ngày chỉ parse một lần. ``Schema.validate`` đi qua tất cả các trường và trả về
+toàn bộ lỗi thay vì dừng ở lỗi đầu tiên.
+"""
+import datetime
+
+
+class Field:
+    """Một trường: bắt buộc hay không, giá trị mặc định, và bước chuyển đổi riêng"""
+
+    def __init__(self, label, required=True, default=None, messages=None):
+        self.label = label
+        self.required = required
+        self.default = default
+        self.messages = messages or {}
+
+    def message(self, key, default):
+        return self.messages.get(key, default)
+
+    def compile(self):
+        """Trả về (bắt buộc, mặc định, lỗi khi thiếu, ``convert(value, today) -> (giá trị, lỗi)``).
+
+        Phần kiểm tra thiếu / rỗng do ``Schema.validate`` làm trực tiếp, ``convert``
+        chỉ được gọi với giá trị đã có.
+        """
+        required_message = self.message('required', f"{self.label} là bắt buộc")
+        return self.required, self.default, required_message, self._compile()
+
+    def _compile(self):
+        return lambda value, today: (value, None)
+
+
+class Text(Field):
+    def __init__(self, label, min_length=None, max_length=None, **kwargs):
+        super().__init__(label, **kwargs)
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def _compile(self):
+        min_length, max_length = self.min_length, self.max_length
+        too_short = self.message('min_length', f"{self.label} phải có ít nhất {min_length} ký tự")
+        too_long = self.message('max_length', f"{self.label} không được quá {max_length} ký tự")
+
+        def convert(value, today):
+            value = str(value)
+            if min_length is not None and len(value) < min_length:
+                return None, too_short
+            if max_length is not None and len(value) > max_length:
+                return None, too_long
+            return value, None
+        return convert
+
+
+class Digits(Field):
+    """Chuỗi chỉ gồm chữ số, độ dài trong [min_length, max_length] (số điện thoại)"""
+
+    def __init__(self, label, min_length, max_length, **kwargs):
+        super().__init__(label, **kwargs)
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def _compile(self):
+        min_length, max_length = self.min_length, self.max_length
+        not_digits = self.message('digits', f"{self.label} chỉ được chứa chữ số")
+        bad_length = self.message('length', f"{self.label} phải có {min_length}-{max_length} chữ số")
+
+        def convert(value, today):
+            value = str(value)
+            if not value.isdigit():
+                return None, not_digits
+            if not min_length <= len(value) <= max_length:
+                return None, bad_length
+            return value, None
+        return convert
+
+
+class Number(Field):
+    """Số (``cast=float`` hoặc ``int``) với các cận ``gt`` (>), ``ge`` (>=), ``le`` (<=)"""
+
+    def __init__(self, label, cast=float, gt=None, ge=None, le=None, **kwargs):
+        super().__init__(label, **kwargs)
+        self.cast = cast
+        self.gt = gt
+        self.ge = ge
+        self.le = le
+
+    def _compile(self):
+        cast, gt, ge, le = self.cast, self.gt, self.ge, self.le
+        bad_type = self.message('type', f"{self.label} phải là số" + (" nguyên" if cast is int else ""))
+        not_gt = self.message('gt', f"{self.label} phải lớn hơn {gt}")
+        not_ge = self.message('ge', f"{self.label} không được nhỏ hơn {ge}")
+        not_le = self.message('le', f"{self.label} không hợp lệ (quá lớn)")
+
+        def convert(value, today):
+            try:
+                value = cast(value)
+            except (ValueError, TypeError):
+                return None, bad_type
+            if gt is not None and value <= gt:
+                return None, not_gt
+            if ge is not None and value < ge:
+                return None, not_ge
+            if le is not None and value > le:
+                return None, not_le
+            return value, None
+        return convert
+
+
+class Enum(Field):
+    def __init__(self, label, choices, **kwargs):
+        super().__init__(label, **kwargs)
+        self.choices = tuple(choices)
+
+    def _compile(self):
+        choices = frozenset(self.choices)
+        invalid = self.message('choices', f"{self.label} không hợp lệ. Phải là: {', '.join(self.choices)}")
+
+        def convert(value, today):
+            if value not in choices:
+                return None, invalid
+            return value, None
+        return convert
+
+
+class Date(Field):
+    """Ngày dạng YYYY-MM-DD, trả về ``datetime.date``.
+
+    ``not_future`` / ``not_past`` so với hôm nay; ``min_age`` / ``max_age`` tính
+    theo năm (365.25 ngày) cho ngày sinh.
+    """
+
+    def __init__(self, label, not_future=False, not_past=False, min_age=None, max_age=None, **kwargs):
+        super().__init__(label, **kwargs)
+        self.not_future = not_future
+        self.not_past = not_past
+        self.min_age = min_age
+        self.max_age = max_age
+
+    def _compile(self):
+        not_future, not_past = self.not_future, self.not_past
+        min_age, max_age = self.min_age, self.max_age
+        bad_format = self.message('format', f"Định dạng {self.label.lower()} không hợp lệ (yêu cầu: YYYY-MM-DD)")
+        in_future = self.message('not_future', f"{self.label} không được là tương lai")
+        in_past = self.message('not_past', f"{self.label} không được là quá khứ")
+        too_young = self.message('min_age', f"Phải ít nhất {min_age} tuổi")
+        too_old = self.message('max_age', f"{self.label} không hợp lệ")
+
+        def convert(value, today):
+            if isinstance(value, datetime.date):
+                parsed = value
+            else:
+                try:
+                    parsed = datetime.date.fromisoformat(value)
+                except (TypeError, ValueError):
+                    return None, bad_format
+            if not_future and parsed > today:
+                return None, in_future
+            if not_past and parsed < today:
+                return None, in_past
+            if min_age is not None or max_age is not None:
+                age = (today - parsed).days / 365.25
+                if min_age is not None and age < min_age:
+                    return None, too_young
+                if max_age is not None and age > max_age:
+                    return None, too_old
+            return parsed, None
+        return convert
+
+
+class ListOf(Field):
+    """Danh sách object, mỗi phần tử kiểm tra theo ``schema``; lỗi ghi kèm số thứ tự"""
+
+    def __init__(self, label, schema, item_label, min_items=0, **kwargs):
+        super().__init__(label, **kwargs)
+        self.schema = schema
+        self.item_label = item_label
+        self.min_items = min_items
+
+    def _compile(self):
+        schema, item_label, min_items = self.schema, self.item_label, self.min_items
+        not_list = self.message('type', f"{self.label} phải là một danh sách")
+        too_few = self.message('min_items', f"{self.label} phải có ít nhất {min_items} phần tử")
+
+        def convert(value, today):
+            if not isinstance(value, list):
+                return None, not_list
+            if len(value) < min_items:
+                return None, too_few
+            items = []
+            errors = []
+            for idx, item in enumerate(value, 1):
+                clean, item_errors = schema.validate(item, today)
+                if item_errors:
+                    errors.extend(f"{item_label} thứ {idx}: {error}" for error in item_errors)
+                else:
+                    items.append(clean)
+            return (None, errors) if errors else (items, None)
+        return convert
+
+
+class Schema:
+    """Tập trường có tên; biên dịch ngay khi tạo"""
+
+    def __init__(self, **fields):
+        self.fields = fields
+        self._checks = tuple((name,) + field.compile() for name, field in fields.items())
+
+    def validate(self, data, today=None):
+        """Trả về (dict đã chuẩn hoá, []) nếu hợp lệ, hoặc (None, danh sách lỗi)"""
+        if not isinstance(data, dict):
+            return None, ["Dữ liệu phải là một object JSON"]
+        if today is None:
+            today = datetime.date.today()
+
+        clean = {}
+        errors = None
+        get = data.get
+        for name, required, default, required_message, convert in self._checks:
+            value = get(name)
+            if value.__class__ is str:
+                value = value.strip() or None
+            if value is None:
+                if not required:
+                    clean[name] = default
+                    continue
+                error = required_message
+            else:
+                value, error = convert(value, today)
+                if error is None:
+                    clean[name] = value
+                    continue
+            if errors is None:
+                errors = []
+            if isinstance(error, list):
+                errors.extend(error)
+            else:
+                errors.append(error)
+        return (None, errors) if errors else (clean, [])
+
+
+TRANG_THAI_KHACH_HANG = ('Active', 'Inactive')
+TRANG_THAI_LAPTOP = ('Active', 'Ngừng kinh doanh')
+TRANG_THAI_DON_HANG = ('Chưa xử lý', 'Đang giao', 'Hoàn tất')
+
+KHACH_HANG = Schema(
+    HoTen=Text("Họ tên", min_length=2, max_length=100),
+    GioiTinh=Enum("Giới tính", ('Nam', 'Nu', 'Khac'), required=False,
+                  messages={'choices': "Giới tính không hợp lệ"}),
+    NgaySinh=Date("Ngày sinh", required=False, not_future=True, min_age=13, max_age=150,
+                  messages={'min_age': "Khách hàng phải ít nhất 13 tuổi"}),
+    SDT=Digits("Số điện thoại", 10, 11),
+    DiaChi=Text("Địa chỉ", required=False),
+    TrangThai=Enum("Trạng thái", TRANG_THAI_KHACH_HANG, required=False, default='Active',
+                   messages={'choices': "Trạng thái không hợp lệ"}),
+)
+
+_LAPTOP_FIELDS = dict(
+    TenSP=Text("Tên sản phẩm", min_length=3, max_length=255),
+    Hang=Text("Tên hãng", min_length=2),
+    GiaBan=Number("Giá bán", gt=0, le=1000000000),
+    CauHinh=Text("Cấu hình", required=False),
+    Kho=Number("Số lượng kho", cast=int, ge=0, le=100000,
+               messages={'ge': "Số lượng kho không được âm"}),
+    MaNCC=Number("Mã nhà cung cấp", cast=int, required=False),
+    NgayNhap=Date("Ngày nhập", required=False, not_future=True),
+    TrangThai=Enum("Trạng thái", TRANG_THAI_LAPTOP, required=False, default='Active'),
+)
+
+# Thêm mới: Kho bỏ trống là 0; cập nhật: bắt buộc có Kho
+LAPTOP_THEM = Schema(**dict(_LAPTOP_FIELDS, Kho=Number(
+    "Số lượng kho", cast=int, ge=0, le=100000, required=False, default=0,
+    messages={'ge': "Số lượng kho không được âm"})))
+LAPTOP_SUA = Schema(**_LAPTOP_FIELDS)
+# Nhập hàng loạt: Kho bỏ trống là giữ nguyên tồn kho hiện tại (None)
+LAPTOP_NHAP = Schema(**dict(_LAPTOP_FIELDS, Kho=Number(
+    "Số lượng kho", cast=int, ge=0, le=100000, required=False,
+    messages={'ge': "Số lượng kho không được âm"}),
+    MaSP=Number("MaSP", cast=int, required=False)))
+
+CHI_TIET_DON_HANG = Schema(
+    MaSP=Number("MaSP", cast=int),
+    SoLuong=Number("Số lượng", cast=int, gt=0),
+    GiaBan=Number("Giá bán", gt=0),
+)
+
+DON_HANG = Schema(
+    MaKH=Number("Mã khách hàng", cast=int),
+    MaNV=Number("Mã nhân viên", cast=int),
+    NgayGiao=Date("Ngày giao hàng", not_past=True,
+                  messages={'format': "Định dạng ngày giao không hợp lệ (yêu cầu: YYYY-MM-DD)"}),
+    TrangThaiXuLy=Enum("Trạng thái", TRANG_THAI_DON_HANG),
+    GhiChu=Text("Ghi chú", required=False, default=''),
+    ChiTiet=ListOf("Đơn hàng", CHI_TIET_DON_HANG, "Sản phẩm", min_items=1,
+                   messages={'required': "Đơn hàng phải có ít nhất 1 sản phẩm",
+                             'min_items': "Đơn hàng phải có ít nhất 1 sản phẩm"}),
+)
+
+
+def error_message(errors):
+    """Gộp danh sách lỗi thành một thông báo cho trường ``message`` của API"""
+    return '; '.join(errors)